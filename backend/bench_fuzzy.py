@@ -0,0 +1,205 @@
+"""
+Benchmark do pipeline do fuzzy_logic.py sobre dataset/reactive-gases-grids.
+
+Leitura dos arquivos SRES: parser linha a linha por regex (caminho antigo) contra o
+parser em bloco (cabeçalho + np.loadtxt), em série e com pool de processos; depois o
+cache de parse (frio, quente e com um único ano filtrado pelo cabeçalho); por fim a
+classificação numa grade sintética de 0.1°: laços por linha + merges + apply (caminho
+antigo, skfuzzy) contra fl.classify, conferindo que o CSV sai byte a byte igual; e o modo
+streaming (pico de memória, concordância dos rótulos e erro de posto do sketch KLL
+medido contra os quantis exatos, ao lado do limite que o sketch reporta).
+
+Uso:
+    python bench_fuzzy.py --repeat 3 --workers 4 --res 0.1 --lon-span 60 --lat-span 30 --sketch-k 2000
+"""
+import argparse
+import contextlib
+import io
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+import fuzzy_logic as fl  # noqa: E402
+
+
+def medir(fn, repeat):
+    melhor, out = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            out = fn()
+        melhor = min(melhor, time.perf_counter() - t0)
+    return melhor, out
+
+
+def bench_parse(root, repeat, workers):
+    arquivos = fl.discover_files(root)
+    print(f"=== leitura: {len(arquivos)} arquivos em {root} ===")
+    t_regex, ref = medir(lambda: fl.load_folder(root, workers=1, bulk=False), repeat)
+    print(f"regex por linha      {t_regex * 1000:8.1f} ms")
+    t_bulk, df = medir(lambda: fl.load_folder(root, workers=1), repeat)
+    pd.testing.assert_frame_equal(df, ref)
+    print(f"bloco (1 processo)   {t_bulk * 1000:8.1f} ms  {t_regex / t_bulk:5.1f}×")
+    if workers > 1:
+        t_pool, df = medir(lambda: fl.load_folder(root, workers=workers), repeat)
+        pd.testing.assert_frame_equal(df, ref)
+        print(f"bloco ({workers} processos)  {t_pool * 1000:8.1f} ms  {t_regex / t_pool:5.1f}×")
+
+
+def bench_cache(root, repeat):
+    print("=== cache de parse ===")
+    with tempfile.TemporaryDirectory() as d:
+        _, ref = medir(lambda: fl.load_folder(root, workers=1), 1)
+        frios = []
+        for _ in range(repeat):
+            for entrada in Path(d).iterdir():
+                entrada.unlink()
+            t, df = medir(lambda: fl.load_folder(root, workers=1, cache=d), 1)
+            frios.append(t)
+        pd.testing.assert_frame_equal(df, ref)
+        t_quente, df = medir(lambda: fl.load_folder(root, workers=1, cache=d), repeat)
+        pd.testing.assert_frame_equal(df, ref)
+        ano = int(ref["year"].max())
+        t_ano, df = medir(lambda: fl.load_folder(root, workers=1, cache=d, year=ano), repeat)
+        t_ano_frio, _ = medir(lambda: fl.load_folder(root, workers=1, year=ano), repeat)
+        t_frio = min(frios)
+        print(f"frio (parse + grava) {t_frio * 1000:8.1f} ms")
+        print(f"quente               {t_quente * 1000:8.1f} ms  {t_frio / t_quente:5.1f}×")
+        print(f"--year {ano} sem cache {t_ano_frio * 1000:8.1f} ms  ({len(df)} linhas)")
+        print(f"--year {ano} quente    {t_ano * 1000:8.1f} ms  {t_frio / t_ano:5.1f}×")
+
+
+def grade_sintetica(res, lon_span, lat_span, anos=(2000, 2010), seed=0):
+    """Densidades lognormais por gás numa grade `res`° (cada gás ausente em ~10% das células)."""
+    rng = np.random.default_rng(seed)
+    lon, lat = np.meshgrid(np.round(np.arange(-lon_span / 2, lon_span / 2, res), 6),
+                           np.round(np.arange(-lat_span / 2, lat_span / 2, res), 6))
+    blocos = []
+    for ano in anos:
+        for gas in ["CO", "NMVOC", "NOx", "CH4"]:
+            manter = rng.random(lon.size) > 0.1
+            dens = rng.lognormal(0.0, 2.0, lon.size)
+            dens[rng.random(lon.size) < 0.05] = 0.0  # empates exatos no mínimo
+            blocos.append(pd.DataFrame({"lon": lon.ravel()[manter], "lat": lat.ravel()[manter], "year": ano,
+                                        "gas": gas, "dens_kgkm2": dens[manter]}))
+    return pd.concat(blocos, ignore_index=True)
+
+
+def classificar_legado(df, smooth=0.05):
+    """Classificação como era em fuzzy_logic.run: laço por linha nos empates, merges e apply."""
+    import skfuzzy as fuzz
+    out_blocks = []
+    for g, gdf in df.groupby("gas", sort=False):
+        x = gdf["dens_kgkm2"].to_numpy()
+        q10, q35, q65, q85, q97 = np.quantile(x, [0.10, 0.35, 0.65, 0.85, 0.97])
+        minv, maxv = float(np.min(x)), float(np.max(x))
+        if not np.isfinite(minv) or not np.isfinite(maxv) or np.isclose(minv, maxv):
+            minv, maxv = minv, minv + 1.0
+        traps = fl.build_traps_from_quantiles(minv, q10, q35, q65, q85, q97, maxv, smooth_frac=smooth)
+        mus = np.vstack([fuzz.trapmf(x, traps[c]) for c in fl.CLASSES]).T
+        idx_max = np.argmax(mus, axis=1)
+        labels = []
+        for i, row in enumerate(mus):
+            mx = row[idx_max[i]]
+            ties = np.where(np.abs(row - mx) < 1e-12)[0]
+            labels.append(fl.CLASSES[int(np.max(ties))])
+        gdf = gdf.assign(**{f"{g}_label": labels})
+        out_blocks.append(gdf[["lon", "lat", "year", f"{g}_label"]])
+    out_df = None
+    for block in out_blocks:
+        out_df = block.copy() if out_df is None else out_df.merge(block, on=["lon", "lat", "year"], how="outer")
+
+    def worst_class(row):
+        sev = [fl.SEVERITY[lab] for g in ["CO", "NMVOC", "NOx", "CH4"]
+               if isinstance(lab := row.get(f"{g}_label"), str) and lab in fl.SEVERITY]
+        return fl.CLASSES[max(sev) - 1] if sev else "Good"
+
+    out_df["final_label"] = out_df.apply(worst_class, axis=1)
+    return out_df.sort_values(["year", "lat", "lon"]).reset_index(drop=True)
+
+
+def bench_classificacao(res, lon_span, lat_span, repeat):
+    df = grade_sintetica(res, lon_span, lat_span)
+    print(f"=== classificação: grade {res}° {lon_span}°×{lat_span}°, {len(df)} linhas ===")
+    t_novo, novo = medir(lambda: fl.classify(df), repeat)
+    try:
+        t_legado, legado = medir(lambda: classificar_legado(df), 1)
+    except ImportError:
+        print(f"vetorizado           {t_novo * 1000:8.1f} ms  (skfuzzy ausente: sem comparação)")
+        return
+    assert novo.to_csv(index=False) == legado.to_csv(index=False), "saída diverge do caminho antigo"
+    print(f"linha a linha        {t_legado * 1000:8.1f} ms")
+    print(f"vetorizado           {t_novo * 1000:8.1f} ms  {t_legado / t_novo:5.1f}×  (CSV idêntico)")
+
+
+def pico(fn):
+    tracemalloc.start()
+    try:
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            out = fn()
+        return time.perf_counter() - t0, tracemalloc.get_traced_memory()[1], out
+    finally:
+        tracemalloc.stop()
+
+
+def erro_posto(x, estimados, qs):
+    ordenado = np.sort(x)
+    return float(np.abs(np.searchsorted(ordenado, estimados, side="right") / len(x) - np.asarray(qs)).max())
+
+
+def bench_streaming(root, res, lon_span, lat_span, sketch_k):
+    print(f"=== streaming (KLL k={sketch_k}) ===")
+    with tempfile.TemporaryDirectory() as d:
+        d = Path(d)
+        medir(lambda: fl.load_folder(root, workers=1, cache=d / "cache"), 1)  # cache quente para os dois modos
+        t_ex, m_ex, _ = pico(lambda: fl.run(root=root, out=d / "exato.csv", columnar=False, cache_dir=d / "cache"))
+        t_st, m_st, sketches = pico(lambda: fl.run_streaming(root=root, out=d / "stream.csv", cache_dir=d / "cache",
+                                                             sketch_k=sketch_k))
+        a, b = pd.read_csv(d / "exato.csv"), pd.read_csv(d / "stream.csv")
+        _, df = medir(lambda: fl.load_folder(root, workers=1, cache=d / "cache"), 1)
+    print("(tempos sob tracemalloc)")
+    print(f"exato      {t_ex * 1000:8.1f} ms  pico {m_ex / 1e6:7.1f} MB")
+    print(f"streaming  {t_st * 1000:8.1f} ms  pico {m_st / 1e6:7.1f} MB  "
+          f"final_label igual em {(a['final_label'] == b['final_label']).mean():.3%}")
+    area = fl.cell_area_km2(df["lat"].to_numpy(), df["lon"].to_numpy())
+    dens = df["value"].to_numpy() * df["unit_scale"].to_numpy() / np.where(area <= 0, 1e-9, area)
+    for g, sk in sketches.items():
+        x = dens[(df["gas"] == g).to_numpy()]
+        print(f"  {g:6s} erro de posto medido {erro_posto(x, sk.quantile(fl.QUANTILES), fl.QUANTILES):.4%}"
+              f"  limite {sk.rank_error():.4%}  ({sk.retained} de {sk.n} valores retidos)")
+    # Mesmo sketch no volume da grade sintética, alimentado arquivo a arquivo (ano × gás)
+    sint = grade_sintetica(res, lon_span, lat_span)
+    for g, gdf in sint.groupby("gas", sort=False):
+        sk = fl.KLLSketch(k=sketch_k)
+        for _, bloco in gdf.groupby("year"):
+            sk.update(bloco["dens_kgkm2"].to_numpy())
+        x = gdf["dens_kgkm2"].to_numpy()
+        print(f"  {g:6s} grade {res}°: erro medido {erro_posto(x, sk.quantile(fl.QUANTILES), fl.QUANTILES):.4%}"
+              f"  limite {sk.rank_error():.4%}  ({sk.retained} de {sk.n} valores retidos)")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark do fuzzy_logic.py")
+    ap.add_argument("--root", default=str(fl.DEFAULT_DATA_ROOT))
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--res", type=float, default=0.1, help="Resolução da grade sintética (graus).")
+    ap.add_argument("--lon-span", type=float, default=60.0)
+    ap.add_argument("--lat-span", type=float, default=30.0)
+    ap.add_argument("--sketch-k", type=int, default=2000)
+    args = ap.parse_args()
+    bench_parse(Path(args.root), args.repeat, args.workers)
+    bench_cache(Path(args.root), args.repeat)
+    bench_classificacao(args.res, args.lon_span, args.lat_span, args.repeat)
+    bench_streaming(Path(args.root), args.res, args.lon_span, args.lat_span, args.sketch_k)
+
+
+if __name__ == "__main__":
+    main()
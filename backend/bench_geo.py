@@ -0,0 +1,180 @@
+"""
+Benchmark do índice geoespacial: GeoIndex (k-d tree sobre vetores unitários, distâncias em km)
+contra o IndexFlatL2 do FAISS sobre graus crus (o índice anterior do rag_geo), e consulta
+direta no raster de rótulos (LabelRaster) contra o kNN sobre o tempo.csv. A comparação com
+o FAISS só roda com `pip install faiss-cpu` (fora do requirements.txt da API).
+
+Uso:
+    python bench_geo.py --sizes 40000,4000000 --queries 2000 --k 10
+    python bench_geo.py --raster --queries 1000000
+    python bench_geo.py --batch --queries 100000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from services.geo_index import GeoIndex, haversine_km
+
+
+def pontos_na_esfera(n, rng):
+    """Distribuição uniforme sobre a esfera (lat, lon em graus)."""
+    lat = np.degrees(np.arcsin(rng.uniform(-1.0, 1.0, n)))
+    lon = rng.uniform(-180.0, 180.0, n)
+    return lat, lon
+
+
+def grade_tempo(n):
+    """Grade regular de 1° como a do tempo.csv, repetida até n pontos (cenários/anos)."""
+    lat, lon = np.meshgrid(np.arange(-90.0, 90.0), np.arange(-180.0, 180.0), indexing="ij")
+    lat, lon = lat.ravel(), lon.ravel()
+    reps = int(np.ceil(n / lat.size))
+    return np.tile(lat, reps)[:n], np.tile(lon, reps)[:n]
+
+
+def medir(fn, repeticoes=1):
+    t0 = time.perf_counter()
+    for _ in range(repeticoes):
+        out = fn()
+    return (time.perf_counter() - t0) / repeticoes, out
+
+
+def recall(indices, verdade):
+    acertos = sum(len(set(a) & set(b)) for a, b in zip(indices, verdade))
+    return acertos / verdade.size
+
+
+def bench(n, n_queries, k, rng, dados):
+    lat, lon = grade_tempo(n) if dados == "grid" else pontos_na_esfera(n, rng)
+    qlat, qlon = pontos_na_esfera(n_queries, rng)
+    print(f"\n=== n={n:,} ({dados}) consultas={n_queries:,} k={k} ===")
+
+    t_build, geo = medir(lambda: GeoIndex(lat, lon))
+    t_batch, (dist, idx) = medir(lambda: geo.query(qlat, qlon, k=k))
+    amostra = min(n_queries, 500)
+    t_single, _ = medir(lambda: [geo.query(qlat[i], qlon[i], k=k) for i in range(amostra)])
+    print(f"GeoIndex   build={t_build * 1000:9.1f}ms  lote={n_queries / t_batch:12,.0f} q/s"
+          f"  individual={amostra / t_single:10,.0f} q/s")
+
+    # Verdade de referência: força bruta em haversine para uma amostra de consultas
+    n_ref = min(n_queries, 50 if n > 1_000_000 else 500)
+    verdade, dist_ref = [], []
+    for i in range(n_ref):
+        d = haversine_km(qlat[i], qlon[i], lat, lon)
+        top = np.argpartition(d, k)[:k]
+        top = top[np.argsort(d[top], kind="stable")]
+        verdade.append(top)
+        dist_ref.append(d[top])
+    verdade, dist_ref = np.stack(verdade), np.stack(dist_ref)
+    print(f"GeoIndex   recall@{k}={recall(idx[:n_ref], verdade):.4f}"
+          f"  erro_max_dist={np.abs(dist[:n_ref] - dist_ref).max():.2e} km")
+
+    try:
+        import faiss
+    except ImportError:
+        print("faiss não instalado — comparação com IndexFlatL2 ignorada")
+        return
+    coords = np.stack([lat, lon], axis=1).astype("float32")
+    queries = np.stack([qlat, qlon], axis=1).astype("float32")
+
+    def construir():
+        index = faiss.IndexFlatL2(2)
+        index.add(coords)
+        return index
+
+    t_build, flat = medir(construir)
+    # Força bruta O(n) por consulta: limita o lote nos tamanhos grandes
+    n_lote_flat = max(n_ref, min(n_queries, 200 if n > 1_000_000 else n_queries))
+    t_batch, (_, fidx) = medir(lambda: flat.search(queries[:n_lote_flat], k))
+    amostra = min(amostra, 50 if n > 1_000_000 else amostra)
+    t_single, _ = medir(lambda: [flat.search(queries[i:i + 1], k) for i in range(amostra)])
+    print(f"FlatL2     build={t_build * 1000:9.1f}ms  lote={n_lote_flat / t_batch:12,.0f} q/s"
+          f"  individual={amostra / t_single:10,.0f} q/s")
+    print(f"FlatL2     recall@{k}={recall(fidx[:n_ref], verdade):.4f} (distância em graus², não km)")
+
+
+def bench_raster(n_queries, k, rng):
+    """Rótulo da célula de cada ponto: kNN k=1 + iloc (caminho antigo) vs indexação no raster."""
+    from services.geo_raster import cell_index
+    from services.geo_store import dados_geo
+    from services.rag_geo import buscar_pontos_proximos, buscar_celulas_raster
+
+    t_build, geo = medir(dados_geo)
+    df, index, raster = geo.df, geo.index, geo.raster
+    ano = raster.years[-1]
+    lat, lon = pontos_na_esfera(n_queries, rng)
+    # Só pontos em células com dado, para comparar os dois caminhos
+    rows, cols = cell_index(lat, lon)
+    com_dado = raster.codes[raster.year_index(ano), rows, cols, -1] >= 0
+    lat, lon = np.floor(lat[com_dado]) + 0.5, np.floor(lon[com_dado]) + 0.5
+    n = lat.size
+    print(f"\n=== raster {raster.codes.shape} int8, {n:,} consultas em células com dado ===")
+
+    t_raster, codes = medir(lambda: raster.lookup(lat, lon, ano))
+    index_ano, linhas = index.partition(ano)
+    final = df["final_label"].to_numpy()
+
+    def via_knn():
+        # kNN no canto inferior esquerdo (coordenada gravada no CSV) acha a própria célula
+        _, idx = index_ano.query(np.floor(lat), np.floor(lon), k=1)
+        return final[linhas[idx[:, 0]]]
+
+    t_knn, rotulos = medir(via_knn)
+    from services.avaliacao import LEVELS
+    iguais = np.mean(np.array(LEVELS)[codes[:, -1]] == rotulos)
+    print(f"raster     carga={t_build * 1000:7.1f}ms  lote={n / t_raster:14,.0f} pontos/s")
+    print(f"kNN k=1    lote={n / t_knn:14,.0f} pontos/s  concordância={iguais:.4f}")
+
+    amostra = min(n, 500)
+    t_kring, _ = medir(lambda: [raster.kring(lat[i], lon[i], ano, k=2) for i in range(amostra)])
+    print(f"anel 5×5 (só indexação): {amostra / t_kring:9,.0f}/s")
+    t_ring, _ = medir(lambda: [buscar_celulas_raster(lat[i], lon[i], raster, ano, k=k) for i in range(amostra)])
+    t_pp, _ = medir(lambda: [buscar_pontos_proximos(lat[i], lon[i], index, df, k=k, year=ano) for i in range(amostra)])
+    print(f"vizinhança k={k} em DataFrame: anel raster {amostra / t_ring:9,.0f}/s  kNN + iloc {amostra / t_pp:9,.0f}/s")
+
+
+def bench_lote(n_queries, k, rng):
+    """Vizinhos de n assinantes: uma busca vetorizada (n, k) vs buscar_pontos_proximos por assinante."""
+    import contextlib
+    import io
+    from services.geo_store import dados_geo
+    from services.rag_geo import buscar_pontos_proximos, buscar_vizinhos_em_lote
+
+    geo = dados_geo()
+    lat, lon = pontos_na_esfera(n_queries, rng)
+    print(f"\n=== lote de {n_queries:,} assinantes, k={k}, partição de {len(geo.index.partition(2020)[0]):,} células ===")
+    t_lote, vizinhos = medir(lambda: buscar_vizinhos_em_lote(lat, lon, geo.index, geo.colunas, k, 2020), 3)
+    print(f"lote        {n_queries / t_lote:12,.0f} consultas/s  → matriz {vizinhos.linhas.shape}")
+    amostra = min(n_queries, 1000)
+    t_frame, _ = medir(lambda: [vizinhos.frame(i) for i in range(amostra)])
+    print(f"registros   {amostra / t_frame:12,.0f} consultas/s  (materialização sob demanda)")
+    with contextlib.redirect_stdout(io.StringIO()):
+        t_um, _ = medir(lambda: [buscar_pontos_proximos(lat[i], lon[i], geo.index, geo.df, k, 2020)
+                                 for i in range(amostra)])
+    print(f"por usuário {amostra / t_um:12,.0f} consultas/s  (busca + iloc por assinante)")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark GeoIndex vs FAISS IndexFlatL2.")
+    ap.add_argument("--sizes", default="40000,4000000")
+    ap.add_argument("--queries", type=int, default=2000)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--data", choices=["sphere", "grid"], default="sphere")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--raster", action="store_true", help="Compara o raster de rótulos com o kNN no tempo.csv.")
+    ap.add_argument("--batch", action="store_true", help="Busca em lote para assinantes vs uma busca por assinante.")
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    if args.raster:
+        bench_raster(args.queries, args.k, rng)
+        return
+    if args.batch:
+        bench_lote(args.queries, args.k, rng)
+        return
+    for n in (int(s) for s in args.sizes.split(",")):
+        bench(n, args.queries, args.k, rng, args.data)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Benchmark do caminho RAG + relatório (busca geo → avaliação → relatório via SLM).
+Com --stub sobe o ollama_stub.py no próprio processo: resultados determinísticos, sem modelo real.
+
+Uso:
+    python bench_relatorio.py --stub --points 40 --concurrency 2
+    OLLAMA_HOST=http://gpu-box:11434 python bench_relatorio.py --points 20 --evaluation slm
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def _percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(int(len(ordenados) * p), len(ordenados) - 1)]
+
+
+def iniciar_stub(port, args):
+    import uvicorn
+    from ollama_stub import StubConfig, create_app
+
+    config = StubConfig(
+        tokens_per_second=args.tokens_per_second,
+        prompt_tokens_per_second=args.prompt_tokens_per_second,
+        latency_ms=args.latency_ms,
+        failure_rate=args.failure_rate,
+        response_tokens=args.response_tokens,
+        seed=args.seed,
+    )
+    server = uvicorn.Server(uvicorn.Config(create_app(config), host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark do pipeline RAG + relatório.")
+    ap.add_argument("--points", type=int, default=20, help="Coordenadas consultadas.")
+    ap.add_argument("--concurrency", type=int, default=1, help="Relatórios gerados em paralelo.")
+    ap.add_argument("--evaluation", choices=["deterministic", "slm"], default="deterministic")
+    ap.add_argument("--profile", default="adulto")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--stub", action="store_true", help="Usa o ollama_stub em processo (ignora OLLAMA_HOST).")
+    ap.add_argument("--stub-port", type=int, default=11500)
+    ap.add_argument("--tokens-per-second", type=float, default=200.0)
+    ap.add_argument("--prompt-tokens-per-second", type=float, default=2000.0)
+    ap.add_argument("--latency-ms", type=float, default=50.0)
+    ap.add_argument("--response-tokens", type=int, default=120)
+    ap.add_argument("--failure-rate", type=float, default=0.0)
+    args = ap.parse_args()
+
+    server = None
+    if args.stub:
+        server = iniciar_stub(args.stub_port, args)
+        os.environ["OLLAMA_HOST"] = f"http://127.0.0.1:{args.stub_port}"
+
+    # Cliente compartilhado sem cache em disco: toda chamada vai ao servidor
+    from core import slm
+    slm._client = slm.SLMClient(host=os.environ.get("OLLAMA_HOST", slm.OLLAMA_HOST), cache=None)
+
+    from services.avaliacao import gerar_json_avaliacao
+    from services.rag_geo import carregar_dados_csv, carregar_ou_criar_index, buscar_pontos_proximos, gerar_json_via_slm
+    from services.relatorio import conhecimento, gerar_relatorio_amigavel
+
+    df = carregar_dados_csv()
+    index = carregar_ou_criar_index(df)
+    chem_effects, about = conhecimento()
+
+    rng = random.Random(args.seed)
+    amostra = df.sample(n=args.points, random_state=args.seed)
+    pontos = [(float(r.lat) + rng.uniform(-0.5, 0.5), float(r.lon) + rng.uniform(-0.5, 0.5), rng.randint(101, 300))
+              for r in amostra.itertuples()]
+    tempos = {"geo": [], "avaliacao": [], "relatorio": [], "total": []}
+    falhas = []
+
+    def processar(ponto):
+        lat, lon, aqi = ponto
+        t0 = time.perf_counter()
+        try:
+            df_resultado = buscar_pontos_proximos(lat, lon, index, df, k=10)
+            t1 = time.perf_counter()
+            if args.evaluation == "slm":
+                json_final = gerar_json_via_slm(lat, lon, df_resultado)
+            else:
+                json_final = gerar_json_avaliacao(lat, lon, df_resultado)
+            t2 = time.perf_counter()
+            gerar_relatorio_amigavel(aqi, json.loads(json_final), chem_effects, about, args.profile)
+            t3 = time.perf_counter()
+        except Exception as e:
+            falhas.append(str(e))
+            return
+        tempos["geo"].append(t1 - t0)
+        tempos["avaliacao"].append(t2 - t1)
+        tempos["relatorio"].append(t3 - t2)
+        tempos["total"].append(t3 - t0)
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(processar, pontos))
+    wall = time.perf_counter() - inicio
+
+    print("\n" + "=" * 72)
+    print(f"Pontos={args.points} concorrência={args.concurrency} avaliação={args.evaluation} "
+          f"host={os.environ.get('OLLAMA_HOST', slm.OLLAMA_HOST)}")
+    print(f"Tempo total: {wall:.2f}s  vazão: {len(tempos['total']) / wall:.2f} relatórios/s  falhas: {len(falhas)}")
+    for etapa, valores in tempos.items():
+        print(f"  {etapa:<10} p50={_percentil(valores, 0.5) * 1000:8.1f}ms  p95={_percentil(valores, 0.95) * 1000:8.1f}ms"
+              f"  max={max(valores, default=0) * 1000:8.1f}ms")
+    print(f"SLM: {slm.slm_stats()}")
+    print("=" * 72)
+
+    if server is not None:
+        server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
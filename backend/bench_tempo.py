@@ -0,0 +1,80 @@
+"""
+Benchmark de carga do dataset de rótulos: tempo.csv (pandas.read_csv) contra o formato
+colunar tempo.cols/ (mmap). Cada leitor roda num subprocesso novo para medir tempo e RSS
+sem cache do próprio interpretador.
+
+Uso:
+    python bench_tempo.py --csv ./services/data/tempo.csv --repeat 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+LEITORES = ["csv", "colunar", "colunar+uso"]
+
+
+def rss_kb() -> int:
+    with open("/proc/self/status", "r") as f:
+        for linha in f:
+            if linha.startswith("VmRSS:"):
+                return int(linha.split()[1])
+    return 0
+
+
+def filho(leitor: str, csv: str):
+    import numpy as np
+    import pandas as pd
+    from services.tempo_colunar import caminho_colunar, carregar_colunar
+
+    base = rss_kb()
+    t0 = time.perf_counter()
+    if leitor == "csv":
+        df = pd.read_csv(csv)
+    else:
+        df = carregar_colunar(caminho_colunar(csv))
+    t_carga = time.perf_counter() - t0
+    if leitor == "colunar+uso":
+        # Toca todas as páginas (coordenadas e códigos), como uma varredura completa faria
+        float(np.asarray(df["lat"]).sum() + np.asarray(df["lon"]).sum())
+        int(sum(int(df[c].array.codes.sum()) for c in df.columns if c.endswith("_label")))
+    t_total = time.perf_counter() - t0
+    print(json.dumps({"carga_ms": t_carga * 1000, "total_ms": t_total * 1000, "rss_kb": rss_kb() - base,
+                      "linhas": len(df)}))
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Carga do tempo.csv vs dataset colunar (tempo.cols).")
+    ap.add_argument("--csv", default="./services/data/tempo.csv")
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--child", choices=LEITORES, help=argparse.SUPPRESS)
+    args = ap.parse_args()
+    if args.child:
+        filho(args.child, args.csv)
+        return
+
+    from services.tempo_colunar import caminho_colunar, colunar_atualizado
+    if not colunar_atualizado(args.csv):
+        raise SystemExit(f"{caminho_colunar(args.csv)} ausente ou desatualizado: "
+                         f"rode `python -m services.tempo_colunar {args.csv}`")
+    tamanho_csv = os.path.getsize(args.csv)
+    tamanho_cols = sum(e.stat().st_size for e in os.scandir(caminho_colunar(args.csv)))
+    print(f"tempo.csv {tamanho_csv / 1e6:.2f} MB  |  tempo.cols {tamanho_cols / 1e6:.2f} MB")
+    for leitor in LEITORES:
+        medidas = []
+        for _ in range(args.repeat):
+            out = subprocess.run([sys.executable, __file__, "--child", leitor, "--csv", args.csv],
+                                 capture_output=True, text=True, check=True)
+            medidas.append(json.loads(out.stdout.strip().splitlines()[-1]))
+        carga = statistics.median(m["carga_ms"] for m in medidas)
+        total = statistics.median(m["total_ms"] for m in medidas)
+        rss = statistics.median(m["rss_kb"] for m in medidas)
+        print(f"{leitor:12s} carga={carga:8.2f}ms  total={total:8.2f}ms  ΔRSS={rss / 1024:7.2f} MB"
+              f"  linhas={medidas[0]['linhas']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -16,3 +16,83 @@ METEOMATICS_PASSWORD = os.getenv("METEOMATICS_PASSWORD")
 SLM_PROVIDER = os.getenv("SLM_PROVIDER", "ollama").lower()
 OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "qwen2.5-coder:1.5b")
+
+# Outbox de alertas (envio durável com dedupe, retries e janela de supressão)
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "2"))
+OUTBOX_LEASE_SECONDS = int(os.getenv("OUTBOX_LEASE_SECONDS", "120"))
+OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", "5"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+OUTBOX_BACKOFF_BASE_SECONDS = float(os.getenv("OUTBOX_BACKOFF_BASE_SECONDS", "30"))
+OUTBOX_BACKOFF_MAX_SECONDS = float(os.getenv("OUTBOX_BACKOFF_MAX_SECONDS", "3600"))
+OUTBOX_BUCKET_MINUTES = int(os.getenv("OUTBOX_BUCKET_MINUTES", "60"))
+ALERT_SUPPRESSION_MINUTES = int(os.getenv("ALERT_SUPPRESSION_MINUTES", "360"))
+CELL_RESOLUTION_DEG = float(os.getenv("CELL_RESOLUTION_DEG", "0.1"))
+
+# Jobs em background (ex.: /alerts/dispatch)
+JOBS_MAX_CONCURRENT = int(os.getenv("JOBS_MAX_CONCURRENT", "2"))
+JOBS_HISTORY = int(os.getenv("JOBS_HISTORY", "100"))
+
+# Agendador do orquestrador (cron de 5 campos, horário local do servidor)
+ORCHESTRATOR_CRON = os.getenv("ORCHESTRATOR_CRON", "0 * * * *")
+ORCHESTRATOR_JITTER_SECONDS = float(os.getenv("ORCHESTRATOR_JITTER_SECONDS", "60"))
+ORCHESTRATOR_CATCH_UP = os.getenv("ORCHESTRATOR_CATCH_UP", "run_once")
+ORCHESTRATOR_LOCK_TTL_SECONDS = int(os.getenv("ORCHESTRATOR_LOCK_TTL_SECONDS", "900"))
+ORCHESTRATOR_IN_API = os.getenv("ORCHESTRATOR_IN_API", "false").lower() in ("1", "true", "yes")
+
+# Limites de concorrência por etapa do orquestrador (executores dedicados)
+FETCH_CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY", "8"))
+SLM_CONCURRENCY = int(os.getenv("SLM_CONCURRENCY", "1"))
+GEO_CONCURRENCY = int(os.getenv("GEO_CONCURRENCY", "2"))
+SMTP_CONCURRENCY = int(os.getenv("SMTP_CONCURRENCY", "4"))
+
+# Pipeline em streaming do orquestrador
+PIPELINE_BATCH_SIZE = int(os.getenv("PIPELINE_BATCH_SIZE", "500"))
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "64"))
+FETCH_BATCH_POINTS = int(os.getenv("FETCH_BATCH_POINTS", "50"))
+
+# Execuções do orquestrador (checkpoints / retomada / modo incremental)
+ORCHESTRATOR_MODE = os.getenv("ORCHESTRATOR_MODE", "full")
+RUN_STALE_SECONDS = int(os.getenv("RUN_STALE_SECONDS", "300"))
+
+# Execução distribuída do orquestrador (shards por célula, coordenados via leases no MongoDB)
+ORCHESTRATOR_SHARDS = int(os.getenv("ORCHESTRATOR_SHARDS", "0"))
+SHARD_LEASE_SECONDS = int(os.getenv("SHARD_LEASE_SECONDS", "120"))
+SHARD_PERIOD_MINUTES = int(os.getenv("SHARD_PERIOD_MINUTES", "60"))
+
+# Cache de relatórios do SLM por (célula, snapshot dos dados, faixa de AQI, perfil, versão do prompt)
+REPORT_CACHE_TTL_HOURS = int(os.getenv("REPORT_CACHE_TTL_HOURS", "168"))
+
+# Cache em disco das respostas do SLM (endereçado pelo conteúdo: modelo + mensagens + opções)
+SLM_CACHE_ENABLED = os.getenv("SLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+SLM_CACHE_DIR = os.getenv("SLM_CACHE_DIR", "./services/storage_slm_cache")
+SLM_CACHE_MAX_MB = float(os.getenv("SLM_CACHE_MAX_MB", "256"))
+
+# Ano de cenário do tempo.csv usado na busca de pontos próximos (vazio = mais recente até o ano corrente)
+GEO_YEAR = os.getenv("GEO_YEAR", "")
+# Artefatos versionados (coordenadas + raster de rótulos) derivados do tempo.csv
+GEO_STORE_DIR = os.getenv("GEO_STORE_DIR", "./services/storage_geo")
+
+# Avaliação estruturada dos pontos próximos: "deterministic" (rótulos do tempo.csv) ou "slm" (JSON via modelo)
+EVALUATION_MODE = os.getenv("EVALUATION_MODE", "deterministic").lower()
+
+# Orçamento (estimado) de tokens do prompt do relatório amigável
+REPORT_PROMPT_TOKEN_BUDGET = int(os.getenv("REPORT_PROMPT_TOKEN_BUDGET", "1600"))
+
+# Relatório sob demanda em streaming (SSE): limite global de gerações simultâneas no Ollama
+REPORT_STREAM_CONCURRENCY = int(os.getenv("REPORT_STREAM_CONCURRENCY", "2"))
+REPORT_STREAM_MAX_QUEUE = int(os.getenv("REPORT_STREAM_MAX_QUEUE", "8"))
+REPORT_STREAM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("REPORT_STREAM_QUEUE_TIMEOUT_SECONDS", "15"))
+# Streaming: silêncio máximo do Ollama entre trechos (inclui o prefill) e prazo total da geração;
+# estourado, o stream termina com `error` e a vaga do limitador é liberada
+SLM_STREAM_READ_TIMEOUT_SECONDS = float(os.getenv("SLM_STREAM_READ_TIMEOUT_SECONDS", "30"))
+REPORT_STREAM_DEADLINE_SECONDS = float(os.getenv("REPORT_STREAM_DEADLINE_SECONDS", "120"))
+
+# Prazo por geração de relatório no orquestrador; estourado (ou com erro no modelo) usa o template
+REPORT_DEADLINE_SECONDS = float(os.getenv("REPORT_DEADLINE_SECONDS", "60"))
+# Timeout HTTP máximo das chamadas ao Ollama; no orquestrador cada chamada usa o menor entre ele
+# e o tempo que resta do REPORT_DEADLINE_SECONDS, arredondado para baixo a um degrau de
+# core.slm.TIMEOUT_STEPS (a thread do pool é liberada junto com o prazo)
+SLM_TIMEOUT_SECONDS = float(os.getenv("SLM_TIMEOUT_SECONDS", "90"))
+
+# Recursos estáticos (tabela de efeitos, texto sobre AQI): intervalo de checagem de alteração em disco
+KNOWLEDGE_CHECK_SECONDS = float(os.getenv("KNOWLEDGE_CHECK_SECONDS", "5"))
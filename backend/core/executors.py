@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from core.config import FETCH_CONCURRENCY, SLM_CONCURRENCY, GEO_CONCURRENCY, SMTP_CONCURRENCY
+
+logger = logging.getLogger("air-api")
+
+STAGE_LIMITS = {
+    "fetch": FETCH_CONCURRENCY,
+    "slm": SLM_CONCURRENCY,
+    "geo": GEO_CONCURRENCY,
+    "smtp": SMTP_CONCURRENCY,
+}
+
+
+class StagePool:
+    """
+    Pool limitado para uma etapa do pipeline. Trabalho bloqueante roda em um
+    ThreadPoolExecutor dedicado; o semáforo limita quantas chamadas ficam em voo,
+    então a fila não cresce sem limite dentro do executor (backpressure).
+    """
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = max(int(limit), 1)
+        self._executor = None
+        self._semaphore = None
+        self._loop = None
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.busy_seconds = 0.0
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.limit)
+            self._loop = loop
+        return self._semaphore
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.limit, thread_name_prefix=f"stage-{self.name}")
+        return self._executor
+
+    @asynccontextmanager
+    async def slot(self):
+        """Reserva uma vaga da etapa (para etapas que já são async, ex.: fetch HTTP)."""
+        async with self._get_semaphore():
+            self.in_flight += 1
+            t0 = time.perf_counter()
+            ok = False
+            try:
+                yield
+                ok = True
+            finally:
+                self.in_flight -= 1
+                self.busy_seconds += time.perf_counter() - t0
+                if ok:
+                    self.completed += 1
+                else:
+                    self.failed += 1
+
+    async def run(self, fn, *args, **kwargs):
+        """Executa `fn` bloqueante no executor da etapa, respeitando o limite de concorrência."""
+        async with self.slot():
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), lambda: fn(*args, **kwargs))
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "failed": self.failed,
+            "busy_seconds": round(self.busy_seconds, 3),
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+_pools = {}
+
+
+def get_pool(name: str) -> StagePool:
+    pool = _pools.get(name)
+    if pool is None:
+        pool = _pools[name] = StagePool(name, STAGE_LIMITS.get(name, 1))
+    return pool
+
+
+def pools_stats() -> dict:
+    return {name: pool.stats() for name, pool in _pools.items()}
+
+
+def shutdown_pools():
+    for pool in _pools.values():
+        pool.shutdown()
@@ -0,0 +1,105 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from core.config import KNOWLEDGE_CHECK_SECONDS
+
+logger = logging.getLogger("air-api")
+
+
+class Resource:
+    """Recurso carregado: valor já na forma final de uso, versão (sha1 do conteúdo) e origem."""
+
+    def __init__(self, name: str, path: str, loader):
+        self.name = name
+        self.path = path
+        self.loader = loader
+        self.value = None
+        self.version = None
+        self.loaded_at = None
+        self.reloads = 0
+        self._stat = None
+        self._checked_at = 0.0
+        # Por recurso: um carregamento lento (ex.: "geo") não bloqueia a leitura dos demais
+        self.lock = threading.Lock()
+
+    def _signature(self):
+        st = os.stat(self.path)
+        return st.st_mtime_ns, st.st_size
+
+    def refresh(self, force: bool = False):
+        """Recarrega se o arquivo mudou (mtime/tamanho e, confirmando, o hash do conteúdo)."""
+        now = time.monotonic()
+        if not force and self.value is not None and now - self._checked_at < KNOWLEDGE_CHECK_SECONDS:
+            return
+        self._checked_at = now
+        try:
+            stat = self._signature()
+        except OSError as e:
+            if self.value is None:
+                raise
+            logger.warning("Recurso %s indisponível (%s); mantendo versão %s", self.name, e, self.version[:8])
+            return
+        if not force and stat == self._stat:
+            return
+        with open(self.path, "rb") as f:
+            version = hashlib.sha1(f.read()).hexdigest()
+        self._stat = stat
+        if version == self.version:
+            return
+        try:
+            value = self.loader(self.path)
+        except Exception as e:
+            if self.value is None:
+                raise
+            logger.warning("Falha ao recarregar %s: %s; mantendo versão %s", self.name, e, self.version[:8])
+            return
+        if self.version is not None:
+            self.reloads += 1
+            logger.info("🔄 Recurso %s recarregado (%s → %s)", self.name, self.version[:8], version[:8])
+        self.value, self.version, self.loaded_at = value, version, datetime.utcnow()
+
+
+class KnowledgeRegistry:
+    """
+    Registro de recursos estáticos compartilhado pelo processo (API e orquestrador): cada
+    recurso é lido e convertido uma única vez e recarregado quando o arquivo muda.
+    """
+
+    def __init__(self):
+        self._resources = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, path: str, loader):
+        with self._lock:
+            if name not in self._resources:
+                self._resources[name] = Resource(name, path, loader)
+
+    def resource(self, name: str) -> Resource:
+        resource = self._resources[name]
+        with resource.lock:
+            resource.refresh()
+        return resource
+
+    def get(self, name: str):
+        return self.resource(name).value
+
+    def version(self, name: str) -> str:
+        return self.resource(name).version
+
+    def stats(self) -> dict:
+        return {
+            name: {
+                "path": r.path,
+                "version": r.version,
+                "loaded_at": r.loaded_at.isoformat() if r.loaded_at else None,
+                "reloads": r.reloads,
+            }
+            for name, r in self._resources.items()
+        }
+
+
+registry = KnowledgeRegistry()
@@ -9,15 +9,30 @@ logger = logging.getLogger("air-api")
 def build_meteomatics_url(from_time_iso: str, to_time_iso: str, params_str: str, lat: float, lon: float) -> str:
     return f"https://api.meteomatics.com/{from_time_iso}--{to_time_iso}:PT1H/{params_str}/{lat},{lon}/json"
 
-async def fetch_meteomatics(params, lat, lon, hours=48, retries=2):
-    if not METEOMATICS_USER or not METEOMATICS_PASSWORD:
-        raise RuntimeError("Meteomatics API não configurada")
+def build_meteomatics_multi_url(from_time_iso: str, to_time_iso: str, params_str: str, coords) -> str:
+    points = "+".join(f"{lat},{lon}" for lat, lon in coords)
+    return f"https://api.meteomatics.com/{from_time_iso}--{to_time_iso}:PT1H/{params_str}/{points}/json"
 
+def _time_window(hours):
     now = datetime.utcnow().replace(microsecond=0)
     from_time = (now - timedelta(hours=hours)).isoformat() + "Z"
     to_time = (now + timedelta(hours=hours)).isoformat() + "Z"
-    params_str = ",".join(params)
-    url = build_meteomatics_url(from_time, to_time, params_str, lat, lon)
+    return from_time, to_time
+
+async def fetch_meteomatics(params, lat, lon, hours=48, retries=2):
+    from_time, to_time = _time_window(hours)
+    url = build_meteomatics_url(from_time, to_time, ",".join(params), lat, lon)
+    return await _get_with_retries(url, retries)
+
+async def fetch_meteomatics_points(params, coords, hours=48, retries=2):
+    """Uma única requisição para vários pontos; `data[i]["coordinates"][j]` segue a ordem de `coords`."""
+    from_time, to_time = _time_window(hours)
+    url = build_meteomatics_multi_url(from_time, to_time, ",".join(params), coords)
+    return await _get_with_retries(url, retries)
+
+async def _get_with_retries(url, retries):
+    if not METEOMATICS_USER or not METEOMATICS_PASSWORD:
+        raise RuntimeError("Meteomatics API não configurada")
 
     for attempt in range(retries + 1):
         try:
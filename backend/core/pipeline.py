@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+logger = logging.getLogger("air-api")
+
+_DONE = object()
+
+
+class StageStats:
+    def __init__(self, name: str, workers: int, queue_size: int):
+        self.name = name
+        self.workers = workers
+        self.queue_size = queue_size
+        self.items_in = 0
+        self.items_out = 0
+        self.errors = 0
+        self.max_queue_depth = 0
+        self.busy_seconds = 0.0
+        self.max_latency = 0.0
+        self.started_at = None
+        self.finished_at = None
+        self._latencies = deque(maxlen=2048)
+
+    def observe(self, latency: float):
+        self.items_in += 1
+        self.busy_seconds += latency
+        self.max_latency = max(self.max_latency, latency)
+        self._latencies.append(latency)
+
+    def summary(self) -> dict:
+        elapsed = ((self.finished_at or time.perf_counter()) - self.started_at) if self.started_at else 0.0
+        lat = sorted(self._latencies)
+        p50 = lat[len(lat) // 2] if lat else 0.0
+        p95 = lat[min(int(len(lat) * 0.95), len(lat) - 1)] if lat else 0.0
+        return {
+            "stage": self.name,
+            "workers": self.workers,
+            "in": self.items_in,
+            "out": self.items_out,
+            "errors": self.errors,
+            "throughput_per_s": round(self.items_in / elapsed, 2) if elapsed > 0 else 0.0,
+            "max_queue_depth": self.max_queue_depth,
+            "queue_size": self.queue_size,
+            "latency_p50_ms": round(p50 * 1000, 1),
+            "latency_p95_ms": round(p95 * 1000, 1),
+            "latency_max_ms": round(self.max_latency * 1000, 1),
+            "elapsed_s": round(elapsed, 3),
+        }
+
+
+class Stage:
+    """
+    Etapa do pipeline: `func(item, emit)` é uma corrotina que processa um item e chama
+    `await emit(saida)` zero ou mais vezes (filtro, 1:1 ou fan-out).
+    """
+
+    def __init__(self, name: str, func, workers: int = 1, queue_size: int = 100):
+        self.name = name
+        self.func = func
+        self.workers = max(int(workers), 1)
+        self.queue = asyncio.Queue(maxsize=max(int(queue_size), 1))
+        self.stats = StageStats(name, self.workers, self.queue.maxsize)
+
+
+class Pipeline:
+    """
+    Pipeline em streaming: uma fonte assíncrona alimenta etapas ligadas por filas limitadas.
+    Cada etapa tem sua própria concorrência; filas cheias aplicam backpressure à etapa anterior.
+    """
+
+    def __init__(self, name: str, source, stages: list):
+        self.name = name
+        self.source = source
+        self.stages = stages
+
+    async def _put(self, index: int, item):
+        if index >= len(self.stages):
+            return
+        stage = self.stages[index]
+        await stage.queue.put(item)
+        stage.stats.max_queue_depth = max(stage.stats.max_queue_depth, stage.queue.qsize())
+
+    async def _worker(self, index: int):
+        stage = self.stages[index]
+
+        async def emit(out):
+            stage.stats.items_out += 1
+            await self._put(index + 1, out)
+
+        while True:
+            item = await stage.queue.get()
+            if item is _DONE:
+                return
+            t0 = time.perf_counter()
+            try:
+                await stage.func(item, emit)
+            except Exception as e:
+                stage.stats.errors += 1
+                logger.exception("Pipeline %s: erro na etapa %s: %s", self.name, stage.name, e)
+            finally:
+                stage.stats.observe(time.perf_counter() - t0)
+
+    async def _run_stage(self, index: int):
+        stage = self.stages[index]
+        stage.stats.started_at = time.perf_counter()
+        await asyncio.gather(*(self._worker(index) for _ in range(stage.workers)))
+        stage.stats.finished_at = time.perf_counter()
+        # Etapa esgotada: encerra os workers da próxima
+        if index + 1 < len(self.stages):
+            for _ in range(self.stages[index + 1].workers):
+                await self._put(index + 1, _DONE)
+
+    async def run(self) -> list:
+        runners = [asyncio.create_task(self._run_stage(i)) for i in range(len(self.stages))]
+        try:
+            async for item in self.source:
+                await self._put(0, item)
+            for _ in range(self.stages[0].workers):
+                await self._put(0, _DONE)
+            await asyncio.gather(*runners)
+        except BaseException:
+            for task in runners:
+                task.cancel()
+            await asyncio.gather(*runners, return_exceptions=True)
+            raise
+        return self.summary()
+
+    def summary(self) -> list:
+        return [stage.stats.summary() for stage in self.stages]
+
+    def log_summary(self, log=None):
+        log = log or logger
+        for s in self.summary():
+            log.info(
+                "📊 [%s] %-10s in=%s out=%s err=%s thr=%s/s fila_max=%s/%s p50=%sms p95=%sms max=%sms workers=%s",
+                self.name, s["stage"], s["in"], s["out"], s["errors"], s["throughput_per_s"],
+                s["max_queue_depth"], s["queue_size"], s["latency_p50_ms"], s["latency_p95_ms"],
+                s["latency_max_ms"], s["workers"],
+            )
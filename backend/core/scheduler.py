@@ -0,0 +1,354 @@
+import asyncio
+import logging
+import random
+import socket
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger("air-api")
+
+CATCH_UP_SKIP = "skip"
+CATCH_UP_RUN_ONCE = "run_once"
+
+RUNS_COLLECTION = "scheduler_runs"
+STATE_COLLECTION = "scheduler_state"
+LOCKS_COLLECTION = "scheduler_locks"
+
+_instances = []
+
+
+# ----------------------------------------
+# CRON
+# ----------------------------------------
+class CronExpression:
+    """
+    Expressão cron de 5 campos: minuto hora dia-do-mês mês dia-da-semana.
+    Suporta `*`, listas (`1,15`), intervalos (`1-5`) e passos (`*/15`, `0-30/10`).
+    Dia da semana: 0-6 (domingo = 0; 7 também aceito como domingo).
+    """
+
+    FIELDS = [("minute", 0, 59), ("hour", 0, 23), ("day", 1, 31), ("month", 1, 12), ("weekday", 0, 7)]
+
+    def __init__(self, expr: str):
+        parts = expr.split()
+        if len(parts) != 5:
+            raise ValueError(f"Expressão cron inválida (esperados 5 campos): {expr!r}")
+        self.expr = expr
+        values = {}
+        for (name, lo, hi), part in zip(self.FIELDS, parts):
+            values[name] = self._parse_field(part, lo, hi)
+        if 7 in values["weekday"]:
+            values["weekday"] = (values["weekday"] - {7}) | {0}
+        self.minutes = values["minute"]
+        self.hours = values["hour"]
+        self.days = values["day"]
+        self.months = values["month"]
+        self.weekdays = values["weekday"]
+        self.day_restricted = parts[2] != "*"
+        self.weekday_restricted = parts[4] != "*"
+
+    @staticmethod
+    def _parse_field(part: str, lo: int, hi: int) -> set:
+        result = set()
+        for item in part.split(","):
+            step = 1
+            if "/" in item:
+                item, step_s = item.split("/", 1)
+                step = int(step_s)
+                if step <= 0:
+                    raise ValueError(f"Passo inválido no cron: {part!r}")
+            if item == "*":
+                start, end = lo, hi
+            elif "-" in item:
+                a, b = item.split("-", 1)
+                start, end = int(a), int(b)
+            else:
+                start = int(item)
+                end = hi if step > 1 else start
+            if start < lo or end > hi or start > end:
+                raise ValueError(f"Valor fora do intervalo [{lo},{hi}] no cron: {part!r}")
+            result.update(range(start, end + 1, step))
+        return result
+
+    def _day_matches(self, dt: datetime) -> bool:
+        dom = dt.day in self.days
+        dow = (dt.isoweekday() % 7) in self.weekdays
+        # Semântica clássica do cron: se ambos os campos forem restritos, basta um casar
+        if self.day_restricted and self.weekday_restricted:
+            return dom or dow
+        return dom and dow
+
+    def next_after(self, dt: datetime) -> datetime:
+        """Próximo instante (resolução de minuto) estritamente após `dt`."""
+        t = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = t + timedelta(days=366 * 5)
+        while t < limit:
+            if t.month not in self.months:
+                t = (t.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+                continue
+            if not self._day_matches(t):
+                t = t.replace(hour=0, minute=0) + timedelta(days=1)
+                continue
+            if t.hour not in self.hours:
+                t = t.replace(minute=0) + timedelta(hours=1)
+                continue
+            if t.minute not in self.minutes:
+                t += timedelta(minutes=1)
+                continue
+            return t
+        raise ValueError(f"Expressão cron sem ocorrências futuras: {self.expr!r}")
+
+    def __repr__(self):
+        return f"CronExpression({self.expr!r})"
+
+
+# ----------------------------------------
+# JOBS
+# ----------------------------------------
+class ScheduledJob:
+    def __init__(self, name, cron, func, jitter_seconds=0.0, catch_up=CATCH_UP_SKIP,
+                 lock_ttl_seconds=3600, history=50, distributed_lock=True):
+        if catch_up not in (CATCH_UP_SKIP, CATCH_UP_RUN_ONCE):
+            raise ValueError(f"Política de catch-up inválida: {catch_up!r}")
+        self.name = name
+        self.cron = cron if isinstance(cron, CronExpression) else CronExpression(cron)
+        self.func = func
+        self.jitter_seconds = float(jitter_seconds)
+        self.catch_up = catch_up
+        self.lock_ttl_seconds = lock_ttl_seconds
+        self.distributed_lock = distributed_lock
+        self.history = deque(maxlen=history)
+        self.lock = asyncio.Lock()
+        self.next_run = None
+        self.last_scheduled_for = None
+        self.running_since = None
+
+    def status(self) -> dict:
+        return {
+            "name": self.name,
+            "cron": self.cron.expr,
+            "jitter_seconds": self.jitter_seconds,
+            "catch_up": self.catch_up,
+            "next_run": self.next_run.isoformat() if self.next_run else None,
+            "last_scheduled_for": self.last_scheduled_for.isoformat() if self.last_scheduled_for else None,
+            "running_since": self.running_since.isoformat() if self.running_since else None,
+            "history": list(self.history),
+        }
+
+
+class AsyncScheduler:
+    """
+    Agendador asyncio com expressões cron, jitter por job, trava contra sobreposição
+    (local e, com MongoDB, entre processos), política de catch-up e histórico de execuções.
+    Pode rodar dentro do FastAPI (start/stop) ou como worker dedicado (run_forever).
+    """
+
+    def __init__(self, db=None, owner: str = None):
+        self.db = db
+        self.owner = owner or f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+        self.jobs = {}
+        self._tasks = []
+        self._runs = set()
+        _instances.append(self)
+
+    def add_job(self, name, cron, func, **kwargs) -> ScheduledJob:
+        job = ScheduledJob(name, cron, func, **kwargs)
+        self.jobs[name] = job
+        return job
+
+    # ---------- persistência (opcional) ----------
+    def _load_last_scheduled(self, job: ScheduledJob):
+        if self.db is None:
+            return None
+        try:
+            doc = self.db[STATE_COLLECTION].find_one({"_id": job.name})
+            return doc.get("last_scheduled_for") if doc else None
+        except Exception as e:
+            logger.warning("Scheduler: falha ao ler estado de %s: %s", job.name, e)
+            return None
+
+    def _save_last_scheduled(self, job: ScheduledJob):
+        if self.db is None:
+            return
+        try:
+            self.db[STATE_COLLECTION].update_one(
+                {"_id": job.name}, {"$set": {"last_scheduled_for": job.last_scheduled_for}}, upsert=True
+            )
+        except Exception as e:
+            logger.warning("Scheduler: falha ao salvar estado de %s: %s", job.name, e)
+
+    def _record_run(self, job: ScheduledJob, record: dict):
+        job.history.append(record)
+        if self.db is None:
+            return
+        try:
+            self.db[RUNS_COLLECTION].insert_one({**record, "job": job.name})
+        except Exception as e:
+            logger.warning("Scheduler: falha ao registrar execução de %s: %s", job.name, e)
+
+    def _acquire_lock(self, job: ScheduledJob) -> bool:
+        if self.db is None or not job.distributed_lock:
+            return True
+        now = datetime.utcnow()
+        try:
+            self.db[LOCKS_COLLECTION].find_one_and_update(
+                {"_id": job.name, "$or": [{"locked_until": {"$lte": now}}, {"owner": self.owner}]},
+                {"$set": {"owner": self.owner, "locked_until": now + timedelta(seconds=job.lock_ttl_seconds)}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            return True
+        except DuplicateKeyError:
+            # Upsert colidiu com a trava de outro processo ainda válida
+            return False
+        except Exception as e:
+            logger.warning("Scheduler: falha ao adquirir trava de %s: %s", job.name, e)
+            return False
+
+    def _renew_lock(self, job: ScheduledJob):
+        if self.db is None or not job.distributed_lock:
+            return
+        until = datetime.utcnow() + timedelta(seconds=job.lock_ttl_seconds)
+        self.db[LOCKS_COLLECTION].update_one({"_id": job.name, "owner": self.owner}, {"$set": {"locked_until": until}})
+
+    def _release_lock(self, job: ScheduledJob):
+        if self.db is None or not job.distributed_lock:
+            return
+        try:
+            self.db[LOCKS_COLLECTION].update_one(
+                {"_id": job.name, "owner": self.owner}, {"$set": {"locked_until": datetime.utcnow()}}
+            )
+        except Exception as e:
+            logger.warning("Scheduler: falha ao liberar trava de %s: %s", job.name, e)
+
+    # ---------- execução ----------
+    async def _heartbeat(self, job: ScheduledJob):
+        while True:
+            await asyncio.sleep(max(job.lock_ttl_seconds / 3, 1))
+            try:
+                await asyncio.to_thread(self._renew_lock, job)
+            except Exception as e:
+                logger.warning("Scheduler: falha ao renovar trava de %s: %s", job.name, e)
+
+    def _skip_overlap(self, job: ScheduledJob, record: dict) -> dict:
+        record["status"] = "skipped_overlap"
+        logger.warning("⏭️  %s: execução anterior ainda em andamento, pulando %s", job.name, record["scheduled_for"])
+        self._record_run(job, record)
+        return record
+
+    async def run_job(self, job: ScheduledJob, scheduled_for: datetime, trigger: str = "cron") -> dict:
+        record = {
+            "scheduled_for": scheduled_for,
+            "trigger": trigger,
+            "owner": self.owner,
+            "started_at": None,
+            "finished_at": None,
+            "duration_seconds": None,
+            "status": None,
+            "error": None,
+        }
+        # Trava local primeiro, sem ceder o loop entre o teste e a aquisição: um segundo
+        # disparo no mesmo processo é pulado (a trava do Mongo aceita o mesmo dono de novo)
+        if job.lock.locked():
+            return self._skip_overlap(job, record)
+        await job.lock.acquire()
+        try:
+            if not await asyncio.to_thread(self._acquire_lock, job):
+                return self._skip_overlap(job, record)
+            heartbeat = asyncio.create_task(self._heartbeat(job))
+            job.running_since = datetime.now()
+            record["started_at"] = job.running_since
+            t0 = time.perf_counter()
+            try:
+                await job.func()
+                record["status"] = "success"
+            except asyncio.CancelledError:
+                record["status"] = "cancelled"
+                raise
+            except Exception as e:
+                record["status"] = "failed"
+                record["error"] = str(e)
+                logger.exception("❌ %s falhou: %s", job.name, e)
+            finally:
+                heartbeat.cancel()
+                job.running_since = None
+                record["finished_at"] = datetime.now()
+                record["duration_seconds"] = round(time.perf_counter() - t0, 3)
+                await asyncio.to_thread(self._release_lock, job)
+                self._record_run(job, record)
+        finally:
+            job.lock.release()
+        logger.info("🏁 %s: %s em %.1fs", job.name, record["status"], record["duration_seconds"])
+        return record
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._runs.add(task)
+        task.add_done_callback(self._runs.discard)
+        return task
+
+    async def _job_loop(self, job: ScheduledJob):
+        now = datetime.now()
+        last = await asyncio.to_thread(self._load_last_scheduled, job)
+        if last is not None:
+            missed = job.cron.next_after(last)
+            if missed <= now:
+                if job.catch_up == CATCH_UP_RUN_ONCE:
+                    logger.info("↩️  %s: execução perdida em %s, rodando agora (catch-up)", job.name, missed)
+                    job.last_scheduled_for = missed
+                    await asyncio.to_thread(self._save_last_scheduled, job)
+                    self._spawn(self.run_job(job, missed, trigger="catch_up"))
+                else:
+                    logger.info("⏭️  %s: execução perdida em %s ignorada (catch-up=skip)", job.name, missed)
+
+        while True:
+            scheduled_for = job.cron.next_after(datetime.now())
+            jitter = random.uniform(0, job.jitter_seconds) if job.jitter_seconds else 0.0
+            job.next_run = scheduled_for + timedelta(seconds=jitter)
+            delay = (job.next_run - datetime.now()).total_seconds()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            job.last_scheduled_for = scheduled_for
+            await asyncio.to_thread(self._save_last_scheduled, job)
+            # Não bloqueia o loop: a trava decide se a execução sobreposta é pulada
+            self._spawn(self.run_job(job, scheduled_for))
+
+    def start(self):
+        """Inicia os loops dos jobs no event loop atual (ex.: startup do FastAPI)."""
+        for job in self.jobs.values():
+            logger.info("⏰ %s agendado com cron '%s' (jitter %.0fs, catch-up=%s)",
+                        job.name, job.cron.expr, job.jitter_seconds, job.catch_up)
+            self._tasks.append(asyncio.create_task(self._job_loop(job)))
+        return self._tasks
+
+    async def stop(self):
+        tasks = self._tasks + list(self._runs)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def run_forever(self):
+        """Modo worker dedicado: bloqueia até ser cancelado."""
+        self.start()
+        try:
+            await asyncio.gather(*self._tasks)
+        finally:
+            await self.stop()
+
+    def status(self) -> dict:
+        return {
+            "owner": self.owner,
+            "running": bool(self._tasks),
+            "jobs": [job.status() for job in self.jobs.values()],
+        }
+
+
+def schedulers_status() -> list:
+    """Status dos agendadores ativos neste processo."""
+    return [s.status() for s in _instances if s._tasks]
@@ -0,0 +1,400 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from core.config import (
+    OLLAMA_HOST, SLM_CACHE_ENABLED, SLM_CACHE_DIR, SLM_CACHE_MAX_MB, SLM_TIMEOUT_SECONDS,
+    SLM_STREAM_READ_TIMEOUT_SECONDS,
+)
+
+logger = logging.getLogger("air-api")
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimativa barata de tokens (~4 caracteres por token em inglês), sem carregar o tokenizer."""
+    return (len(text or "") + 3) // 4
+
+
+def cache_key(model: str, messages: list, options: dict = None, format=None) -> str:
+    """Endereço do conteúdo: sha256 da requisição canônica (modelo + mensagens + opções + formato)."""
+    payload = {"model": model, "messages": messages, "options": options or {}, "format": format}
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    """
+    Armazenamento chave → JSON em disco, um arquivo por chave, limitado em bytes com
+    despejo LRU. O índice em memória é reconstruído do diretório (mtime = último acesso).
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max(int(max_bytes), 0)
+        self._lock = threading.Lock()
+        self._entries = None  # OrderedDict chave -> tamanho, do menos para o mais recente
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.writes = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _load_index(self):
+        if self._entries is not None:
+            return
+        found = []
+        if os.path.isdir(self.directory):
+            for root, _, files in os.walk(self.directory):
+                for name in files:
+                    if not name.endswith(".json"):
+                        continue
+                    try:
+                        st = os.stat(os.path.join(root, name))
+                    except OSError:
+                        continue
+                    found.append((st.st_mtime, name[:-5], st.st_size))
+        found.sort()
+        self._entries = OrderedDict((key, size) for _, key, size in found)
+        self._bytes = sum(self._entries.values())
+
+    def get(self, key: str):
+        with self._lock:
+            self._load_index()
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            path = self._path(key)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    value = json.load(f)
+                os.utime(path)
+            except (OSError, ValueError):
+                # Arquivo removido ou corrompido: trata como miss
+                self._bytes -= self._entries.pop(key, 0)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value):
+        data = json.dumps(value, ensure_ascii=False).encode("utf-8")
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        with self._lock:
+            self._load_index()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Escrita atômica: leitores nunca veem um arquivo pela metade
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+            self._bytes += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self.writes += 1
+            self._evict()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._load_index()
+            if key not in self._entries:
+                return
+            self._bytes -= self._entries.pop(key)
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._entries:
+            key, size = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries or {}),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "writes": self.writes,
+                "evictions": self.evictions,
+            }
+
+
+# Timeouts derivados de prazo são arredondados para baixo a estes degraus (s): um cliente
+# httpx por degrau, em vez de um por segundo restante
+TIMEOUT_STEPS = (2, 5, 10, 20, 30, 45, 60)
+
+
+def _as_dict(response) -> dict:
+    if isinstance(response, dict):
+        return response
+    if hasattr(response, "model_dump"):
+        return response.model_dump()
+    return dict(response)
+
+
+class SLMClient:
+    """
+    Cliente do SLM (Ollama) com cache de respostas endereçado pelo conteúdo. Chamadas com
+    temperatura 0 são determinísticas e podem ser servidas do disco; gerações com
+    amostragem devem passar `cache=False`.
+    """
+
+    def __init__(self, host: str = OLLAMA_HOST, cache: DiskCache = None, timeout: float = SLM_TIMEOUT_SECONDS,
+                 stream_read_timeout: float = SLM_STREAM_READ_TIMEOUT_SECONDS):
+        self.host = host
+        self.timeout = timeout
+        self.stream_read_timeout = stream_read_timeout
+        self.cache = cache
+        self._clients = {}  # degrau de timeout (s) → Client; o httpx fixa o timeout por cliente
+        self._clients_lock = threading.Lock()
+        self._async_client = None
+        self.calls = 0
+        self.call_seconds = 0.0
+        self.prompt_tokens = 0
+        self.eval_tokens = 0
+
+    def _timeout_step(self, restante: float = None) -> float:
+        """Maior degrau de TIMEOUT_STEPS que cabe no tempo restante (no máximo `self.timeout`)."""
+        limite = self.timeout if restante is None else min(self.timeout, restante)
+        if limite >= self.timeout:
+            return self.timeout
+        cabem = [step for step in TIMEOUT_STEPS if step <= limite]
+        return cabem[-1] if cabem else TIMEOUT_STEPS[0]
+
+    def _get_client(self, timeout: float = None):
+        timeout = self.timeout if timeout is None else timeout
+        with self._clients_lock:
+            client = self._clients.get(timeout)
+            if client is None:
+                from ollama import Client
+
+                client = self._clients[timeout] = Client(host=self.host, timeout=timeout)
+        return client
+
+    def _get_async_client(self):
+        if self._async_client is None:
+            import httpx
+            from ollama import AsyncClient
+
+            # O timeout de leitura vale entre trechos do stream: um Ollama parado não segura a conexão
+            self._async_client = AsyncClient(
+                host=self.host, timeout=httpx.Timeout(self.timeout, read=self.stream_read_timeout)
+            )
+        return self._async_client
+
+    async def stream_chat(self, model: str, messages: list, options: dict = None, deadline: float = None):
+        """
+        Gera a resposta em streaming (AsyncClient); produz os trechos de texto à medida que chegam.
+        `deadline` (time.monotonic() absoluto) limita a geração inteira: estourado, levanta TimeoutError.
+        """
+        def restante():
+            if deadline is None:
+                return None
+            tempo = deadline - time.monotonic()
+            if tempo <= 0:
+                raise TimeoutError("Prazo esgotado durante o streaming do SLM")
+            return tempo
+
+        t0 = time.perf_counter()
+        try:
+            stream = await asyncio.wait_for(
+                self._get_async_client().chat(model=model, messages=messages, options=options or {}, stream=True),
+                timeout=restante(),
+            )
+        except asyncio.TimeoutError:
+            raise TimeoutError("Prazo esgotado antes do primeiro trecho do SLM")
+        try:
+            while True:
+                try:
+                    part = await asyncio.wait_for(stream.__anext__(), timeout=restante())
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    raise TimeoutError("Prazo esgotado durante o streaming do SLM")
+                part = _as_dict(part)
+                content = (part.get("message") or {}).get("content") or ""
+                if content:
+                    yield content
+                if part.get("done"):
+                    elapsed = time.perf_counter() - t0
+                    self.calls += 1
+                    self.call_seconds += elapsed
+                    self._log_usage(model, part, elapsed)
+        finally:
+            # Fecha a resposta HTTP também quando o consumidor para antes do fim
+            await stream.aclose()
+
+    def chat(self, model: str, messages: list, options: dict = None, format=None, cache: bool = True,
+             deadline: float = None, validate=None) -> dict:
+        """
+        `deadline` (time.monotonic() absoluto) limita o timeout HTTP ao tempo restante, arredondado
+        para baixo a um degrau de TIMEOUT_STEPS: a chamada não segura a thread do pool depois do
+        prazo do chamador, e o número de clientes (pools de conexão) fica limitado aos degraus.
+        `validate(resposta) -> bool`: só respostas aceitas vão para o cache, e entradas do cache
+        recusadas são descartadas (a chamada segue para o modelo).
+        """
+        restante = None
+        if deadline is not None:
+            restante = deadline - time.monotonic()
+            if restante <= 0:
+                raise TimeoutError("Prazo esgotado antes da chamada ao SLM")
+        timeout = self._timeout_step(restante)
+        use_cache = cache and self.cache is not None
+        key = cache_key(model, messages, options, format) if use_cache else None
+        if use_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                if validate is None or validate(cached):
+                    return cached
+                self.cache.delete(key)
+
+        kwargs = {"model": model, "messages": messages, "options": options or {}}
+        if format is not None:
+            kwargs["format"] = format
+        t0 = time.perf_counter()
+        response = _as_dict(self._get_client(timeout).chat(**kwargs))
+        elapsed = time.perf_counter() - t0
+        self.calls += 1
+        self.call_seconds += elapsed
+        self._log_usage(model, response, elapsed)
+
+        if use_cache and (validate is None or validate(response)):
+            try:
+                self.cache.set(key, response)
+            except (OSError, TypeError, ValueError) as e:
+                logger.warning("Falha ao gravar resposta do SLM no cache: %s", e)
+        return response
+
+    def _log_usage(self, model: str, response: dict, elapsed: float):
+        # Contadores do Ollama: prefill (prompt_eval) e geração (eval); durações em nanossegundos
+        prompt_tokens = response.get("prompt_eval_count") or 0
+        eval_tokens = response.get("eval_count") or 0
+        self.prompt_tokens += prompt_tokens
+        self.eval_tokens += eval_tokens
+        ns = 1e-9
+        logger.info(
+            "SLM %s: prompt_tokens=%s eval_tokens=%s prefill=%.2fs generation=%.2fs total=%.2fs",
+            model, prompt_tokens, eval_tokens,
+            (response.get("prompt_eval_duration") or 0) * ns,
+            (response.get("eval_duration") or 0) * ns,
+            (response.get("total_duration") or 0) * ns or elapsed,
+        )
+
+    async def aclose(self):
+        """Fecha os pools de conexão (shutdown da API)."""
+        with self._clients_lock:
+            clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            client.close()
+        if self._async_client is not None:
+            await self._async_client.close()
+            self._async_client = None
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "call_seconds": round(self.call_seconds, 3),
+            "prompt_tokens": self.prompt_tokens,
+            "eval_tokens": self.eval_tokens,
+            "cache": self.cache.stats() if self.cache is not None else None,
+        }
+
+
+class ConcurrencyLimiter:
+    """
+    Limite global de gerações simultâneas: até `limit` em execução e `max_waiting` na fila
+    (aguardando no máximo `timeout` segundos). Além disso o pedido é rejeitado.
+    """
+
+    def __init__(self, limit: int, max_waiting: int, timeout: float):
+        self.limit = max(int(limit), 1)
+        self.max_waiting = max(int(max_waiting), 0)
+        self.timeout = timeout
+        self._semaphore = None
+        self._loop = None
+        self.active = 0
+        self.waiting = 0
+        self.rejected = 0
+        self.served = 0
+
+    def _get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.limit)
+            self._loop = loop
+        return self._semaphore
+
+    async def acquire(self) -> bool:
+        semaphore = self._get_semaphore()
+        if semaphore.locked() and self.waiting >= self.max_waiting:
+            self.rejected += 1
+            return False
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            return False
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        return True
+
+    def release(self):
+        self.active -= 1
+        self.served += 1
+        self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_waiting": self.max_waiting,
+            "served": self.served,
+            "rejected": self.rejected,
+        }
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_slm_client() -> SLMClient:
+    """Cliente compartilhado pelo processo (rag_geo, relatorio)."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            cache = DiskCache(SLM_CACHE_DIR, SLM_CACHE_MAX_MB * 1024 * 1024) if SLM_CACHE_ENABLED else None
+            _client = SLMClient(cache=cache)
+        return _client
+
+
+async def close_slm_client():
+    if _client is not None:
+        await _client.aclose()
+
+
+def slm_stats() -> dict:
+    return _client.stats() if _client is not None else {}
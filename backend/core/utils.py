@@ -1,3 +1,7 @@
+import math
+import zlib
+from core.config import CELL_RESOLUTION_DEG
+
 def calculate_aqi_from_pm25(pm25: float) -> int:
     breakpoints = [
         (0.0, 12.0, 0, 50),
@@ -32,3 +36,21 @@ def get_location_name(lat: float, lon: float) -> str:
         if abs(lat - k_lat) < 0.1 and abs(lon - k_lon) < 0.1:
             return name
     return f"{lat:.4f}, {lon:.4f}"
+
+AQI_CATEGORIES = ["Good", "Moderate", "Unhealthy for Sensitive Groups", "Unhealthy", "Very Unhealthy", "Hazardous"]
+
+def get_aqi_level(aqi: int) -> int:
+    """Índice ordinal da categoria AQI (0 = Good ... 5 = Hazardous)."""
+    return AQI_CATEGORIES.index(get_aqi_category(aqi))
+
+def get_cell_id(lat: float, lon: float, resolution: float = CELL_RESOLUTION_DEG) -> str:
+    """Identificador da célula de grade (canto inferior esquerdo) que contém a coordenada."""
+    lat_ll = math.floor(lat / resolution + 1e-9) * resolution
+    lon_ll = math.floor(lon / resolution + 1e-9) * resolution
+    return f"{lat_ll:.4f}:{lon_ll:.4f}"
+
+SHARD_SPACE = 1 << 16
+
+def get_shard_hash(lat: float, lon: float) -> int:
+    """Hash estável da célula em [0, SHARD_SPACE): assinantes da mesma célula caem no mesmo shard."""
+    return zlib.crc32(get_cell_id(lat, lon).encode("utf-8")) % SHARD_SPACE
@@ -2,7 +2,8 @@
 # -*- coding: utf-8 -*-
 
 
-import argparse, re
+import argparse, contextlib, hashlib, json, os, re, tempfile
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import List, Tuple, Dict, Optional, Union
 
@@ -11,7 +12,7 @@ import pandas as pd
 
 """
 Purpose (EN): Simple fuzzy classification (Good → Hazardous) for 1°×1° gridded emissions (SRES B2MESSAGE),
-using scikit-fuzzy. For each gas (CO, NMVOC, NOx, CH4), we:
+in plain NumPy. For each gas (CO, NMVOC, NOx, CH4), we:
   1) convert cell totals to emission density (kg/km²·yr),
   2) compute dataset quantiles (Q10, Q35, Q65, Q85, Q97),
   3) build trapezoidal membership functions directly on these quantiles,
@@ -25,13 +26,12 @@ Folder layout (default):
 
 CLI example:
   python backend/fuzzy_logic.py --year 2030 --out backend/fuzzy_labels_2030.csv
+  python backend/fuzzy_logic.py --streaming   # large inventories: one year in memory, sketched quantiles
 """
 
 
-try:
-    import skfuzzy as fuzz
-except ImportError as e:
-    raise SystemExit("scikit-fuzzy not installed. Install with: pip install scikit-fuzzy") from e
+from services.kll import KLLSketch
+from services.tempo_colunar import caminho_colunar, salvar_colunar, sha1_arquivo
 
 # -----------------------------
 # Paths (robust defaults)
@@ -49,6 +49,10 @@ DATA_LINE = re.compile(
 UNIT_SCALE_KG = {"MT": 1e9, "TG": 1e9, "GG": 1e6, "KT": 1e6, "T": 1e3, "KG": 1.0}
 GAS_CANON = {"CO":"CO","NOx":"NOx","NOX":"NOx","NO2":"NOx","NMVOC":"NMVOC","CH4":"CH4","CH_4":"CH4"}
 
+# Canonical gas order: the <gas>_label columns of tempo.csv (and of its columnar copy) follow it
+GASES = ["NMVOC","CO","NOx","CH4"]
+QUANTILES = [0.10, 0.35, 0.65, 0.85, 0.97]
+
 CLASSES = ["Good","Moderate","USG","Unhealthy","Very Unhealthy","Hazardous"]
 SEVERITY = {c:i for i,c in enumerate(CLASSES, start=1)}  # Good=1 ... Hazardous=6
 
@@ -69,53 +73,292 @@ def unit_scale_from_units(units_line: str) -> float:
     if token.upper().startswith("T"):  return UNIT_SCALE_KG["T"]   # tonelada
     return 1.0
 
-def parse_sres_file(fp: Path) -> pd.DataFrame:
-    year, gas, units = None, None, None
+EMPTY_COLUMNS = ["lon","lat","value","year","gas","unit_scale"]
+FILE_PATTERNS = ["*.txt","*.dat","*.csv","*.asc","*.TXT","*.DAT","*.CSV","*.ASC"]
+
+def _parse_body_regex(body: str) -> np.ndarray:
+    """Slow path: line-by-line regex, skipping anything that is not a `lon, lat, value` line."""
     rows: List[Tuple[float,float,float]] = []
-    with open(fp, "r", encoding="utf-8", errors="ignore") as f:
-        for line in f:
-            s = line.strip()
-            if s.lower().startswith("year:"):
-                m = re.search(r"Year\s*:\s*(\d{4})", s, flags=re.I)
-                if m: year = int(m.group(1)); continue
-            if s.lower().startswith("gas:"):
-                m = re.search(r"Gas\s*:\s*([A-Za-z0-9_]+)", s, flags=re.I)
-                if m: gas = norm_gas(m.group(1)); continue
-            if s.lower().startswith("units:"):
-                units = s; continue
-            m = DATA_LINE.match(s)
-            if m:
-                lon, lat, val = float(m.group(1)), float(m.group(2)), float(m.group(3))
-                rows.append((lon, lat, val))
-    if not rows or year is None or gas is None:
-        return pd.DataFrame(columns=["lon","lat","value","year","gas","unit_scale"])
-    df = pd.DataFrame(rows, columns=["lon","lat","value"])
-    df["year"] = year
-    df["gas"] = gas
-    df["unit_scale"] = unit_scale_from_units(units)
-    return df
-
-def load_folder(root: Path) -> pd.DataFrame:
+    for line in body.splitlines():
+        m = DATA_LINE.match(line.strip())
+        if m:
+            rows.append((float(m.group(1)), float(m.group(2)), float(m.group(3))))
+    return np.array(rows, dtype=np.float64).reshape(-1, 3)
+
+def _header_line(s: str, hdr: Dict) -> bool:
+    """Fold one stripped header line into `hdr` (year/gas/units); True once `s` is the first data line."""
+    if DATA_LINE.match(s):
+        return True
+    low = s.lower()
+    if low.startswith("year:"):
+        m = re.search(r"Year\s*:\s*(\d{4})", s, flags=re.I)
+        if m: hdr["year"] = int(m.group(1))
+    elif low.startswith("gas:"):
+        m = re.search(r"Gas\s*:\s*([A-Za-z0-9_]+)", s, flags=re.I)
+        if m: hdr["gas"] = norm_gas(m.group(1))
+    elif low.startswith("units:"):
+        hdr["units"] = s
+    return False
+
+def read_sres_header(fp: Path) -> Dict:
+    """Header metadata (year, gas, units) only: stops at the first data line, the body is never read."""
+    hdr = {"year": None, "gas": None, "units": None}
+    with open(fp, "rb") as f:
+        for raw in f:
+            if _header_line(raw.decode("utf-8", errors="ignore").strip(), hdr):
+                break
+    return hdr
+
+def _parse_sres_arrays(fp: Path, bulk: bool = True) -> Tuple[Dict, np.ndarray]:
+    """(header, float64 array of `lon, lat, value` rows); the array is empty when there is nothing to keep."""
+    text = Path(fp).read_bytes().decode("utf-8", errors="ignore")
+    hdr = {"year": None, "gas": None, "units": None}
+    pos = 0
+    while pos < len(text):
+        end = text.find("\n", pos)
+        end = len(text) if end < 0 else end
+        if _header_line(text[pos:end].strip(), hdr):
+            break
+        pos = end + 1
+    body = text[pos:]
+    if hdr["year"] is None or hdr["gas"] is None or not body.strip():
+        return hdr, np.empty((0, 3))
+    try:
+        if not bulk:
+            raise ValueError("bulk parsing disabled")
+        arr = np.loadtxt(body.splitlines(), delimiter=",", dtype=np.float64, ndmin=2, comments=None)
+        if arr.shape[1] != 3:
+            raise ValueError(f"expected 3 columns, got {arr.shape[1]}")
+    except ValueError:
+        arr = _parse_body_regex(body)
+    return hdr, arr
+
+def _sres_frame(hdr: Dict, arr: np.ndarray) -> pd.DataFrame:
+    if arr.size == 0:
+        return pd.DataFrame(columns=EMPTY_COLUMNS)
+    n = len(arr)
+    return pd.DataFrame({
+        "lon": arr[:, 0], "lat": arr[:, 1], "value": arr[:, 2],
+        "year": np.full(n, hdr["year"], dtype=np.int64),
+        "gas": np.full(n, hdr["gas"], dtype=object),
+        "unit_scale": np.full(n, unit_scale_from_units(hdr["units"])),
+    })
+
+def parse_sres_file(fp: Path, bulk: bool = True) -> pd.DataFrame:
+    """
+    Header block (Year/Gas/Units) is read line by line up to the first data line; the numeric
+    body is then parsed in bulk by np.loadtxt. Bodies with stray non-data lines fall back to
+    the regex parser, which skips them (bulk=False forces it).
+    """
+    return _sres_frame(*_parse_sres_arrays(fp, bulk=bulk))
+
+def discover_files(root: Path) -> List[Path]:
+    """Candidate files under `root`, deduplicated by resolved path (patterns overlap on case-insensitive FS)."""
+    found: Dict[Path, Path] = {}
+    for ext in FILE_PATTERNS:
+        for fp in root.rglob(ext):
+            if fp.is_file():
+                found.setdefault(fp.resolve(), fp)
+    if not found:
+        found = {fp.resolve(): fp for fp in root.rglob("*") if fp.is_file()}
+    return sorted(found.values())
+
+# -----------------------------
+# Parse cache
+# -----------------------------
+# <cache>/index.json maps each resolved file path to its stat (size, mtime_ns), sha1 and header
+# (year/gas/units); the parsed rows live next to it as one (n,3) float64 .npy per file. An entry
+# is reused while size+mtime_ns match; if only the mtime moved (touch, fresh checkout) the sha1
+# decides. Unchanged files are filtered by year straight from the index, without being opened.
+DEFAULT_CACHE_DIR = SCRIPT_DIR / "dataset" / ".parse_cache"
+CACHE_FORMAT = "sres-parse/1"
+
+def _file_sha1(fp: Path) -> str:
+    with open(fp, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+def _write_atomic(path: Path, write) -> None:
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+        os.replace(tmp, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp)
+        raise
+
+class ParseCache:
+    def __init__(self, cache_dir: Union[str, Path]):
+        self.dir = Path(cache_dir)
+        self.index_path = self.dir / "index.json"
+        self.entries: Dict[str, Dict] = {}
+        self.dirty = False
+        try:
+            index = json.loads(self.index_path.read_text(encoding="utf-8"))
+            if index.get("format") == CACHE_FORMAT:
+                self.entries = index["files"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+    def _fresh(self, fp: Path, st: os.stat_result) -> Optional[Dict]:
+        e = self.entries.get(str(fp.resolve()))
+        if e is not None and e["size"] == st.st_size and e["mtime_ns"] == st.st_mtime_ns:
+            return e
+        return None
+
+    def header(self, fp: Path, st: os.stat_result) -> Optional[Dict]:
+        e = self._fresh(fp, st)
+        return None if e is None else {k: e[k] for k in ("year", "gas", "units")}
+
+    def load(self, fp: Path, st: os.stat_result) -> Optional[np.ndarray]:
+        key = str(fp.resolve())
+        e = self._fresh(fp, st)
+        if e is None:
+            e = self.entries.get(key)
+            if e is None or e["size"] != st.st_size or e["sha1"] != _file_sha1(fp):
+                return None
+            e.update(mtime_ns=st.st_mtime_ns)
+            self.dirty = True
+        try:
+            return np.load(self.dir / e["entry"])
+        except (OSError, ValueError):
+            del self.entries[key]
+            self.dirty = True
+            return None
+
+    def store(self, fp: Path, st: os.stat_result, hdr: Dict, arr: np.ndarray) -> None:
+        key = str(fp.resolve())
+        entry = hashlib.sha1(key.encode("utf-8")).hexdigest()[:16] + ".npy"
+        self.dir.mkdir(parents=True, exist_ok=True)
+        _write_atomic(self.dir / entry, lambda f: np.save(f, arr))
+        self.entries[key] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha1": _file_sha1(fp),
+                             "entry": entry, **hdr}
+        self.dirty = True
+
+    def save(self) -> None:
+        """Persist the index, dropping entries whose source file is gone (concurrent runs: last writer wins)."""
+        for key in [k for k in self.entries if not os.path.exists(k)]:
+            with contextlib.suppress(OSError):
+                (self.dir / self.entries.pop(key)["entry"]).unlink()
+            self.dirty = True
+        if not self.dirty:
+            return
+        self.dir.mkdir(parents=True, exist_ok=True)
+        index = json.dumps({"format": CACHE_FORMAT, "files": self.entries}, indent=1).encode("utf-8")
+        _write_atomic(self.index_path, lambda f: f.write(index))
+        self.dirty = False
+
+def _parse_one(fp: Path, bulk: bool = True):
+    try:
+        return (*_parse_sres_arrays(fp, bulk=bulk), None)
+    except Exception as e:
+        return None, None, f"{type(e).__name__}: {e}"
+
+def _year_wanted(y: int, min_year: Optional[int], max_year: Optional[int], year: Optional[int]) -> bool:
+    if min_year is not None and y < min_year: return False
+    if max_year is not None and y > max_year: return False
+    return year is None or y == year
+
+def select_files(
+    root: Path,
+    *,
+    min_year: Optional[int] = None,
+    max_year: Optional[int] = None,
+    year: Optional[int] = None,
+    store: Optional[ParseCache] = None,
+) -> Tuple[List[Tuple[Path, os.stat_result, Dict]], int, int]:
+    """
+    (file, stat, header) for every SRES file under `root` in the selected years, plus the number of
+    files skipped (unreadable or no Year/Gas header) and filtered out by year. Headers come from
+    the parse cache when the file is unchanged, otherwise from read_sres_header (no body read).
+    """
+    selected = []
+    skipped = filtered = 0
+    for fp in discover_files(root):
+        try:
+            st = fp.stat()
+            hdr = (store.header(fp, st) if store else None) or read_sres_header(fp)
+        except OSError as e:
+            print(f"[warn] Failed to read header of {fp}: {type(e).__name__}: {e}")
+            skipped += 1
+            continue
+        if hdr["year"] is None or hdr["gas"] is None:
+            skipped += 1
+            continue
+        if not _year_wanted(hdr["year"], min_year, max_year, year):
+            filtered += 1
+            continue
+        selected.append((fp, st, hdr))
+    return selected, skipped, filtered
+
+def parse_files(
+    selected: List[Tuple[Path, os.stat_result, Dict]],
+    store: Optional[ParseCache] = None,
+    workers: Optional[int] = None,
+    bulk: bool = True,
+) -> Tuple[Dict[Path, Tuple[Dict, np.ndarray]], int, int]:
+    """({file: (header, rows)}, cache hits, workers): cached rows are reused, the rest is parsed (files that fail are left out)."""
+    parsed, todo = {}, []
+    for fp, st, hdr in selected:
+        arr = store.load(fp, st) if store else None
+        if arr is None:
+            todo.append((fp, st))
+        else:
+            parsed[fp] = (hdr, arr)
+
+    hits = len(selected) - len(todo)
+    workers = workers or min(len(todo), os.cpu_count() or 1) or 1
+    paths = [fp for fp, _ in todo]
+    if workers > 1 and len(todo) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as ex:
+            results = list(ex.map(_parse_one, paths, [bulk] * len(paths)))
+    else:
+        results = [_parse_one(fp, bulk) for fp in paths]
+    for (fp, st), (hdr, arr, err) in zip(todo, results):
+        if err is not None:
+            print(f"[warn] Failed to parse {fp}: {err}")
+            continue
+        parsed[fp] = (hdr, arr)
+        if store:
+            store.store(fp, st, hdr, arr)
+    if store:
+        store.save()
+    return parsed, hits, workers
+
+def load_folder(
+    root: Path,
+    workers: Optional[int] = None,
+    bulk: bool = True,
+    *,
+    min_year: Optional[int] = None,
+    max_year: Optional[int] = None,
+    year: Optional[int] = None,
+    cache: Optional[Union[str, Path]] = None,
+) -> pd.DataFrame:
+    """
+    Parse every SRES file under `root`. Files whose header year falls outside [min_year, max_year]
+    (or differs from `year`) are skipped before their body is read. With `cache` (a directory),
+    parsed rows are reused from the parse cache and only new or changed files are parsed.
+    """
     root = Path(root)
     if not root.exists():
         raise FileNotFoundError(f"Data folder not found: {root} (resolved: {root.resolve()})")
-    patterns = ["*.txt","*.dat","*.csv","*.asc","*.TXT","*.DAT","*.CSV","*.ASC"]
+    store = ParseCache(cache) if cache else None
+    selected, skipped, filtered = select_files(root, min_year=min_year, max_year=max_year, year=year, store=store)
+    parsed, hits, workers = parse_files(selected, store, workers=workers, bulk=bulk)
+
     parts = []
-    files = []
-    for ext in patterns:
-        files += list(root.rglob(ext))
-    if not files:
-        files = list(root.rglob("*"))
-    for fp in files:
-        try:
-            df = parse_sres_file(fp)
-            if not df.empty:
-                parts.append(df)
-        except Exception:
-            pass
+    for fp, _, _ in selected:
+        if fp in parsed and parsed[fp][1].size:
+            parts.append(_sres_frame(*parsed[fp]))
+        else:
+            skipped += 1
     if not parts:
-        raise FileNotFoundError(f"No SRES-like data parsed under: {root} (resolved: {root.resolve()})")
-    print(f"[info] Parsed {len(parts)} files from {root.resolve()}")
+        raise FileNotFoundError(f"No SRES-like data parsed under: {root} (resolved: {root.resolve()}; "
+                                f"{filtered} files outside the selected years)")
+    print(f"[info] Parsed {len(parts)} files from {root.resolve()} ({hits} from cache, {filtered} outside the "
+          f"selected years, {skipped} skipped, workers={workers})")
     return pd.concat(parts, ignore_index=True)
 
 def cell_area_km2(lat_ll: np.ndarray, lon_ll: np.ndarray) -> np.ndarray:
@@ -125,7 +368,7 @@ def cell_area_km2(lat_ll: np.ndarray, lon_ll: np.ndarray) -> np.ndarray:
     return (EARTH_R_KM**2) * np.abs(np.sin(phi2)-np.sin(phi1)) * np.abs(lam2-lam1)
 
 # -----------------------------
-# Fuzzy helpers (skfuzzy)
+# Fuzzy helpers
 # -----------------------------
 def _mk_trap(a,b,c,d):
     """Ensure strictly increasing trapezoid params."""
@@ -158,13 +401,81 @@ def build_traps_from_quantiles(minv, q10, q35, q65, q85, q97, maxv, smooth_frac=
         traps[k] = _mk_trap(*arr)
     return traps
 
+def trapmf(x: np.ndarray, abcd) -> np.ndarray:
+    """
+    Trapezoidal membership, value for value identical to skfuzzy.trapmf (edges included: 1 at b and c,
+    0 at a and d unless they coincide with b/c; NaN maps to 1). `abcd` is one [a,b,c,d] row -> (n,),
+    or a (k,4) array of trapezoids evaluated together -> (n,k).
+    """
+    p = np.asarray(abcd, dtype=np.float64)
+    if p.shape[-1] != 4 or not (np.diff(p, axis=-1) >= 0).all():
+        raise ValueError(f"trapmf needs a <= b <= c <= d, got {abcd!r}")
+    x = np.asarray(x, dtype=np.float64)
+    X = x[:, None] if p.ndim == 2 else x
+    a, b, c, d = (p[..., i] for i in range(4))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        y = np.where(X <= b, np.where(X == b, 1.0, np.where(a < X, (X - a) / (b - a), 0.0)), 1.0)
+        y = np.where(X >= c, np.where(X == c, 1.0, np.where(X < d, (d - X) / (d - c), 0.0)), y)
+    y[(X < a) | (X > d)] = 0.0
+    return y
+
 def memberships_matrix(x: np.ndarray, traps: Dict[str, List[float]]) -> np.ndarray:
     """Return (n_samples, 6) matrix of memberships in CLASSES order."""
-    mats = []
-    for cls in CLASSES:
-        a,b,c,d = traps[cls]
-        mats.append(fuzz.trapmf(x, [a,b,c,d]))
-    return np.vstack(mats).T  # shape (n,6)
+    return trapmf(x, [traps[cls] for cls in CLASSES])
+
+def pick_class(mus: np.ndarray, tol: float = 1e-12) -> np.ndarray:
+    """Per-row class code (0..5) of max membership; memberships within `tol` of the max tie -> most severe."""
+    ties = np.abs(mus - mus.max(axis=1, keepdims=True)) < tol
+    return mus.shape[1] - 1 - np.argmax(ties[:, ::-1], axis=1)
+
+def traps_from_stats(minv: float, q, maxv: float, smooth: float = 0.05) -> Dict[str, List[float]]:
+    """Trapezoids from a gas's min, QUANTILES values and max (exact or sketched)."""
+    # handle degenerate spreads
+    if not np.isfinite(minv) or not np.isfinite(maxv) or np.isclose(minv, maxv):
+        minv, maxv = minv, minv + 1.0
+    return build_traps_from_quantiles(minv, *q, maxv, smooth_frac=smooth)
+
+def classify(df: pd.DataFrame, smooth: float = 0.05, traps: Optional[Dict[str, Dict]] = None) -> pd.DataFrame:
+    """
+    Label every (lon, lat, year) cell of `df` (columns lon/lat/year/gas/dens_kgkm2, one row per
+    cell and gas). Gas blocks are aligned on a shared sorted grid index instead of merged; the
+    final label is the worst severity among the gases present in the cell. Label columns follow
+    GASES order. Trapezoids come from the exact quantiles of `df` unless `traps` ({gas: trapezoids})
+    is given.
+    """
+    lon = df["lon"].to_numpy(dtype=np.float64)
+    lat = df["lat"].to_numpy(dtype=np.float64)
+    year = df["year"].to_numpy()
+    order = np.lexsort((lon, lat, year))  # sorted by year, lat, lon
+    new = np.ones(len(order), dtype=bool)
+    new[1:] = (np.diff(year[order]) != 0) | (np.diff(lat[order]) != 0) | (np.diff(lon[order]) != 0)
+    cell = np.empty(len(order), dtype=np.int64)
+    cell[order] = np.cumsum(new) - 1
+    first = order[new]
+    n_cells = len(first)
+
+    gas = df["gas"].to_numpy()
+    dens = df["dens_kgkm2"].to_numpy(dtype=np.float64)
+    names = np.array(CLASSES + [np.nan], dtype=object)  # code -1 -> missing
+    out = {"lon": lon[first], "lat": lat[first], "year": year[first]}
+    worst = np.full(n_cells, -1, dtype=np.int64)
+    present = set(pd.unique(gas))
+    for g in [g for g in GASES if g in present] + [g for g in pd.unique(gas) if g not in GASES]:
+        rows = np.flatnonzero(gas == g)
+        x = dens[rows]
+        if traps is None:
+            # Quantiles for this gas (global over selected years)
+            gas_traps = traps_from_stats(float(np.min(x)), np.quantile(x, QUANTILES), float(np.max(x)), smooth)
+        else:
+            gas_traps = traps[g]
+        codes = np.full(n_cells, -1, dtype=np.int64)
+        codes[cell[rows]] = pick_class(memberships_matrix(x, gas_traps))
+        np.maximum(worst, codes, out=worst)
+        out[f"{g}_label"] = names[codes]
+
+    # Every cell has at least one gas, so `worst` is always a class code here
+    out["final_label"] = names[worst]
+    return pd.DataFrame(out)
 
 # -----------------------------
 # Core pipeline
@@ -177,16 +488,19 @@ def run(
     max_year: int = 2030,
     year: Optional[int] = None,
     smooth: float = 0.05,  # fraction of (max-min) for trapezoid shoulders
+    workers: Optional[int] = None,  # parser processes (default: one per CPU, capped at #files)
+    columnar: bool = True,  # also write the memory-mappable <out>.cols/ dataset
+    cache_dir: Optional[Union[str, Path]] = DEFAULT_CACHE_DIR,  # parse cache (None: always reparse)
 ):
     root = Path(root) if root else DEFAULT_DATA_ROOT
     out = Path(out) if out else (SCRIPT_DIR / "tempo.csv")
     print(f"[info] Using data root: {root.resolve()}")
     print(f"[info] Output file    : {out.resolve()}")
 
-    df = load_folder(root)
+    df = load_folder(root, workers=workers, min_year=min_year, max_year=max_year, year=year, cache=cache_dir)
     df = df[(df["year"]>=min_year) & (df["year"]<=max_year)].copy()
     df["gas"] = df["gas"].map(lambda g: GAS_CANON.get(g, g))
-    df = df[df["gas"].isin(["CO","NMVOC","NOx","CH4"])].copy()
+    df = df[df["gas"].isin(GASES)].copy()
     if year is not None:
         df = df[df["year"]==year].copy()
         if df.empty:
@@ -198,61 +512,108 @@ def run(
     area = np.where(area<=0, 1e-9, area)
     df["dens_kgkm2"] = vals_kg / area
 
-    out_blocks = []
-    for g, gdf in df.groupby("gas", sort=False):
-        x = gdf["dens_kgkm2"].to_numpy()
-
-        # Quantiles for this gas (global over selected years)
-        q = np.quantile(x, [0.10, 0.35, 0.65, 0.85, 0.97])
-        q10, q35, q65, q85, q97 = q
-        minv, maxv = float(np.min(x)), float(np.max(x))
-        # handle degenerate spreads
-        if not np.isfinite(minv) or not np.isfinite(maxv) or np.isclose(minv, maxv):
-            minv, maxv = minv, minv + 1.0
-
-        traps = build_traps_from_quantiles(minv, q10, q35, q65, q85, q97, maxv, smooth_frac=smooth)
-        mus = memberships_matrix(x, traps)  # (n,6) in CLASSES order
-
-        # Per-row label = max membership (ties -> most severe)
-        idx_max = np.argmax(mus, axis=1)
-        labels = []
-        for i, row in enumerate(mus):
-            mx = row[idx_max[i]]
-            ties = np.where(np.abs(row - mx) < 1e-12)[0]
-            labels.append(CLASSES[int(np.max(ties))])  # more severe on tie
-
-        gdf = gdf.assign(**{f"{g}_label": labels})
-        out_blocks.append(gdf[["lon","lat","year",f"{g}_label"]])
-
-    # Merge labels from all gases
-    out_df = None
-    for block in out_blocks:
-        if out_df is None:
-            out_df = block.copy()
-        else:
-            out_df = out_df.merge(block, on=["lon","lat","year"], how="outer")
-
-    # Final decision = worst class among gases present
-    def worst_class(row):
-        sev = []
-        for g in ["CO","NMVOC","NOx","CH4"]:
-            lab = row.get(f"{g}_label")
-            if isinstance(lab, str) and lab in SEVERITY:
-                sev.append(SEVERITY[lab])
-        if not sev: return "Good"
-        worst = max(sev)
-        # map back
-        for cls, s in SEVERITY.items():
-            if s == worst:
-                return cls
-        return "Good"
-
-    out_df["final_label"] = out_df.apply(worst_class, axis=1)
-    out_df = out_df.sort_values(["year","lat","lon"]).reset_index(drop=True)
+    out_df = classify(df, smooth=smooth)
 
     out.parent.mkdir(parents=True, exist_ok=True)
     out_df.to_csv(out, index=False)
     print(f"[OK] Saved: {out.resolve()}")
+    if columnar:
+        # Stamped with the CSV hash: readers fall back to the CSV if the two diverge
+        salvar_colunar(out_df, caminho_colunar(out), csv_sha1=sha1_arquivo(out))
+        print(f"[OK] Saved: {Path(caminho_colunar(out)).resolve()}")
+
+# -----------------------------
+# Streaming pipeline
+# -----------------------------
+def _density(hdr: Dict, arr: np.ndarray) -> np.ndarray:
+    """Emission density (kg/km²·yr) of one parsed file, same arithmetic as `run`."""
+    area = cell_area_km2(arr[:, 1], arr[:, 0])
+    area = np.where(area<=0, 1e-9, area)
+    return arr[:, 2] * unit_scale_from_units(hdr["units"]) / area
+
+def run_streaming(
+    *,
+    root: Optional[Union[str, Path]] = None,
+    out: Optional[Union[str, Path]] = None,
+    min_year: int = 2000,
+    max_year: int = 2030,
+    year: Optional[int] = None,
+    smooth: float = 0.05,
+    workers: Optional[int] = None,
+    cache_dir: Optional[Union[str, Path]] = DEFAULT_CACHE_DIR,
+    sketch_k: int = 2000,  # KLL accuracy/size knob (rank error ~ 1/k)
+) -> Dict[str, KLLSketch]:
+    """
+    Out-of-core variant of `run` for inventories too large to concatenate. Files are read one
+    year at a time (every gas of a cell must be at hand for the worst-class rule), so memory is
+    bounded by a single year. Pass 1 feeds each gas's densities into a KLL sketch; pass 2
+    classifies each year with the sketched quantiles and appends it to the CSV, which replaces
+    `out` only when complete. Returns the per-gas sketches (quantiles and error bound).
+    """
+    root = Path(root) if root else DEFAULT_DATA_ROOT
+    out = Path(out) if out else (SCRIPT_DIR / "tempo.csv")
+    print(f"[info] Using data root: {root.resolve()}")
+    print(f"[info] Output file    : {out.resolve()} (streaming)")
+    if not root.exists():
+        raise FileNotFoundError(f"Data folder not found: {root} (resolved: {root.resolve()})")
+
+    store = ParseCache(cache_dir) if cache_dir else None
+    selected, _, _ = select_files(root, min_year=min_year, max_year=max_year, year=year, store=store)
+    selected = [item for item in selected if item[2]["gas"] in GASES]
+    if not selected:
+        raise RuntimeError(f"No data for year {year} in range [{min_year},{max_year}] under {root.resolve()}.")
+    by_year: Dict[int, List] = {}
+    for item in selected:
+        by_year.setdefault(item[2]["year"], []).append(item)
+    present = {hdr["gas"] for _, _, hdr in selected}
+    gases = [g for g in GASES if g in present]  # same column order as `run`
+
+    def year_files(y):
+        parsed, _, _ = parse_files(by_year[y], store, workers=workers)
+        for fp, _, _ in by_year[y]:
+            if fp in parsed and parsed[fp][1].size:
+                yield parsed[fp]
+
+    # Pass 1: quantile sketches per gas
+    sketches = {g: KLLSketch(k=sketch_k) for g in gases}
+    for y in sorted(by_year):
+        for hdr, arr in year_files(y):
+            sketches[hdr["gas"]].update(_density(hdr, arr))
+    traps = {}
+    print(f"[info] Sketched quantiles (KLL k={sketch_k}; exact value lies in [lo, hi]):")
+    for g, sk in sketches.items():
+        q = sk.quantile(QUANTILES)
+        lo, hi = sk.quantile_bounds(QUANTILES)
+        traps[g] = traps_from_stats(sk.min, q, sk.max, smooth)
+        faixas = "  ".join(f"Q{round(p * 100)}={v:.4g} [{a:.4g}, {b:.4g}]" for p, v, a, b in zip(QUANTILES, q, lo, hi))
+        print(f"  {g:6s} n={sk.n} kept={sk.retained} rank error <= {sk.rank_error():.3%}  {faixas}")
+
+    # Pass 2: classify and append year by year
+    columns = ["lon","lat","year"] + [f"{g}_label" for g in gases] + ["final_label"]
+    out.parent.mkdir(parents=True, exist_ok=True)
+    part = out.with_name(out.name + ".part")
+    rows = 0
+    try:
+        with open(part, "w", encoding="utf-8", newline="") as f:
+            for i, y in enumerate(sorted(by_year)):
+                blocks = [pd.DataFrame({"lon": arr[:, 0], "lat": arr[:, 1], "year": np.full(len(arr), y, dtype=np.int64),
+                                        "gas": hdr["gas"], "dens_kgkm2": _density(hdr, arr)})
+                          for hdr, arr in year_files(y)]
+                if not blocks:
+                    continue
+                chunk = classify(pd.concat(blocks, ignore_index=True), smooth=smooth, traps=traps)
+                chunk.reindex(columns=columns).to_csv(f, header=(rows == 0), index=False)
+                rows += len(chunk)
+                print(f"[info] {y}: {len(chunk)} cells written")
+        os.replace(part, out)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            part.unlink()
+        raise
+    print(f"[OK] Saved: {out.resolve()} ({rows} rows)")
+    # The columnar copy needs the whole table in memory; readers fall back to the CSV until it is rebuilt
+    print(f"[info] {caminho_colunar(out)} not written in streaming mode (python -m services.tempo_colunar {out})")
+    return sketches
 
 def main():
     ap = argparse.ArgumentParser()
@@ -263,10 +624,24 @@ def main():
     ap.add_argument("--max-year", type=int, default=2030)
     ap.add_argument("--year", type=int, default=None, help="If set, classify only this year.")
     ap.add_argument("--smooth", type=float, default=0.05, help="Shoulder width as fraction of (max-min).")
+    ap.add_argument("--workers", type=int, default=None, help="Parser processes (default: one per CPU).")
+    ap.add_argument("--no-columnar", action="store_true", help="Skip the columnar <out>.cols/ dataset.")
+    ap.add_argument("--cache-dir", default=str(DEFAULT_CACHE_DIR), help="Parse cache folder.")
+    ap.add_argument("--no-cache", action="store_true", help="Reparse every file, ignoring the parse cache.")
+    ap.add_argument("--streaming", action="store_true",
+                    help="Two passes, one year in memory at a time, quantiles from a KLL sketch.")
+    ap.add_argument("--sketch-k", type=int, default=2000, help="KLL sketch size in streaming mode.")
     args = ap.parse_args()
 
+    if args.streaming:
+        run_streaming(root=args.root, out=args.out, min_year=args.min_year, max_year=args.max_year,
+                      year=args.year, smooth=args.smooth, workers=args.workers,
+                      cache_dir=None if args.no_cache else args.cache_dir, sketch_k=args.sketch_k)
+        return
+
     run(root=args.root, out=args.out, min_year=args.min_year, max_year=args.max_year,
-        year=args.year, smooth=args.smooth)
+        year=args.year, smooth=args.smooth, workers=args.workers, columnar=not args.no_columnar,
+        cache_dir=None if args.no_cache else args.cache_dir)
 
 if __name__ == "__main__":
     main()
@@ -1,9 +1,11 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import logging
-from core.config import METEOMATICS_USER
+from core.config import METEOMATICS_USER, ORCHESTRATOR_IN_API
 from core.database import db
-from routes import health, weather, air, subscriptions, alerts
+from core.slm import close_slm_client
+from routes import health, weather, air, subscriptions, alerts, report
+from services.outbox import start_outbox_workers, stop_outbox_workers
 
 app = FastAPI(
     title="Weather & Air Quality API - NASA Space Apps 2025",
@@ -25,6 +27,7 @@ app.include_router(weather.router)
 app.include_router(air.router)
 app.include_router(subscriptions.router)
 app.include_router(alerts.router)
+app.include_router(report.router)
 
 logger = logging.getLogger("air-api")
 
@@ -36,11 +39,26 @@ async def startup_event():
     logger.info("✅ FastAPI rodando")
     logger.info("%s Meteomatics: %s", "✅" if METEOMATICS_USER else "❌", "Configurado" if METEOMATICS_USER else "NÃO configurado")
     logger.info("%s MongoDB: %s", "✅" if db is not None else "⚠️ ", "Conectado" if db is not None else "NÃO configurado")
+    workers = start_outbox_workers()
+    logger.info("%s Outbox: %s workers", "✅" if workers else "⚠️ ", len(workers))
+    if ORCHESTRATOR_IN_API:
+        from orquestrador import iniciar_orquestrador
+        await iniciar_orquestrador()
+        logger.info("✅ Orquestrador: agendado no processo da API")
     logger.info("=" * 60)
     logger.info("📡 http://localhost:8000")
     logger.info("📖 Docs: http://localhost:8000/docs")
     logger.info("=" * 60 + "\n")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await stop_outbox_workers()
+    logger.info("🛑 Outbox finalizado")
+    if ORCHESTRATOR_IN_API:
+        from orquestrador import parar_orquestrador
+        await parar_orquestrador()
+    await close_slm_client()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000, log_level="info")
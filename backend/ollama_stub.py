@@ -0,0 +1,200 @@
+"""
+Servidor stub compatível com a API do Ollama (/api/chat, /api/tags, /api/version) para
+benchmarks sem modelo real. Respostas determinísticas (semente + hash das mensagens), taxa
+de tokens, distribuição de latência e injeção de falhas configuráveis.
+
+Uso:
+    python ollama_stub.py --port 11500 --tokens-per-second 40 --latency-ms 300 --failure-rate 0.05
+    OLLAMA_HOST=http://localhost:11500 python orquestrador.py
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import re
+from datetime import datetime, timezone
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+PALAVRAS = (
+    "air quality today remains elevated with fine particles and nitrogen oxides near your area "
+    "sensitive groups should limit outdoor activity keep windows closed stay hydrated and "
+    "follow local health guidance while pollution levels stay high during the afternoon"
+).split()
+
+
+class StubConfig:
+    def __init__(self, tokens_per_second=50.0, prompt_tokens_per_second=500.0, latency_ms=200.0,
+                 latency_jitter_ms=50.0, latency_dist="normal", response_tokens=120,
+                 failure_rate=0.0, hang_rate=0.0, hang_seconds=600.0, seed=0, realtime=True):
+        self.tokens_per_second = tokens_per_second
+        self.prompt_tokens_per_second = prompt_tokens_per_second
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.latency_dist = latency_dist
+        self.response_tokens = response_tokens
+        self.failure_rate = failure_rate
+        self.hang_rate = hang_rate
+        self.hang_seconds = hang_seconds
+        self.seed = seed
+        self.realtime = realtime
+
+
+def _rng(config: StubConfig, body: dict) -> random.Random:
+    raw = json.dumps([config.seed, body.get("model"), body.get("messages"), body.get("options")], sort_keys=True)
+    return random.Random(int(hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16], 16))
+
+
+def _latencia(config: StubConfig, rng: random.Random) -> float:
+    base, jitter = config.latency_ms, config.latency_jitter_ms
+    if config.latency_dist == "uniform":
+        ms = rng.uniform(base - jitter, base + jitter)
+    elif config.latency_dist == "lognormal":
+        # Cauda longa: mediana ~ base, jitter controla a dispersão
+        sigma = jitter / base if base > 0 else 0.0
+        ms = base * rng.lognormvariate(0.0, sigma)
+    else:
+        ms = rng.gauss(base, jitter)
+    return max(ms, 0.0) / 1000.0
+
+
+def _tokens_prompt(messages) -> int:
+    return sum(len(m.get("content") or "") for m in messages or []) // 4 + 1
+
+
+def _texto(rng: random.Random, n_tokens: int) -> list:
+    return [(" " if i else "") + rng.choice(PALAVRAS) for i in range(n_tokens)]
+
+
+def _json(messages, rng: random.Random) -> list:
+    """JSON válido no esquema de avaliação pedido pelo rag_geo (coordenadas extraídas do prompt)."""
+    texto = " ".join(m.get("content") or "" for m in messages or [])
+    m = re.search(r"lat=(-?[\d.]+), lon=(-?[\d.]+)", texto)
+    lat, lon = (float(m.group(1)), float(m.group(2))) if m else (0.0, 0.0)
+    niveis = ["Good", "Moderate", "USG", "Unhealthy", "Very Unhealthy", "Hazardous"]
+    doc = {
+        "query_coordinates": {"latitude": lat, "longitude": lon},
+        "summary": "stub evaluation",
+        "evaluations": [
+            {"lat": lat, "lon": lon, "distance": round(rng.random(), 4),
+             "compounds": {"CO": {"value": 0.0, "level": rng.choice(niveis)}},
+             "overall_index": rng.choice(niveis)}
+        ],
+    }
+    # Quebra em "tokens" de ~4 caracteres para o streaming
+    raw = json.dumps(doc)
+    return [raw[i:i + 4] for i in range(0, len(raw), 4)]
+
+
+def _agora() -> str:
+    return datetime.now(timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def create_app(config: StubConfig) -> FastAPI:
+    app = FastAPI(title="Ollama stub")
+    app.state.config = config
+    app.state.requests = 0
+
+    async def dormir(segundos):
+        if config.realtime and segundos > 0:
+            await asyncio.sleep(segundos)
+
+    @app.get("/api/version")
+    async def version():
+        return {"version": "0.0.0-stub"}
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": [{"name": "stub", "model": "stub"}]}
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        body = await request.json()
+        app.state.requests += 1
+        rng = _rng(config, body)
+        messages = body.get("messages") or []
+        model = body.get("model", "stub")
+        stream = body.get("stream", True)
+
+        if rng.random() < config.failure_rate:
+            return JSONResponse({"error": "stub: injected failure"}, status_code=500)
+        if rng.random() < config.hang_rate:
+            await dormir(config.hang_seconds)
+
+        prompt_tokens = _tokens_prompt(messages)
+        options = body.get("options") or {}
+        n_tokens = int(options.get("num_predict") or config.response_tokens)
+        tokens = _json(messages, rng) if body.get("format") == "json" else _texto(rng, n_tokens)
+        prefill = _latencia(config, rng) + prompt_tokens / max(config.prompt_tokens_per_second, 1e-9)
+        por_token = 1.0 / max(config.tokens_per_second, 1e-9)
+        ns = 1_000_000_000
+
+        def final(extra=None):
+            return {
+                "model": model,
+                "created_at": _agora(),
+                "message": {"role": "assistant", "content": extra or ""},
+                "done": True,
+                "done_reason": "stop",
+                "total_duration": int((prefill + len(tokens) * por_token) * ns),
+                "load_duration": 0,
+                "prompt_eval_count": prompt_tokens,
+                "prompt_eval_duration": int(prefill * ns),
+                "eval_count": len(tokens),
+                "eval_duration": int(len(tokens) * por_token * ns),
+            }
+
+        if not stream:
+            await dormir(prefill + len(tokens) * por_token)
+            return final("".join(tokens))
+
+        async def ndjson():
+            await dormir(prefill)
+            for token in tokens:
+                await dormir(por_token)
+                yield json.dumps({"model": model, "created_at": _agora(),
+                                  "message": {"role": "assistant", "content": token}, "done": False}) + "\n"
+            yield json.dumps(final()) + "\n"
+
+        return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+    return app
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Servidor stub compatível com o Ollama para benchmarks.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=11500)
+    ap.add_argument("--tokens-per-second", type=float, default=50.0, help="Taxa de geração (eval).")
+    ap.add_argument("--prompt-tokens-per-second", type=float, default=500.0, help="Taxa de prefill (prompt_eval).")
+    ap.add_argument("--latency-ms", type=float, default=200.0, help="Latência base antes do primeiro token.")
+    ap.add_argument("--latency-jitter-ms", type=float, default=50.0)
+    ap.add_argument("--latency-dist", choices=["normal", "uniform", "lognormal"], default="normal")
+    ap.add_argument("--response-tokens", type=int, default=120, help="Tokens por resposta de texto.")
+    ap.add_argument("--failure-rate", type=float, default=0.0, help="Fração de respostas HTTP 500.")
+    ap.add_argument("--hang-rate", type=float, default=0.0, help="Fração de requisições que travam.")
+    ap.add_argument("--hang-seconds", type=float, default=600.0)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    import uvicorn
+
+    config = StubConfig(
+        tokens_per_second=args.tokens_per_second,
+        prompt_tokens_per_second=args.prompt_tokens_per_second,
+        latency_ms=args.latency_ms,
+        latency_jitter_ms=args.latency_jitter_ms,
+        latency_dist=args.latency_dist,
+        response_tokens=args.response_tokens,
+        failure_rate=args.failure_rate,
+        hang_rate=args.hang_rate,
+        hang_seconds=args.hang_seconds,
+        seed=args.seed,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,30 @@
+import argparse
 import asyncio
-import schedule
-import time
 import logging
+import socket
+import time
+import uuid
 from datetime import datetime
 from pymongo import MongoClient
 
-from core.utils import calculate_aqi_from_pm25, get_aqi_category
-from core.meteomatics import fetch_meteomatics
-from services.rag_geo import gerar_json_via_slm, carregar_dados_csv, carregar_ou_criar_index, buscar_pontos_proximos
-from services.relatorio import gerar_relatorio_amigavel, carregar_csv, carregar_txt
+from core.config import (
+    ORCHESTRATOR_CRON, ORCHESTRATOR_JITTER_SECONDS, ORCHESTRATOR_CATCH_UP, ORCHESTRATOR_LOCK_TTL_SECONDS,
+    CELL_RESOLUTION_DEG, FETCH_CONCURRENCY, SLM_CONCURRENCY, SMTP_CONCURRENCY,
+    PIPELINE_BATCH_SIZE, PIPELINE_QUEUE_SIZE, FETCH_BATCH_POINTS, ORCHESTRATOR_MODE,
+    ORCHESTRATOR_SHARDS, SHARD_LEASE_SECONDS, SHARD_PERIOD_MINUTES, EVALUATION_MODE, REPORT_DEADLINE_SECONDS, GEO_YEAR,
+)
+from core.executors import get_pool, pools_stats, shutdown_pools
+from core.slm import slm_stats
+from core.pipeline import Pipeline, Stage
+from core.scheduler import AsyncScheduler
+from core.utils import calculate_aqi_from_pm25, get_aqi_category, get_cell_id
+from core.meteomatics import fetch_meteomatics_points
+from services.geo_store import dados_geo
+from services.rag_geo import gerar_json_via_slm, buscar_vizinhos_em_lote
+from services.avaliacao import gerar_json_avaliacao, avaliar_pontos
+from services.relatorio import gerar_relatorio_amigavel, gerar_relatorio_template, conhecimento
+from services import orchestrator_runs as runs
+from services import report_cache
 from email.mime.text import MIMEText
 import smtplib
 import os
@@ -32,25 +48,35 @@ AQI_ABOUT = "./services/data/about_aqi.txt"
 logger = logging.getLogger("air-orchestrator")
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 
+_mongo_client = None
+scheduler = None
+
 # ----------------------------------------
 # FUNÇÕES AUXILIARES
 # ----------------------------------------
-async def get_air_quality_data(lat, lon):
-    """Consulta a API e retorna AQI e categoria."""
+def get_db():
+    """Conexão MongoDB compartilhada pelo processo (reaproveitada entre execuções)."""
+    global _mongo_client
+    if _mongo_client is None:
+        _mongo_client = MongoClient(MONGO_URI)
+    return _mongo_client[MONGO_DB_NAME]
+
+
+async def get_air_quality_batch(coords):
+    """Consulta a API para vários pontos numa única requisição; retorna [(aqi, categoria), ...] na ordem de `coords`."""
     params = ["pm2p5:ugm3"]
-    try:
-        data = await fetch_meteomatics(params, lat, lon, hours=1)
-        pm25 = data["data"][0]["coordinates"][0]["dates"][0]["value"]
+    async with get_pool("fetch").slot():
+        data = await fetch_meteomatics_points(params, coords, hours=1)
+    resultados = []
+    for ponto in data["data"][0]["coordinates"]:
+        pm25 = ponto["dates"][0]["value"]
         aqi = calculate_aqi_from_pm25(pm25)
-        categoria = get_aqi_category(aqi)
-        return aqi, categoria
-    except Exception as e:
-        logger.error(f"Erro ao buscar dados do ar ({lat},{lon}): {e}")
-        return None, "Erro"
+        resultados.append((aqi, get_aqi_category(aqi)))
+    return resultados
 
 
 def enviar_email(dest, assunto, corpo):
-    """Envia e-mail com o relatório."""
+    """Envia e-mail com o relatório. Retorna True se enviado."""
     msg = MIMEText(corpo, "plain", "utf-8")
     msg["Subject"] = assunto
     msg["From"] = SMTP_USER
@@ -62,90 +88,480 @@ def enviar_email(dest, assunto, corpo):
             server.login(SMTP_USER, SMTP_PASS)
             server.send_message(msg)
         logger.info(f"✅ Email enviado para {dest}")
+        return True
     except Exception as e:
         logger.error(f"❌ Erro ao enviar email para {dest}: {e}")
+        return False
 
 
-async def processar_usuario(usuario, df, index):
-    """Processa um usuário: checa AQI e envia email se acima do limite."""
+def dados_usuario(usuario):
+    """Extrai os campos usados no alerta ou None se a inscrição for inválida."""
     lat = usuario.get("lat") or usuario.get("latitude")
     lon = usuario.get("lon") or usuario.get("longitude")
-    profile = usuario.get("profile", "adulto")
-    threshold = usuario.get("thresholds", {}).get("aqi", 100)
     email = usuario.get("email")
-
     if not lat or not lon or not email:
-        logger.warning(f"Usuário inválido: {usuario}")
-        return
-
-    aqi_atual, categoria = await get_air_quality_data(lat, lon)
-    if aqi_atual is None:
-        return
-
-    logger.info(f"{email}: AQI={aqi_atual} ({categoria})")
-
-    if aqi_atual > threshold:
-        df_resultado = buscar_pontos_proximos(lat, lon, index, df, k=10)
-        json_final = gerar_json_via_slm(lat, lon, df_resultado)
-
-        json_path = f"./services/data/resultado_{lat}_{lon}.json"
-        with open(json_path, "w", encoding="utf-8") as f:
-            f.write(json_final)
-
-        aqi_json = json.loads(json_final)
-        chem_effects = carregar_csv(CHEM_EFFECTS_CSV)
-        about_aqi_text = carregar_txt(AQI_ABOUT)
-
-        relatorio_texto = gerar_relatorio_amigavel(aqi_atual, aqi_json, chem_effects, about_aqi_text, profile)
-        enviar_email(email, f"⚠️ Alerta de Qualidade do Ar ({categoria})", relatorio_texto)
-
-
-async def tarefa_diaria():
-    """Executa a rotina completa — consulta todos os usuários e processa AQI."""
-    logger.info("🚀 Iniciando rotina diária...")
+        return None
+    profile = usuario.get("profile") or "adulto"
+    thresholds = usuario.get("thresholds") or {}
+    return {
+        "id": str(usuario["_id"]),
+        "lat": lat,
+        "lon": lon,
+        "email": email,
+        "profile": profile,
+        "threshold": thresholds.get("aqi", 100),
+        "prefs_hash": runs.hash_preferencias(thresholds, profile),
+    }
+
+
+class ContextoExecucao:
+    """Estado compartilhado pelas etapas de uma execução (dados geo carregados sob demanda, cache de células)."""
+
+    def __init__(self, db, run, modo=runs.MODE_FULL, retomada=False):
+        self.db = db
+        self.run_id = run["_id"]
+        self.modo = modo
+        self.retomada = retomada
+        self.aqi_por_celula = {}
+        # célula → (Vizinhos do lote, posição): vizinhos buscados em lote, registros montados sob demanda
+        self.vizinhos_por_celula = {}
+        self.relatorios = report_cache.CacheRelatorios(
+            db, report_cache.snapshot_dados(DATA_CSV, CHEM_EFFECTS_CSV, AQI_ABOUT, extra=[EVALUATION_MODE, GEO_YEAR])
+        )
+        self.stats = {
+            "lidos": 0,
+            "invalidos": 0,
+            "ja_concluidos": 0,
+            "inalterados": 0,
+            "abaixo_limiar": 0,
+            "enviados": 0,
+            "falhas": 0,
+            # Origem do relatório de cada assinante alertado
+            "relatorio_slm": 0,
+            "relatorio_cache": 0,
+            "relatorio_template": 0,
+            "relatorio_prazo_estourado": 0,
+            "relatorio_erro_slm": 0,
+        }
+
+    async def dados_geo(self):
+        # Só carrega os dados geo se algum usuário realmente passar do limite; depois disso
+        # ficam no processo (compartilhados com a API) até o tempo.csv mudar
+        return await get_pool("geo").run(dados_geo)
+
+    async def preparar_vizinhos(self, celulas):
+        """Vizinhos dos centros de várias células numa única busca vetorizada."""
+        geo = await self.dados_geo()
+        centros = [centro_celula(c) for c in celulas]
+        vizinhos = await get_pool("geo").run(
+            buscar_vizinhos_em_lote, [c[0] for c in centros], [c[1] for c in centros], geo.index, geo.colunas, 10
+        )
+        for i, celula in enumerate(celulas):
+            self.vizinhos_por_celula[celula] = (vizinhos, i)
+
+    async def checkpoint(self, itens):
+        await asyncio.to_thread(runs.registrar_checkpoints, self.db, self.run_id, itens)
+
+
+def centro_celula(celula: str):
+    lat_ll, lon_ll = (float(v) for v in celula.split(":"))
+    meia = CELL_RESOLUTION_DEG / 2
+    return round(lat_ll + meia, 4), round(lon_ll + meia, 4)
+
+
+def _proximo_lote(cursor, tamanho):
+    lote = []
+    for doc in cursor:
+        lote.append(doc)
+        if len(lote) >= tamanho:
+            break
+    return lote
+
+
+async def lotes_de_assinantes(db, tamanho=PIPELINE_BATCH_SIZE, filtro=None):
+    """Fonte do pipeline: lê as inscrições do cursor em lotes, sem materializar a coleção."""
+    cursor = db["subscriptions"].find(
+        filtro or {}, {"email": 1, "lat": 1, "lon": 1, "latitude": 1, "longitude": 1, "profile": 1, "thresholds": 1}
+    ).sort("_id", 1).batch_size(tamanho)
+    try:
+        while True:
+            lote = await asyncio.to_thread(_proximo_lote, cursor, tamanho)
+            if not lote:
+                return
+            yield lote
+    finally:
+        cursor.close()
+
+
+def _estado(assinante, celula, snapshot):
+    return {"prefs_hash": assinante["prefs_hash"], "cell": celula, "cell_snapshot": snapshot}
+
+
+def montar_pipeline(ctx: ContextoExecucao, fonte=None) -> Pipeline:
+    """cursor em lotes → agrupamento por célula → AQI em lote → filtro de limiar → relatório → e-mail."""
+    db = ctx.db
+
+    async def agrupar_celulas(lote, emit):
+        ctx.stats["lidos"] += len(lote)
+        assinantes = []
+        for usuario in lote:
+            dados = dados_usuario(usuario)
+            if dados is None:
+                ctx.stats["invalidos"] += 1
+                logger.warning(f"Usuário inválido: {usuario.get('_id')}")
+                continue
+            assinantes.append(dados)
+
+        ids = [a["id"] for a in assinantes]
+        if ctx.retomada and ids:
+            feitos = await asyncio.to_thread(runs.concluidos, db, ctx.run_id, ids)
+            ctx.stats["ja_concluidos"] += len(feitos)
+            assinantes = [a for a in assinantes if a["id"] not in feitos]
+        if ctx.modo == runs.MODE_INCREMENTAL and assinantes:
+            anteriores = await asyncio.to_thread(runs.estados, db, [a["id"] for a in assinantes])
+            for a in assinantes:
+                a["estado_anterior"] = anteriores.get(a["id"])
+
+        celulas = {}
+        for a in assinantes:
+            celulas.setdefault(get_cell_id(a["lat"], a["lon"]), []).append(a)
+        await asyncio.to_thread(runs.heartbeat, db, ctx.run_id, dict(ctx.stats))
+        if celulas:
+            await emit(celulas)
+
+    async def buscar_aqi(celulas, emit):
+        # Células já buscadas (ou em voo em outro worker) nesta execução são reaproveitadas
+        pendentes = [c for c in celulas if c not in ctx.aqi_por_celula]
+        loop = asyncio.get_running_loop()
+        for celula in pendentes:
+            ctx.aqi_por_celula[celula] = loop.create_future()
+        try:
+            for i in range(0, len(pendentes), FETCH_BATCH_POINTS):
+                bloco = pendentes[i:i + FETCH_BATCH_POINTS]
+                coords = [centro_celula(celula) for celula in bloco]
+                try:
+                    resultados = await get_air_quality_batch(coords)
+                    if len(resultados) != len(bloco):
+                        raise ValueError(f"API devolveu {len(resultados)} pontos para {len(bloco)} pedidos")
+                except Exception as e:
+                    logger.error(f"Erro ao buscar dados do ar para {len(bloco)} células: {e}")
+                    resultados = [(None, "Erro")] * len(bloco)
+                for celula, resultado in zip(bloco, resultados):
+                    ctx.aqi_por_celula[celula].set_result(resultado)
+        finally:
+            # Nenhuma célula pode ficar com future pendente: outros lotes (e este) aguardam por ela
+            for celula in pendentes:
+                if not ctx.aqi_por_celula[celula].done():
+                    ctx.aqi_por_celula[celula].set_result((None, "Erro"))
+        resultados = {celula: await ctx.aqi_por_celula[celula] for celula in celulas}
+        # Células com algum assinante acima do limiar: vizinhos de todas numa só busca
+        alertaveis = [
+            celula for celula, usuarios in celulas.items()
+            if resultados[celula][0] is not None and celula not in ctx.vizinhos_por_celula
+            and any(resultados[celula][0] > a["threshold"] for a in usuarios)
+        ]
+        if alertaveis:
+            await ctx.preparar_vizinhos(alertaveis)
+        for celula, usuarios in celulas.items():
+            aqi, categoria = resultados[celula]
+            if aqi is not None:
+                await emit((celula, aqi, categoria, usuarios))
+
+    async def filtrar_limiar(item, emit):
+        celula, aqi, categoria, usuarios = item
+        snapshot = runs.hash_snapshot_celula(celula, aqi, categoria)
+        checkpoints = []
+        for a in usuarios:
+            logger.debug(f"{a['email']}: AQI={aqi} ({categoria})")
+            anterior = a.get("estado_anterior")
+            if (anterior and anterior.get("prefs_hash") == a["prefs_hash"]
+                    and anterior.get("cell_snapshot") == snapshot):
+                ctx.stats["inalterados"] += 1
+                checkpoints.append((a["id"], runs.CK_DONE, {"result": "unchanged"}, None))
+                continue
+            a["estado"] = _estado(a, celula, snapshot)
+            if aqi > a["threshold"]:
+                await emit((a, aqi, categoria))
+            else:
+                ctx.stats["abaixo_limiar"] += 1
+                checkpoints.append((a["id"], runs.CK_DONE, {"result": "below_threshold", "aqi": aqi}, a["estado"]))
+        await ctx.checkpoint(checkpoints)
+
+    async def gerar_para_celula(celula, aqi_atual, profile):
+        # O relatório é gerado para o centro da célula: vale para todos os assinantes dela
+        lat, lon = centro_celula(celula)
+        if celula not in ctx.vizinhos_por_celula:
+            await ctx.preparar_vizinhos([celula])
+        vizinhos, i = ctx.vizinhos_por_celula[celula]
+        df_resultado = vizinhos.frame(i)
+        # Tabela de efeitos e texto sobre AQI vêm do registro (carregados uma vez por processo);
+        # a checagem/recarga lê arquivos, então sai do event loop
+        chem_effects, about_aqi_text = await asyncio.to_thread(conhecimento)
+
+        # Mesmo prazo para o wait_for e para o timeout HTTP de cada chamada ao SLM: uma chamada
+        # abandonada pelo wait_for não segura a thread do pool "slm" além do prazo
+        prazo = time.monotonic() + REPORT_DEADLINE_SECONDS
+
+        async def via_slm():
+            if EVALUATION_MODE == "slm":
+                json_final = await get_pool("slm").run(gerar_json_via_slm, lat, lon, df_resultado, deadline=prazo)
+            else:
+                # Rótulos do tempo.csv projetados direto no esquema de avaliação (sem SLM)
+                json_final = gerar_json_avaliacao(lat, lon, df_resultado)
+
+            json_path = f"./services/data/resultado_{lat}_{lon}.json"
+            with open(json_path, "w", encoding="utf-8") as f:
+                f.write(json_final)
+
+            aqi_json = json.loads(json_final)
+            return await get_pool("slm").run(
+                gerar_relatorio_amigavel, aqi_atual, aqi_json, chem_effects, about_aqi_text, profile, deadline=prazo
+            )
+
+        # Prazo por geração: com o modelo lento ou com erro, o relatório sai do template
+        try:
+            texto = await asyncio.wait_for(via_slm(), timeout=REPORT_DEADLINE_SECONDS)
+            return texto, report_cache.CAMINHO_SLM
+        except asyncio.TimeoutError:
+            ctx.stats["relatorio_prazo_estourado"] += 1
+            logger.warning(f"⏱️ Relatório da célula {celula} excedeu {REPORT_DEADLINE_SECONDS}s — usando template")
+        except Exception as e:
+            ctx.stats["relatorio_erro_slm"] += 1
+            logger.warning(f"Falha do SLM no relatório da célula {celula}: {e} — usando template")
+        texto = gerar_relatorio_template(aqi_atual, avaliar_pontos(lat, lon, df_resultado), chem_effects, profile)
+        return texto, report_cache.CAMINHO_TEMPLATE
+
+    async def gerar_relatorio(item, emit):
+        a, aqi_atual, categoria = item
+        celula = a["estado"]["cell"]
+        try:
+            relatorio_texto, caminho = await ctx.relatorios.obter(
+                celula, aqi_atual, a["profile"],
+                lambda: gerar_para_celula(celula, aqi_atual, a["profile"]),
+            )
+        except Exception as e:
+            ctx.stats["falhas"] += 1
+            await ctx.checkpoint([(a["id"], runs.CK_FAILED, {"stage": "relatorio", "error": str(e)}, None)])
+            raise
+        ctx.stats[f"relatorio_{caminho}"] += 1
+        a["report_path"] = caminho
+        await emit((a, f"⚠️ Alerta de Qualidade do Ar ({categoria})", relatorio_texto, aqi_atual))
+
+    async def enviar(item, emit):
+        a, assunto, corpo, aqi = item
+        if await get_pool("smtp").run(enviar_email, a["email"], assunto, corpo):
+            ctx.stats["enviados"] += 1
+            await ctx.checkpoint([(a["id"], runs.CK_DONE,
+                                   {"result": "sent", "aqi": aqi, "report_path": a.get("report_path")}, a["estado"])])
+        else:
+            ctx.stats["falhas"] += 1
+            await ctx.checkpoint([(a["id"], runs.CK_FAILED, {"stage": "email"}, None)])
+
+    return Pipeline(
+        "alertas",
+        fonte if fonte is not None else lotes_de_assinantes(db),
+        [
+            Stage("celulas", agrupar_celulas, workers=1, queue_size=2),
+            Stage("aqi", buscar_aqi, workers=FETCH_CONCURRENCY, queue_size=FETCH_CONCURRENCY * 2),
+            Stage("limiar", filtrar_limiar, workers=1, queue_size=PIPELINE_QUEUE_SIZE),
+            Stage("relatorio", gerar_relatorio, workers=SLM_CONCURRENCY * 2, queue_size=PIPELINE_QUEUE_SIZE),
+            Stage("email", enviar, workers=SMTP_CONCURRENCY, queue_size=PIPELINE_QUEUE_SIZE),
+        ],
+    )
+
+
+async def tarefa_diaria(modo=None, retomar=False):
+    """
+    Executa a rotina completa — percorre todos os usuários em streaming e processa AQI.
+    modo="incremental" processa só quem teve limiares/perfil ou dados da célula alterados
+    desde a última execução bem-sucedida; retomar=True continua a última execução incompleta.
+    """
+    modo = modo or ORCHESTRATOR_MODE
+    logger.info(f"🚀 Iniciando rotina (modo={modo}, retomar={retomar})...")
+    retomada = False
     try:
-        client = MongoClient(MONGO_URI)
-        db = client[MONGO_DB_NAME]
-        usuarios = list(db["subscriptions"].find({}))  # <-- agora busca todos
+        db = get_db()
+        await asyncio.to_thread(runs.ensure_indexes, db)
+        await asyncio.to_thread(report_cache.ensure_indexes, db)
+        run = await asyncio.to_thread(runs.retomar_execucao, db) if retomar else None
+        if retomar and run is None:
+            logger.info("Nenhuma execução incompleta para retomar — iniciando uma nova.")
+        if run is None:
+            run = await asyncio.to_thread(runs.criar_execucao, db, modo)
+        else:
+            retomada = True
+            modo = run.get("mode", modo)
+            logger.info(f"↩️  Retomando execução {run['_id']} (iniciada em {run['started_at']})")
     except Exception as e:
         logger.error(f"Erro ao conectar ao MongoDB: {e}")
         return
 
-    logger.info(f"Total de usuários encontrados: {len(usuarios)}")
-
-    if not usuarios:
-        logger.warning("Nenhum usuário encontrado.")
-        return
-
-    df = carregar_dados_csv()
-    index = carregar_ou_criar_index(df)
-
-    tasks = [processar_usuario(u, df, index) for u in usuarios]
-    await asyncio.gather(*tasks)
-
-    logger.info("🏁 Rotina concluída com sucesso!")
-
+    ctx = ContextoExecucao(db, run, modo=modo, retomada=retomada)
+    pipeline = montar_pipeline(ctx)
+    inicio = datetime.now()
+    status, erro = runs.RUN_FAILED, None
+    try:
+        await pipeline.run()
+        status = runs.RUN_COMPLETED
+    except asyncio.CancelledError:
+        status = runs.RUN_INTERRUPTED
+        raise
+    except Exception as e:
+        erro = str(e)
+        logger.exception(f"❌ Rotina falhou: {e}")
+    finally:
+        stats = {**ctx.stats, "celulas": len(ctx.aqi_por_celula), "relatorios": dict(ctx.relatorios.stats),
+                 "etapas": pipeline.summary()}
+        await asyncio.to_thread(runs.finalizar_execucao, db, ctx.run_id, status, stats, erro)
+        pipeline.log_summary(logger)
+        logger.info(f"📊 Pools: {pools_stats()}")
+        logger.info(f"🧠 SLM: {slm_stats()}")
+        logger.info(
+            f"🏁 Rotina {status} em {(datetime.now() - inicio).total_seconds():.1f}s — "
+            f"execução={ctx.run_id} células={len(ctx.aqi_por_celula)} {ctx.stats} relatórios={ctx.relatorios.stats}"
+        )
+
+
+async def _manter_lease(db, shard, worker_id, perdido: asyncio.Event):
+    while True:
+        await asyncio.sleep(max(SHARD_LEASE_SECONDS / 3, 1))
+        try:
+            if not await asyncio.to_thread(runs.renovar_lease, db, shard, worker_id):
+                logger.warning(f"⚠️ Lease do shard {shard['shard']} perdido — abortando o processamento local")
+                perdido.set()
+                return
+        except Exception as e:
+            logger.warning(f"Falha ao renovar lease do shard {shard['shard']}: {e}")
+
+
+async def processar_shard(db, run, shard, worker_id):
+    """Processa a faixa de hash do shard reaproveitando checkpoints de um dono anterior."""
+    ctx = ContextoExecucao(db, run, modo=run.get("mode", runs.MODE_FULL), retomada=True)
+    fonte = lotes_de_assinantes(db, filtro={"shard_hash": {"$gte": shard["lo"], "$lt": shard["hi"]}})
+    pipeline = montar_pipeline(ctx, fonte=fonte)
+
+    perdido = asyncio.Event()
+    heartbeat = asyncio.create_task(_manter_lease(db, shard, worker_id, perdido))
+    execucao = asyncio.create_task(pipeline.run())
+    vigia = asyncio.create_task(perdido.wait())
+    try:
+        await asyncio.wait({execucao, vigia}, return_when=asyncio.FIRST_COMPLETED)
+        if not execucao.done():
+            execucao.cancel()
+            await asyncio.gather(execucao, return_exceptions=True)
+            return None
+        execucao.result()
+    finally:
+        heartbeat.cancel()
+        vigia.cancel()
+    return {**ctx.stats, "celulas": len(ctx.aqi_por_celula),
+            **{f"relatorios_{k}": v for k, v in ctx.relatorios.stats.items()}}
+
+
+async def tarefa_distribuida(n_shards=None, worker_id=None):
+    """
+    Worker de uma execução distribuída: entra na execução do período, reserva shards
+    (faixas de hash da célula) via lease no MongoDB até não restar nenhum. Shards de
+    workers mortos são retomados quando o lease expira; o último worker consolida o total.
+    """
+    n_shards = n_shards or ORCHESTRATOR_SHARDS or 1
+    worker_id = worker_id or f"{socket.gethostname()}-{uuid.uuid4().hex[:8]}"
+    db = get_db()
+    await asyncio.to_thread(runs.ensure_indexes, db)
+    await asyncio.to_thread(report_cache.ensure_indexes, db)
+    await asyncio.to_thread(runs.garantir_shard_hash, db)
+
+    period_key = f"shards:{int(datetime.utcnow().timestamp() // (SHARD_PERIOD_MINUTES * 60))}"
+    run = await asyncio.to_thread(runs.ingressar_execucao_distribuida, db, period_key, n_shards, ORCHESTRATOR_MODE)
+    logger.info(f"🧩 Worker {worker_id} na execução {run['_id']} ({period_key}, {run['shards']} shards)")
+
+    processados = 0
+    while True:
+        shard = await asyncio.to_thread(runs.reservar_shard, db, run["_id"], worker_id)
+        if shard is None:
+            if await asyncio.to_thread(runs.shards_restantes, db, run["_id"]) == 0:
+                break
+            # Shards restantes estão com outros workers: aguarda concluírem ou o lease expirar
+            await asyncio.sleep(max(SHARD_LEASE_SECONDS / 4, 1))
+            continue
+
+        logger.info(f"📦 Shard {shard['shard']} [{shard['lo']}, {shard['hi']}) reservado (tentativa {shard['attempts']})")
+        try:
+            stats = await processar_shard(db, run, shard, worker_id)
+        except Exception as e:
+            logger.exception(f"❌ Shard {shard['shard']} falhou: {e}")
+            await asyncio.to_thread(runs.liberar_shard, db, shard["_id"], worker_id, str(e))
+            continue
+        if stats is not None and await asyncio.to_thread(runs.concluir_shard, db, shard["_id"], worker_id, stats):
+            processados += 1
+            logger.info(f"✅ Shard {shard['shard']} concluído: {stats}")
+
+    if await asyncio.to_thread(runs.agregar_execucao, db, run["_id"]):
+        final = await asyncio.to_thread(db[runs.RUNS_COLLECTION].find_one, {"_id": run["_id"]})
+        logger.info(f"🏁 Execução distribuída {run['_id']} concluída: {final.get('stats')}")
+    logger.info(f"👋 Worker {worker_id} finalizado ({processados} shards processados)")
+
+
+def criar_agendador():
+    """Cria o agendador com a passada de alertas (cron configurável via ORCHESTRATOR_CRON)."""
+    global scheduler
+    if scheduler is None:
+        try:
+            db = get_db()
+        except Exception as e:
+            logger.warning(f"Agendador sem MongoDB (sem trava distribuída/histórico persistido): {e}")
+            db = None
+        scheduler = AsyncScheduler(db=db)
+        # No modo distribuído todos os workers rodam juntos; a coordenação é feita pelos leases dos shards
+        scheduler.add_job(
+            "tarefa_diaria",
+            ORCHESTRATOR_CRON,
+            tarefa_distribuida if ORCHESTRATOR_SHARDS > 0 else tarefa_diaria,
+            distributed_lock=ORCHESTRATOR_SHARDS <= 0,
+            jitter_seconds=ORCHESTRATOR_JITTER_SECONDS,
+            catch_up=ORCHESTRATOR_CATCH_UP,
+            lock_ttl_seconds=ORCHESTRATOR_LOCK_TTL_SECONDS,
+        )
+    return scheduler
 
 
 async def agendar_tarefas():
-    """Agenda execução diária (12:00)."""
-    logger.info("⏰ Orquestrador agendado para 12:00 diariamente.")
-    schedule.every().day.at("12:00").do(lambda: asyncio.create_task(tarefa_diaria()))
-
-    while True:
-        schedule.run_pending()
-        await asyncio.sleep(30)
+    """Modo worker dedicado: roda o agendador até o processo ser encerrado."""
+    logger.info(f"⏰ Orquestrador agendado com cron '{ORCHESTRATOR_CRON}'.")
+    await criar_agendador().run_forever()
 
 
 async def iniciar_orquestrador():
     """Inicia o orquestrador (para uso dentro do FastAPI)."""
-    asyncio.create_task(agendar_tarefas())
+    criar_agendador().start()
     logger.info("🧠 Orquestrador iniciado em background.")
 
 
+async def parar_orquestrador():
+    """Para o agendador (shutdown do FastAPI)."""
+    if scheduler is not None:
+        await scheduler.stop()
+    shutdown_pools()
+
+
 # ----------------------------------------
 # MODO TESTE DIRETO
 # ----------------------------------------
 if __name__ == "__main__":
-    print("🧩 Rodando orquestrador manualmente (modo teste)...")
-    asyncio.run(tarefa_diaria())
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--worker", action="store_true", help="Roda como worker dedicado, seguindo o agendamento cron.")
+    ap.add_argument("--resume", action="store_true", help="Retoma a última execução incompleta, pulando quem já foi concluído.")
+    ap.add_argument("--incremental", action="store_true",
+                    help="Processa só assinantes com limiares ou dados da célula alterados desde a última execução.")
+    ap.add_argument("--shards", type=int, default=None,
+                    help="Roda uma vez como worker de execução distribuída com N shards (entra na execução do período).")
+    args = ap.parse_args()
+
+    if args.shards:
+        asyncio.run(tarefa_distribuida(n_shards=args.shards))
+    elif args.worker:
+        asyncio.run(agendar_tarefas())
+    else:
+        print("🧩 Rodando orquestrador manualmente (modo teste)...")
+        modo = runs.MODE_INCREMENTAL if args.incremental else None
+        asyncio.run(tarefa_diaria(modo=modo, retomar=args.resume))
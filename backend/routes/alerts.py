@@ -1,30 +1,81 @@
 from fastapi import APIRouter, HTTPException
 from services.alerts import dispatch_alerts
+from services.jobs import submit_job, get_job, cancel_job
+from services.outbox import outbox_metrics
+from core.database import db
 import logging
 
 router = APIRouter(prefix="/alerts", tags=["Alerts"])
 logger = logging.getLogger("air-api")
 
-@router.post("/dispatch")
+async def _dispatch_job(lat: float, lon: float, progress=None):
+    """Executa o dispatch em background e guarda só o resumo no job."""
+    result = await dispatch_alerts(lat, lon, progress=progress)
+    return {
+        "enqueued": len(result.get("enqueued", [])),
+        "duplicates": len(result.get("duplicates", [])),
+        "failed": result.get("failed", [])[:50],
+        "aqi": result.get("aqi"),
+        "category": result.get("category"),
+        "timestamp": result.get("timestamp"),
+        "location": result.get("location", {}),
+        "cell": result.get("cell"),
+    }
+
+@router.post("/dispatch", status_code=202)
 async def trigger_alerts(lat: float, lon: float):
     """
-    Dispara alertas de qualidade do ar para os assinantes via e-mail.
-    Baseia-se nos thresholds salvos no MongoDB.
+    Agenda em background o disparo de alertas de qualidade do ar para os assinantes.
+    Retorna imediatamente o ID do job; o progresso fica em GET /alerts/jobs/{job_id}.
     """
+    if db is None:
+        raise HTTPException(status_code=503, detail="MongoDB não configurado")
+    if not (-90 <= lat <= 90) or not (-180 <= lon <= 180):
+        raise HTTPException(status_code=400, detail="Coordenadas inválidas")
     try:
-        result = await dispatch_alerts(lat, lon)
-        if not result:
-            raise HTTPException(status_code=500, detail="Erro ao disparar alertas")
+        job = submit_job("dispatch", _dispatch_job, lat, lon, params={"lat": lat, "lon": lon})
         return {
             "success": True,
-            "dispatched": len(result.get("sent", [])),
-            "failed": result.get("failed", []),
-            "aqi": result.get("aqi"),
-            "category": result.get("category"),
-            "location": result.get("location", {}),
+            "job_id": job.id,
+            "status": job.status,
+            "status_url": f"/alerts/jobs/{job.id}",
         }
-    except HTTPException:
-        raise
     except Exception as e:
-        logger.exception("Erro ao enviar alertas: %s", e)
+        logger.exception("Erro ao agendar alertas: %s", e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/jobs/{job_id}")
+async def get_dispatch_job(job_id: str):
+    """
+    Status e progresso de um job de dispatch (contadores e tempo por etapa).
+    """
+    job = get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return job
+
+
+@router.post("/jobs/{job_id}/cancel")
+async def cancel_dispatch_job(job_id: str):
+    """
+    Solicita o cancelamento de um job de dispatch em andamento.
+    """
+    job = cancel_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return job
+
+
+@router.get("/outbox/metrics")
+async def get_outbox_metrics():
+    """
+    Métricas do outbox de alertas: jobs por status, lag da fila e throughput.
+    """
+    if db is None:
+        raise HTTPException(status_code=503, detail="MongoDB não configurado")
+    try:
+        return outbox_metrics()
+    except Exception as e:
+        logger.exception("Erro ao calcular métricas do outbox: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
@@ -2,6 +2,9 @@ from fastapi import APIRouter
 from datetime import datetime
 from core.config import METEOMATICS_USER, SMTP_HOST, SMTP_USER, SMTP_PASSWORD, SLM_PROVIDER, OLLAMA_MODEL
 from core.database import db
+from core.scheduler import schedulers_status
+from core.slm import slm_stats
+from core.knowledge import registry
 
 router = APIRouter(prefix="/health", tags=["Health"])
 
@@ -14,6 +17,8 @@ async def health_check():
             "meteomatics": "ok" if METEOMATICS_USER else "not configured",
             "mongodb": "ok" if db else "not configured",
             "email": "ok" if SMTP_HOST and SMTP_USER and SMTP_PASSWORD else "not configured",
-            "slm": {"provider": SLM_PROVIDER, "model": OLLAMA_MODEL}
-        }
+            "slm": {"provider": SLM_PROVIDER, "model": OLLAMA_MODEL, "stats": slm_stats()}
+        },
+        "schedulers": schedulers_status(),
+        "knowledge": registry.stats()
     }
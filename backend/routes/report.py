@@ -0,0 +1,51 @@
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+from services.report_stream import limiter, prepare_report, report_events, release_once
+import logging
+
+router = APIRouter(prefix="/report", tags=["Report"])
+logger = logging.getLogger("air-api")
+
+
+@router.get("/")
+async def stream_report(request: Request, lat: float, lon: float, profile: str = "adulto", year: Optional[int] = None):
+    """
+    Gera o relatório amigável sob demanda, transmitindo o texto via Server-Sent Events
+    à medida que o modelo produz os tokens. `year` escolhe o ano de cenário do tempo.csv.
+    """
+    if not (-90 <= lat <= 90) or not (-180 <= lon <= 180):
+        raise HTTPException(status_code=400, detail="Coordenadas inválidas")
+
+    if not await limiter.acquire():
+        raise HTTPException(
+            status_code=503,
+            detail="Gerador de relatórios ocupado, tente novamente em instantes",
+            headers={"Retry-After": str(int(limiter.timeout) or 1)},
+        )
+    release = release_once()
+    try:
+        messages, meta = await prepare_report(lat, lon, profile, year)
+    except HTTPException:
+        release()
+        raise
+    except Exception as e:
+        release()
+        logger.exception("Erro ao preparar relatório: %s", e)
+        raise HTTPException(status_code=500, detail=f"Erro ao preparar relatório: {e}")
+
+    return StreamingResponse(
+        report_events(request, messages, meta, release),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # Garante a liberação mesmo se o streaming nunca chegar a iniciar
+        background=BackgroundTask(release),
+    )
+
+
+@router.get("/stats")
+async def report_stats():
+    """Ocupação do limitador de gerações (ativas, na fila, rejeitadas)."""
+    return limiter.stats()
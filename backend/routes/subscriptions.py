@@ -2,6 +2,8 @@ from fastapi import APIRouter, HTTPException
 from datetime import datetime
 from models.schemas import EmailSubscription
 from core.database import db
+from core.config import CELL_RESOLUTION_DEG
+from core.utils import get_shard_hash
 import logging
 
 router = APIRouter(prefix="/subscribe", tags=["Subscriptions"])
@@ -30,6 +32,10 @@ async def subscribe_email(subscription: EmailSubscription):
             "subscribed_at": datetime.utcnow(),
             "active": True
         }
+        if subscription.lat is not None and subscription.lon is not None:
+            # Shard do orquestrador distribuído (faixa de hash da célula)
+            data["shard_hash"] = get_shard_hash(subscription.lat, subscription.lon)
+            data["shard_res"] = CELL_RESOLUTION_DEG
         result = db["subscriptions"].insert_one(data)
         logger.info("✅ Nova inscrição salva para %s", subscription.email)
         return {"success": True, "subscription_id": str(result.inserted_id)}
@@ -1,63 +1,105 @@
 import asyncio
 import logging
 from core.database import db
-from core.email_utils import send_email
+from core.utils import get_aqi_level, get_cell_id
 from services.air_quality import get_air_quality_data
+from services.jobs import JobProgress
+from services.outbox import enqueue_alert, time_bucket
 
 logger = logging.getLogger("air-api")
 
-async def dispatch_alerts(lat: float, lon: float):
+CANCEL_CHECK_EVERY = 500
+
+def should_alert(thresholds: dict, aqi_value: int, category: str) -> bool:
+    thresholds = thresholds or {}
+
+    # Threshold numérico
+    if "aqi" in thresholds and isinstance(thresholds["aqi"], (int, float)):
+        if aqi_value >= thresholds["aqi"]:
+            return True
+
+    # Threshold por categoria
+    if isinstance(thresholds.get("category"), str):
+        if category.lower() == thresholds["category"].strip().lower():
+            return True
+
+    return False
+
+def build_alert_body(aqi_value: int, category: str, timestamp: str, location: dict) -> str:
+    name = (location or {}).get("name", "sua região")
+    return (
+        f"Olá!\n\n"
+        f"A qualidade do ar em {name} atingiu o nível '{category}' (AQI {aqi_value}) em {timestamp}.\n"
+        f"Evite atividades prolongadas ao ar livre e acompanhe as atualizações.\n\n"
+        f"— Air Alerts"
+    )
+
+async def dispatch_alerts(lat: float, lon: float, progress: JobProgress = None):
+    """
+    Busca o AQI da coordenada, avalia os thresholds de cada assinante e enfileira
+    os alertas no outbox. `progress` (opcional) recebe contadores e tempos por etapa.
+    """
     if db is None:
         raise RuntimeError("MongoDB não configurado")
+    progress = progress or JobProgress("dispatch", persistent=False)
 
-    air_data = await get_air_quality_data(lat, lon)
-    timeline = air_data.get("timeline", [])
-    if not timeline:
-        raise RuntimeError("Sem dados de qualidade do ar")
+    with progress.stage("fetch"):
+        air_data = await get_air_quality_data(lat, lon)
+        timeline = air_data.get("timeline", [])
+        if not timeline:
+            raise RuntimeError("Sem dados de qualidade do ar")
+        progress.incr("cells_fetched")
 
     latest = timeline[0]
     aqi_value = latest.get("aqi")
     category = latest.get("category")
     timestamp = latest.get("timestamp")
+    location = air_data.get("location")
 
-    sent = []
-    failed = []
-
-    cursor = db["subscriptions"].find({"active": True})
-    tasks = []
-
-    for sub in cursor:
-        email = sub.get("email")
-        thresholds = sub.get("thresholds", {}) or {}
-        should_alert = False
+    cell = get_cell_id(lat, lon)
+    level = get_aqi_level(aqi_value)
+    bucket = time_bucket()
+    subject = f"Alerta de Qualidade do Ar: {category} (AQI {aqi_value})"
+    body = build_alert_body(aqi_value, category, timestamp, location)
 
-        # Threshold numérico
-        if "aqi" in thresholds and isinstance(thresholds["aqi"], (int, float)):
-            if aqi_value >= thresholds["aqi"]:
-                should_alert = True
+    matched = []
+    with progress.stage("evaluate"):
+        cursor = db["subscriptions"].find({"active": True}, {"email": 1, "thresholds": 1})
+        for i, sub in enumerate(cursor, start=1):
+            progress.incr("subscribers_evaluated")
+            if i % CANCEL_CHECK_EVERY == 0:
+                progress.raise_if_cancelled()
+                await asyncio.sleep(0)
+            email = sub.get("email")
+            if email and should_alert(sub.get("thresholds"), aqi_value, category):
+                matched.append((str(sub["_id"]), email))
 
-        # Threshold por categoria
-        if not should_alert and isinstance(thresholds.get("category"), str):
-            if category.lower() == thresholds["category"].strip().lower():
-                should_alert = True
-
-        if not should_alert:
-            continue
-
-        subject = f"Alerta de Qualidade do Ar: {category} (AQI {aqi_value})"
+    enqueued = []
+    duplicates = []
+    failed = []
 
-    results = await asyncio.gather(*tasks)
-    for r in results:
-        if r["ok"]:
-            sent.append(r["email"])
-        else:
-            failed.append(r)
+    with progress.stage("enqueue"):
+        for i, (subscriber_id, email) in enumerate(matched, start=1):
+            if i % CANCEL_CHECK_EVERY == 0:
+                progress.raise_if_cancelled()
+                await asyncio.sleep(0)
+            try:
+                created = enqueue_alert(subscriber_id, email, cell, level, subject, body, bucket=bucket)
+            except Exception as e:
+                logger.warning("Falha ao enfileirar alerta para %s: %s", email, e)
+                failed.append({"email": email, "error": str(e)})
+                progress.incr("failed")
+                continue
+            (enqueued if created else duplicates).append(email)
+            progress.incr("enqueued" if created else "duplicates")
 
     return {
-        "dispatched": len(sent),
+        "enqueued": enqueued,
+        "duplicates": duplicates,
         "failed": failed,
         "aqi": aqi_value,
         "category": category,
         "timestamp": timestamp,
-        "location": air_data.get("location"),
+        "location": location,
+        "cell": cell,
     }
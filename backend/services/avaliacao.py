@@ -0,0 +1,86 @@
+import json
+
+import numpy as np
+
+# ----------------------------------------
+# AVALIAÇÃO DETERMINÍSTICA DOS PONTOS PRÓXIMOS
+# ----------------------------------------
+# O tempo.csv já traz a classificação fuzzy (TRAPS) de cada composto; basta projetá-la
+# no mesmo esquema `evaluations` que o SLM era instruído a gerar.
+LEVELS = ["Good", "Moderate", "USG", "Unhealthy", "Very Unhealthy", "Hazardous"]
+LEVEL_INDEX = {name: i for i, name in enumerate(LEVELS)}
+
+LABEL_COLUMNS = {
+    "NMVOC": "NMVOC_label",
+    "CO": "CO_label",
+    "NOx": "NOx_label",
+    "CH4": "CH4_label",
+}
+FINAL_COLUMN = "final_label"
+DISTANCE_COLUMN = "distancia"
+
+
+def _level_codes(values) -> np.ndarray:
+    """Rótulo → índice ordinal (0 = Good ... 5 = Hazardous); -1 para ausente/desconhecido."""
+    return np.fromiter((LEVEL_INDEX.get(v, -1) for v in values), dtype=np.int8, count=len(values))
+
+
+def avaliar_pontos(lat, lon, df_resultado) -> dict:
+    """
+    Monta o dicionário de avaliação a partir dos k pontos mais próximos (com a coluna
+    `distancia` de buscar_pontos_proximos). `value` é o índice ordinal do nível.
+    """
+    compostos = [(nome, col) for nome, col in LABEL_COLUMNS.items() if col in df_resultado.columns]
+    n = len(df_resultado)
+    codes = np.stack([_level_codes(df_resultado[col].to_numpy()) for _, col in compostos], axis=1) \
+        if compostos else np.full((n, 0), -1, dtype=np.int8)
+    if FINAL_COLUMN in df_resultado.columns:
+        final = _level_codes(df_resultado[FINAL_COLUMN].to_numpy())
+    else:
+        final = codes.max(axis=1) if compostos else np.full(n, -1, dtype=np.int8)
+
+    lats = df_resultado["lat"].to_numpy(dtype=float)
+    lons = df_resultado["lon"].to_numpy(dtype=float)
+    dist = df_resultado[DISTANCE_COLUMN].to_numpy(dtype=float) if DISTANCE_COLUMN in df_resultado.columns \
+        else np.full(n, np.nan)
+    anos = df_resultado["year"].to_numpy() if "year" in df_resultado.columns else None
+
+    evaluations = []
+    for i in range(n):
+        item = {
+            "lat": float(lats[i]),
+            "lon": float(lons[i]),
+            "distance": float(dist[i]),
+            "compounds": {
+                nome: {"value": float(codes[i, j]), "level": LEVELS[codes[i, j]]}
+                for j, (nome, _) in enumerate(compostos) if codes[i, j] >= 0
+            },
+            "overall_index": LEVELS[final[i]] if final[i] >= 0 else "Unknown",
+        }
+        if anos is not None:
+            item["year"] = int(anos[i])
+        evaluations.append(item)
+
+    return {
+        "query_coordinates": {"latitude": float(lat), "longitude": float(lon)},
+        "summary": _resumo(codes, final, compostos, n),
+        "evaluations": evaluations,
+    }
+
+
+def _resumo(codes, final, compostos, n) -> str:
+    validos = final[final >= 0]
+    if n == 0 or validos.size == 0:
+        return "No nearby records available for evaluation."
+    pior = LEVELS[int(validos.max())]
+    mais_proximo = LEVELS[int(final[0])] if final[0] >= 0 else "Unknown"
+    criticos = [nome for j, (nome, _) in enumerate(compostos) if codes[:, j].max() == validos.max()]
+    texto = f"{n} nearby records. Nearest point overall: {mais_proximo}. Worst overall level nearby: {pior}"
+    if criticos:
+        texto += f" (driven by {', '.join(criticos)})"
+    return texto + "."
+
+
+def gerar_json_avaliacao(lat, lon, df_resultado) -> str:
+    """Mesmo contrato de rag_geo.gerar_json_via_slm: retorna o JSON serializado."""
+    return json.dumps(avaliar_pontos(lat, lon, df_resultado), ensure_ascii=False, indent=2)
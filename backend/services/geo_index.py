@@ -0,0 +1,108 @@
+import numpy as np
+from scipy.spatial import cKDTree
+
+# ----------------------------------------
+# ÍNDICE GEOESPACIAL (GRANDE CÍRCULO)
+# ----------------------------------------
+# Pontos viram vetores unitários 3D: a distância euclidiana (corda) é monotônica com a
+# distância de grande círculo, então o kNN da k-d tree é exato em qualquer latitude e
+# através do antimeridiano. A corda é convertida de volta para km.
+EARTH_RADIUS_KM = 6371.0088
+
+
+def to_unit_vectors(lat, lon) -> np.ndarray:
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lon = np.radians(np.asarray(lon, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def chord_to_km(chord) -> np.ndarray:
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord) / 2.0, 0.0, 1.0))
+
+
+def km_to_chord(km: float) -> float:
+    return 2.0 * np.sin(min(km / EARTH_RADIUS_KM, np.pi) / 2.0)
+
+
+def haversine_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class GeoIndex:
+    """
+    kNN e busca por raio em km sobre coordenadas (lat, lon) em graus, com busca
+    sublinear (k-d tree sobre vetores unitários).
+    """
+
+    def __init__(self, lat, lon, leafsize: int = 32):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self.tree = cKDTree(to_unit_vectors(self.lat, self.lon), leafsize=leafsize,
+                            balanced_tree=False, compact_nodes=True)
+
+    def __len__(self):
+        return self.tree.n
+
+    def query(self, lat, lon, k: int = 10):
+        """
+        (distâncias_km, índices) dos k vizinhos mais próximos, em ordem crescente.
+        Escalar → arrays (k,); arrays de n coordenadas → matrizes (n, k).
+        """
+        k = max(min(int(k), len(self)), 1)
+        chord, idx = self.tree.query(to_unit_vectors(lat, lon), k=k)
+        if k == 1:
+            chord, idx = np.asarray(chord)[..., np.newaxis], np.asarray(idx)[..., np.newaxis]
+        return chord_to_km(chord), idx
+
+    def query_radius(self, lat: float, lon: float, radius_km: float, sort: bool = True):
+        """(distâncias_km, índices) de todos os pontos a até `radius_km` de (lat, lon)."""
+        centro = to_unit_vectors(lat, lon)
+        idx = np.asarray(self.tree.query_ball_point(centro, r=km_to_chord(radius_km)), dtype=np.int64)
+        dist = chord_to_km(np.linalg.norm(self.tree.data[idx] - centro, axis=1)) if idx.size else np.empty(0)
+        if sort and idx.size:
+            ordem = np.argsort(dist, kind="stable")
+            dist, idx = dist[ordem], idx[ordem]
+        return dist, idx
+
+
+class PartitionedGeoIndex:
+    """
+    Um GeoIndex por chave (ex.: ano do cenário). A busca percorre só a partição pedida,
+    então os vizinhos são células distintas daquele ano em vez de repetições da mesma
+    célula em anos diferentes. Índices retornados são posições nas linhas originais.
+    """
+
+    def __init__(self, lat, lon, keys, leafsize: int = 32):
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        keys = np.asarray(keys)
+        self.partitions = {}
+        for key in np.unique(keys):
+            rows = np.flatnonzero(keys == key)
+            self.partitions[key.item()] = (GeoIndex(lat[rows], lon[rows], leafsize=leafsize), rows)
+
+    def __len__(self):
+        return sum(len(index) for index, _ in self.partitions.values())
+
+    @property
+    def keys(self) -> list:
+        return sorted(self.partitions)
+
+    def partition(self, key):
+        try:
+            return self.partitions[key]
+        except KeyError:
+            raise KeyError(f"Partição inexistente: {key!r} (disponíveis: {self.keys})") from None
+
+    def query(self, lat, lon, k: int = 10, key=None):
+        index, rows = self.partition(key)
+        dist, idx = index.query(lat, lon, k=k)
+        return dist, rows[idx]
+
+    def query_radius(self, lat: float, lon: float, radius_km: float, key=None, sort: bool = True):
+        index, rows = self.partition(key)
+        dist, idx = index.query_radius(lat, lon, radius_km, sort=sort)
+        return dist, rows[idx]
@@ -0,0 +1,80 @@
+import numpy as np
+
+from services.avaliacao import FINAL_COLUMN, LABEL_COLUMNS, LEVELS, _level_codes
+
+# ----------------------------------------
+# RASTER DE RÓTULOS (GRADE 1°×1°)
+# ----------------------------------------
+# O tempo.csv é uma grade regular de 1° (lon/lat = canto inferior esquerdo da célula,
+# como no formato SRES lido por fuzzy_logic.parse_sres_file). Os rótulos viram um array
+# denso int8 [ano, 180, 360, coluna] com o código ordinal do nível (-1 = sem dado):
+# consultar um ponto, um lote de pontos ou um anel k ao redor é indexação direta.
+# O array é gravado/aberto (mmap) junto com os demais artefatos por services.geo_store.
+N_LAT = 180
+N_LON = 360
+MISSING = -1
+COLUMNS = list(LABEL_COLUMNS.values()) + [FINAL_COLUMN]
+
+
+def cell_index(lat, lon):
+    """(linha, coluna) da célula de 1° que contém (lat, lon); longitude com volta no antimeridiano."""
+    lat = np.asarray(lat, dtype=np.float64)
+    lon = np.asarray(lon, dtype=np.float64)
+    rows = np.clip(np.floor(lat).astype(np.int64) + 90, 0, N_LAT - 1)
+    cols = (np.floor(lon).astype(np.int64) + 180) % N_LON
+    return rows, cols
+
+
+class LabelRaster:
+    """Rótulos por (ano, célula). `codes` pode ser um memmap somente leitura."""
+
+    def __init__(self, codes: np.ndarray, years, columns=COLUMNS):
+        self.codes = codes
+        self.years = [int(y) for y in years]
+        self.columns = list(columns)
+        self._year_pos = {y: i for i, y in enumerate(self.years)}
+
+    @classmethod
+    def from_frame(cls, df):
+        years = sorted(int(y) for y in df["year"].unique())
+        codes = np.full((len(years), N_LAT, N_LON, len(COLUMNS)), MISSING, dtype=np.int8)
+        pos = {y: i for i, y in enumerate(years)}
+        y = np.fromiter((pos[int(v)] for v in df["year"].to_numpy()), dtype=np.int64, count=len(df))
+        rows, cols = cell_index(df["lat"].to_numpy(), df["lon"].to_numpy())
+        for j, col in enumerate(COLUMNS):
+            if col in df.columns:
+                codes[y, rows, cols, j] = _level_codes(df[col].to_numpy())
+        return cls(codes, years)
+
+    @property
+    def keys(self) -> list:
+        return list(self.years)
+
+    def year_index(self, year) -> int:
+        try:
+            return self._year_pos[int(year)]
+        except KeyError:
+            raise KeyError(f"Ano inexistente no raster: {year!r} (disponíveis: {self.years})") from None
+
+    def lookup(self, lat, lon, year) -> np.ndarray:
+        """Códigos das colunas na célula de cada ponto: (n_colunas,) para escalar, (n, n_colunas) para lotes."""
+        rows, cols = cell_index(lat, lon)
+        return np.asarray(self.codes[self.year_index(year), rows, cols])
+
+    def kring(self, lat: float, lon: float, year, k: int = 1):
+        """
+        Vizinhança (2k+1)×(2k+1) centrada na célula de (lat, lon):
+        (códigos [2k+1, 2k+1, n_colunas], lat_ll [2k+1], lon_ll [2k+1]). Linhas além dos polos ficam MISSING.
+        """
+        row, col = (int(v) for v in cell_index(lat, lon))
+        offsets = np.arange(-k, k + 1)
+        rows = row + offsets
+        cols = (col + offsets) % N_LON
+        validas = (rows >= 0) & (rows < N_LAT)
+        bloco = np.full((offsets.size, offsets.size, len(self.columns)), MISSING, dtype=np.int8)
+        bloco[validas] = self.codes[self.year_index(year)][rows[validas][:, None], cols[None, :]]
+        return bloco, (rows - 90).astype(np.float64), (cols - 180).astype(np.float64)
+
+    def levels(self, codes) -> dict:
+        """Códigos de uma célula → {coluna: nível} (colunas sem dado são omitidas)."""
+        return {col: LEVELS[int(c)] for col, c in zip(self.columns, codes) if c != MISSING}
@@ -0,0 +1,146 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from core.config import GEO_STORE_DIR
+from core.knowledge import registry
+from services.geo_index import PartitionedGeoIndex
+from services.geo_raster import LabelRaster
+from services.rag_geo import DATA_PATH, LAT_COL, LON_COL, YEAR_COL, colunas_geo
+from services.tempo_colunar import carregar_colunar, colunar_atualizado
+
+logger = logging.getLogger("air-api")
+
+# ----------------------------------------
+# ARTEFATOS GEO VERSIONADOS
+# ----------------------------------------
+# Cada versão do tempo.csv vira um diretório `<sha1 dos dados>-v<SCHEMA_VERSION>` com as
+# colunas de coordenadas e o raster de rótulos em .npy (abertos com mmap). O diretório é
+# montado num temporário e renomeado de uma vez: leitores nunca veem artefato parcial, e
+# dados regenerados pelo fuzzy_logic.py geram outra versão em vez de reaproveitar a antiga.
+# Incrementar SCHEMA_VERSION ao mudar o formato dos artefatos.
+SCHEMA_VERSION = "1"
+MANIFEST = "manifest.json"
+COORD_FILES = {LAT_COL: "lat.npy", LON_COL: "lon.npy", YEAR_COL: "year.npy"}
+RASTER_FILE = "labels.npy"
+BUILD_PREFIX = ".build-"
+BUILD_STALE_SECONDS = 3600
+
+
+class GeoDados:
+    """Dados geo de uma versão do tempo.csv: DataFrame (e suas colunas), índice kNN por ano e raster de rótulos."""
+
+    def __init__(self, df, index, raster, manifest: dict):
+        self.df = df
+        self.colunas = colunas_geo(df)
+        self.index = index
+        self.raster = raster
+        self.manifest = manifest
+
+    @property
+    def versao(self) -> str:
+        return self.manifest["sha1"]
+
+
+def _sha1(path: str) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def diretorio_versao(sha1: str) -> str:
+    return os.path.join(GEO_STORE_DIR, f"{sha1[:16]}-v{SCHEMA_VERSION}")
+
+
+def ler_manifest(diretorio: str):
+    try:
+        with open(os.path.join(diretorio, MANIFEST), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def construir_artefatos(df, sha1: str, source: str) -> str:
+    """Grava os artefatos da versão `sha1` (no-op se outro processo já os publicou)."""
+    destino = diretorio_versao(sha1)
+    if ler_manifest(destino) is not None:
+        return destino
+    os.makedirs(GEO_STORE_DIR, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=GEO_STORE_DIR, prefix=BUILD_PREFIX)
+    os.chmod(tmp, 0o755)  # mkdtemp cria com 0700
+    try:
+        np.save(os.path.join(tmp, COORD_FILES[LAT_COL]), df[LAT_COL].to_numpy(dtype=np.float64))
+        np.save(os.path.join(tmp, COORD_FILES[LON_COL]), df[LON_COL].to_numpy(dtype=np.float64))
+        np.save(os.path.join(tmp, COORD_FILES[YEAR_COL]), df[YEAR_COL].to_numpy(dtype=np.int16))
+        raster = LabelRaster.from_frame(df)
+        np.save(os.path.join(tmp, RASTER_FILE), raster.codes)
+        manifest = {
+            "schema": SCHEMA_VERSION,
+            "source": source,
+            "sha1": sha1,
+            "rows": len(df),
+            "years": raster.years,
+            "columns": raster.columns,
+            "created_at": datetime.utcnow().isoformat(),
+        }
+        # O manifest é o último arquivo: sua presença marca o diretório como completo
+        with open(os.path.join(tmp, MANIFEST), "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp, destino)
+        logger.info("🗺️ Artefatos geo gravados em %s (%s linhas)", destino, len(df))
+    except OSError:
+        # Corrida com outro processo: se ele publicou a mesma versão, a dele vale
+        shutil.rmtree(tmp, ignore_errors=True)
+        if ler_manifest(destino) is None:
+            raise
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return destino
+
+
+def limpar_versoes_antigas(manter: str):
+    """Remove versões anteriores e builds abandonados (builds em andamento de outros processos ficam)."""
+    if not os.path.isdir(GEO_STORE_DIR):
+        return
+    for nome in os.listdir(GEO_STORE_DIR):
+        caminho = os.path.join(GEO_STORE_DIR, nome)
+        if not os.path.isdir(caminho) or os.path.abspath(caminho) == os.path.abspath(manter):
+            continue
+        if nome.startswith(BUILD_PREFIX) and time.time() - os.path.getmtime(caminho) < BUILD_STALE_SECONDS:
+            continue
+        shutil.rmtree(caminho, ignore_errors=True)
+
+
+def carregar_geo(path: str) -> GeoDados:
+    """Abre (ou constrói) os artefatos da versão atual de `path` e monta índice e raster."""
+    sha1 = _sha1(path)
+    colunar = colunar_atualizado(path, sha1)
+    df = carregar_colunar(colunar) if colunar else pd.read_csv(path)
+    diretorio = construir_artefatos(df, sha1, os.path.basename(path))
+    manifest = ler_manifest(diretorio)
+    if manifest.get("schema") != SCHEMA_VERSION or manifest.get("sha1") != sha1:
+        raise RuntimeError(f"Artefatos geo inconsistentes em {diretorio}: {manifest}")
+    colunas = {col: np.load(os.path.join(diretorio, arquivo), mmap_mode="r") for col, arquivo in COORD_FILES.items()}
+    index = PartitionedGeoIndex(colunas[LAT_COL], colunas[LON_COL], colunas[YEAR_COL])
+    raster = LabelRaster(np.load(os.path.join(diretorio, RASTER_FILE), mmap_mode="r"),
+                         manifest["years"], manifest["columns"])
+    limpar_versoes_antigas(diretorio)
+    logger.info("🗺️ Dados geo carregados: versão %s, %s linhas, anos %s (%s)", sha1[:8], manifest["rows"],
+                manifest["years"], "colunar" if colunar else "csv")
+    return GeoDados(df, index, raster, manifest)
+
+
+registry.register("geo", DATA_PATH, carregar_geo)
+
+
+def dados_geo() -> GeoDados:
+    """Dados geo compartilhados pelo processo (API e orquestrador), recarregados se o tempo.csv mudar."""
+    return registry.get("geo")
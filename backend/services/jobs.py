@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+
+from core.config import JOBS_MAX_CONCURRENT, JOBS_HISTORY
+from core.database import db
+
+logger = logging.getLogger("air-api")
+
+JOBS_COLLECTION = "jobs"
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_SUCCEEDED = "succeeded"
+STATUS_FAILED = "failed"
+STATUS_CANCELLED = "cancelled"
+FINAL_STATUSES = {STATUS_SUCCEEDED, STATUS_FAILED, STATUS_CANCELLED}
+
+_jobs = OrderedDict()
+_tasks = {}
+_semaphore = None
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobProgress:
+    """
+    Estado e progresso de um job em background: contadores, tempo por etapa
+    e cancelamento cooperativo. O snapshot é persistido no MongoDB (se configurado).
+    """
+
+    PERSIST_INTERVAL = 1.0
+
+    def __init__(self, kind: str, params: dict = None, persistent: bool = True):
+        self.id = uuid.uuid4().hex
+        self.persistent = persistent
+        self.kind = kind
+        self.params = params or {}
+        self.status = STATUS_QUEUED
+        self.counters = {}
+        self.stages = {}
+        self.current_stage = None
+        self.result = None
+        self.error = None
+        self.cancel_requested = False
+        self.created_at = datetime.utcnow()
+        self.started_at = None
+        self.finished_at = None
+        self._last_persist = 0.0
+
+    def incr(self, counter: str, n: int = 1):
+        self.counters[counter] = self.counters.get(counter, 0) + n
+        self.persist()
+
+    @contextmanager
+    def stage(self, name: str):
+        self.raise_if_cancelled()
+        self.current_stage = name
+        entry = self.stages.setdefault(name, {"elapsed_seconds": 0.0})
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            entry["elapsed_seconds"] = round(entry["elapsed_seconds"] + time.perf_counter() - t0, 4)
+            self.current_stage = None
+            self.persist(force=True)
+
+    def raise_if_cancelled(self):
+        if not self.cancel_requested and self.persistent and db is not None:
+            # Cancelamento pode ter sido pedido por outra instância da API
+            try:
+                doc = db[JOBS_COLLECTION].find_one({"_id": self.id}, {"cancel_requested": 1})
+                self.cancel_requested = bool(doc and doc.get("cancel_requested"))
+            except Exception as e:
+                logger.debug("Falha ao consultar cancelamento do job %s: %s", self.id, e)
+        if self.cancel_requested:
+            raise JobCancelled(self.id)
+
+    def snapshot(self) -> dict:
+        now = self.finished_at or datetime.utcnow()
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "params": self.params,
+            "status": self.status,
+            "counters": dict(self.counters),
+            "stages": {k: dict(v) for k, v in self.stages.items()},
+            "current_stage": self.current_stage,
+            "cancel_requested": self.cancel_requested,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "elapsed_seconds": round((now - self.started_at).total_seconds(), 3) if self.started_at else 0.0,
+        }
+
+    def persist(self, force: bool = False):
+        if not self.persistent or db is None:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_persist < self.PERSIST_INTERVAL:
+            return
+        self._last_persist = now
+        snap = self.snapshot()
+        snap.pop("job_id")
+        snap.pop("cancel_requested")
+        try:
+            db[JOBS_COLLECTION].update_one({"_id": self.id}, {"$set": snap}, upsert=True)
+        except Exception as e:
+            logger.warning("Falha ao persistir job %s: %s", self.id, e)
+
+
+def _remember(job: JobProgress):
+    _jobs[job.id] = job
+    # Mantém apenas os jobs mais recentes em memória (os ativos nunca são descartados)
+    for job_id in list(_jobs):
+        if len(_jobs) <= JOBS_HISTORY:
+            break
+        if _jobs[job_id].status in FINAL_STATUSES:
+            del _jobs[job_id]
+
+
+async def _run(job: JobProgress, func, args, kwargs):
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(JOBS_MAX_CONCURRENT)
+    try:
+        async with _semaphore:
+            job.raise_if_cancelled()
+            job.status = STATUS_RUNNING
+            job.started_at = datetime.utcnow()
+            job.persist(force=True)
+            job.result = await func(*args, progress=job, **kwargs)
+            job.status = STATUS_SUCCEEDED
+    except (JobCancelled, asyncio.CancelledError):
+        job.status = STATUS_CANCELLED
+        logger.info("🛑 Job %s (%s) cancelado", job.id, job.kind)
+    except Exception as e:
+        job.status = STATUS_FAILED
+        job.error = str(e)
+        logger.exception("Job %s (%s) falhou: %s", job.id, job.kind, e)
+    finally:
+        job.finished_at = datetime.utcnow()
+        job.current_stage = None
+        job.persist(force=True)
+        _tasks.pop(job.id, None)
+
+
+def submit_job(kind: str, func, *args, params: dict = None, **kwargs) -> JobProgress:
+    """
+    Agenda `func(*args, progress=job, **kwargs)` em background e retorna o job imediatamente.
+    """
+    job = JobProgress(kind, params)
+    _remember(job)
+    job.persist(force=True)
+    _tasks[job.id] = asyncio.create_task(_run(job, func, args, kwargs))
+    logger.info("📥 Job %s (%s) enfileirado", job.id, kind)
+    return job
+
+
+def get_job(job_id: str):
+    job = _jobs.get(job_id)
+    if job is not None:
+        return job.snapshot()
+    if db is None:
+        return None
+    doc = db[JOBS_COLLECTION].find_one({"_id": job_id})
+    if doc is None:
+        return None
+    doc["job_id"] = doc.pop("_id")
+    return doc
+
+
+def cancel_job(job_id: str):
+    """Pede o cancelamento de um job. Retorna o snapshot atualizado ou None se não existir."""
+    job = _jobs.get(job_id)
+    if job is not None:
+        if job.status not in FINAL_STATUSES:
+            job.cancel_requested = True
+            task = _tasks.get(job_id)
+            if task is not None:
+                task.cancel()
+        return job.snapshot()
+
+    if db is None:
+        return None
+    # Job de outra instância: sinaliza via MongoDB (cancelamento cooperativo)
+    result = db[JOBS_COLLECTION].update_one(
+        {"_id": job_id, "status": {"$nin": list(FINAL_STATUSES)}},
+        {"$set": {"cancel_requested": True}},
+    )
+    if result.matched_count == 0 and db[JOBS_COLLECTION].count_documents({"_id": job_id}) == 0:
+        return None
+    return get_job(job_id)
@@ -0,0 +1,104 @@
+import numpy as np
+
+# ----------------------------------------
+# SKETCH DE QUANTIS (KLL)
+# ----------------------------------------
+# Resumo mergeável de um fluxo de valores em memória limitada (~3k itens): o nível h
+# guarda itens de peso 2^h e, ao passar da capacidade, é ordenado e compactado (metade
+# dos itens, em posições alternadas com deslocamento aleatório, sobe para o nível h+1).
+# Cada compactação no nível h muda o posto de qualquer valor em no máximo 2^h, então a
+# soma desses pesos é um limite garantido (não probabilístico) do erro de posto.
+# Usado pelo modo streaming do fuzzy_logic.py para estimar Q10–Q97 por gás.
+
+
+class KLLSketch:
+    """Quantis aproximados de um fluxo; `update` recebe lotes e `merge` junta sketches de partes do fluxo."""
+
+    def __init__(self, k: int = 2000, seed: int = 0):
+        if k < 8:
+            raise ValueError(f"k muito pequeno para o sketch: {k}")
+        self.k = k
+        self.levels = [np.empty(0)]
+        self.n = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self.compaction_error = 0  # soma dos pesos compactados = limite do erro de posto
+        self._rng = np.random.default_rng(seed)
+
+    def __len__(self) -> int:
+        return self.n
+
+    @property
+    def retained(self) -> int:
+        return sum(lvl.size for lvl in self.levels)
+
+    def _capacity(self, h: int) -> int:
+        return max(2, int(np.ceil(self.k * (2 / 3) ** (len(self.levels) - 1 - h))))
+
+    def _compress(self):
+        h = 0
+        while h < len(self.levels):
+            buf = self.levels[h]
+            if buf.size > self._capacity(h):
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                buf = np.sort(buf)
+                par = buf.size - buf.size % 2  # item ímpar que sobra fica no nível, sem erro
+                promovidos = buf[int(self._rng.integers(2)):par:2]
+                self.levels[h] = buf[par:]
+                self.levels[h + 1] = np.concatenate([self.levels[h + 1], promovidos])
+                self.compaction_error += 2 ** h
+            h += 1
+
+    def update(self, values):
+        v = np.asarray(values, dtype=np.float64).ravel()
+        if v.size == 0:
+            return self
+        self.n += v.size
+        self.min = min(self.min, float(v.min()))
+        self.max = max(self.max, float(v.max()))
+        self.levels[0] = np.concatenate([self.levels[0], v])
+        self._compress()
+        return self
+
+    def merge(self, other: "KLLSketch"):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for h, lvl in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], lvl])
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.compaction_error += other.compaction_error
+        self._compress()
+        return self
+
+    def quantile(self, q):
+        """Menor item retido cujo posto acumulado alcança q·n (q=0 e q=1 devolvem o mínimo/máximo exatos)."""
+        if self.n == 0:
+            raise ValueError("Sketch vazio")
+        q = np.asarray(q, dtype=np.float64)
+        itens = np.concatenate(self.levels)
+        pesos = np.concatenate([np.full(lvl.size, 2 ** h, dtype=np.int64) for h, lvl in enumerate(self.levels)])
+        ordem = np.argsort(itens, kind="stable")
+        acumulado = np.cumsum(pesos[ordem])
+        idx = np.minimum(np.searchsorted(acumulado, q * self.n, side="left"), itens.size - 1)
+        out = itens[ordem][idx]
+        out = np.where(q <= 0, self.min, np.where(q >= 1, self.max, out))
+        return float(out) if out.ndim == 0 else out
+
+    def rank_error(self) -> float:
+        """
+        Limite garantido do erro de posto normalizado (ε): o quantil devolvido para q tem posto
+        verdadeiro entre (q-ε)·n e (q+ε)·n. Inclui o peso do maior nível (granularidade da
+        busca) e 1 posto da interpolação linear de np.quantile.
+        """
+        if self.n == 0:
+            return 0.0
+        return (self.compaction_error + 2 ** (len(self.levels) - 1) + 1) / self.n
+
+    def quantile_bounds(self, q):
+        """(inferior, superior): faixa de valores que contém o quantil exato q, dado `rank_error`."""
+        eps = self.rank_error()
+        q = np.asarray(q, dtype=np.float64)
+        return self.quantile(np.clip(q - eps, 0.0, 1.0)), self.quantile(np.clip(q + eps, 0.0, 1.0))
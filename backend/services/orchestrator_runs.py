@@ -0,0 +1,292 @@
+import hashlib
+import json
+import logging
+import socket
+from datetime import datetime, timedelta
+
+from pymongo import ASCENDING, DESCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from core.config import RUN_STALE_SECONDS, SHARD_LEASE_SECONDS, CELL_RESOLUTION_DEG
+from core.utils import SHARD_SPACE, get_shard_hash
+
+logger = logging.getLogger("air-orchestrator")
+
+RUNS_COLLECTION = "orchestrator_runs"
+CHECKPOINTS_COLLECTION = "orchestrator_checkpoints"
+STATE_COLLECTION = "orchestrator_subscriber_state"
+
+MODE_FULL = "full"
+MODE_INCREMENTAL = "incremental"
+
+RUN_RUNNING = "running"
+RUN_COMPLETED = "completed"
+RUN_FAILED = "failed"
+RUN_INTERRUPTED = "interrupted"
+
+CK_DONE = "done"
+CK_FAILED = "failed"
+
+
+def _hash(obj) -> str:
+    return hashlib.sha1(json.dumps(obj, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def hash_preferencias(thresholds, profile) -> str:
+    """Impressão digital do que o assinante configurou (limiares + perfil)."""
+    return _hash({"thresholds": thresholds or {}, "profile": profile})
+
+
+def hash_snapshot_celula(cell: str, aqi, categoria) -> str:
+    """Impressão digital dos dados da célula usados na decisão de alerta."""
+    return _hash({"cell": cell, "aqi": aqi, "category": categoria})
+
+
+def ensure_indexes(db):
+    db[CHECKPOINTS_COLLECTION].create_index([("run_id", ASCENDING), ("subscriber_id", ASCENDING)], unique=True)
+    db[RUNS_COLLECTION].create_index([("status", ASCENDING), ("started_at", DESCENDING)])
+
+
+def criar_execucao(db, modo: str = MODE_FULL) -> dict:
+    """Registra uma nova execução e marca como interrompidas as execuções órfãs (sem heartbeat)."""
+    now = datetime.utcnow()
+    db[RUNS_COLLECTION].update_many(
+        {"status": RUN_RUNNING, "heartbeat_at": {"$lt": now - timedelta(seconds=RUN_STALE_SECONDS)}},
+        {"$set": {"status": RUN_INTERRUPTED, "finished_at": now}},
+    )
+    run = {
+        "status": RUN_RUNNING,
+        "mode": modo,
+        "host": socket.gethostname(),
+        "started_at": now,
+        "heartbeat_at": now,
+        "finished_at": None,
+        "resumed_at": [],
+        "stats": {},
+    }
+    run["_id"] = db[RUNS_COLLECTION].insert_one(run).inserted_id
+    return run
+
+
+def retomar_execucao(db):
+    """
+    Reabre a execução incompleta mais recente (interrompida, com falha ou órfã).
+    Retorna None se não houver nada para retomar.
+    """
+    now = datetime.utcnow()
+    run = db[RUNS_COLLECTION].find_one(
+        {"distributed": {"$ne": True}, "$or": [
+            {"status": {"$in": [RUN_INTERRUPTED, RUN_FAILED]}},
+            {"status": RUN_RUNNING, "heartbeat_at": {"$lt": now - timedelta(seconds=RUN_STALE_SECONDS)}},
+        ]},
+        sort=[("started_at", DESCENDING)],
+    )
+    if run is None:
+        return None
+    # Só retoma se não houver execução concluída mais recente
+    newer = db[RUNS_COLLECTION].find_one({"status": RUN_COMPLETED, "started_at": {"$gt": run["started_at"]}})
+    if newer is not None:
+        return None
+    db[RUNS_COLLECTION].update_one(
+        {"_id": run["_id"]},
+        {"$set": {"status": RUN_RUNNING, "heartbeat_at": now, "host": socket.gethostname()},
+         "$push": {"resumed_at": now}},
+    )
+    run["status"] = RUN_RUNNING
+    return run
+
+
+def heartbeat(db, run_id, stats: dict = None):
+    fields = {"heartbeat_at": datetime.utcnow()}
+    if stats is not None:
+        fields["stats"] = stats
+    db[RUNS_COLLECTION].update_one({"_id": run_id}, {"$set": fields})
+
+
+def finalizar_execucao(db, run_id, status: str, stats: dict, error: str = None):
+    db[RUNS_COLLECTION].update_one(
+        {"_id": run_id},
+        {"$set": {"status": status, "finished_at": datetime.utcnow(), "stats": stats, "error": error}},
+    )
+
+
+def concluidos(db, run_id, subscriber_ids) -> set:
+    """IDs (do lote) que já têm checkpoint concluído nesta execução."""
+    cursor = db[CHECKPOINTS_COLLECTION].find(
+        {"run_id": run_id, "subscriber_id": {"$in": list(subscriber_ids)}, "status": CK_DONE},
+        {"subscriber_id": 1},
+    )
+    return {doc["subscriber_id"] for doc in cursor}
+
+
+def estados(db, subscriber_ids) -> dict:
+    """Estado da última execução bem-sucedida por assinante (para o modo incremental)."""
+    cursor = db[STATE_COLLECTION].find({"_id": {"$in": list(subscriber_ids)}})
+    return {doc["_id"]: doc for doc in cursor}
+
+
+def registrar_checkpoints(db, run_id, itens):
+    """
+    Grava checkpoints em lote. `itens`: [(subscriber_id, status, detalhes, estado_ou_None)].
+    Quando concluído, o estado do assinante (hashes usados no modo incremental) também é salvo.
+    """
+    if not itens:
+        return
+    now = datetime.utcnow()
+    checkpoints = []
+    states = []
+    for subscriber_id, status, detalhes, estado in itens:
+        checkpoints.append(UpdateOne(
+            {"run_id": run_id, "subscriber_id": subscriber_id},
+            {"$set": {"status": status, "updated_at": now, **(detalhes or {})}},
+            upsert=True,
+        ))
+        if status == CK_DONE and estado is not None:
+            states.append(UpdateOne(
+                {"_id": subscriber_id},
+                {"$set": {**estado, "last_run_id": run_id, "updated_at": now}},
+                upsert=True,
+            ))
+    db[CHECKPOINTS_COLLECTION].bulk_write(checkpoints, ordered=False)
+    if states:
+        db[STATE_COLLECTION].bulk_write(states, ordered=False)
+
+
+# ----------------------------------------
+# EXECUÇÃO DISTRIBUÍDA (SHARDS)
+# ----------------------------------------
+SHARDS_COLLECTION = "orchestrator_shards"
+
+SHARD_PENDING = "pending"
+SHARD_LEASED = "leased"
+SHARD_DONE = "done"
+
+
+def garantir_shard_hash(db, batch: int = 1000) -> int:
+    """Preenche `shard_hash` nas inscrições antigas (ou calculadas com outra resolução de célula)."""
+    filtro = {"$or": [{"shard_hash": {"$exists": False}}, {"shard_res": {"$ne": CELL_RESOLUTION_DEG}}]}
+    total = 0
+    ops = []
+    for doc in db["subscriptions"].find(filtro, {"lat": 1, "lon": 1, "latitude": 1, "longitude": 1}):
+        lat = doc.get("lat") or doc.get("latitude")
+        lon = doc.get("lon") or doc.get("longitude")
+        if lat is None or lon is None:
+            continue
+        ops.append(UpdateOne({"_id": doc["_id"]},
+                             {"$set": {"shard_hash": get_shard_hash(lat, lon), "shard_res": CELL_RESOLUTION_DEG}}))
+        if len(ops) >= batch:
+            total += db["subscriptions"].bulk_write(ops, ordered=False).modified_count
+            ops = []
+    if ops:
+        total += db["subscriptions"].bulk_write(ops, ordered=False).modified_count
+    return total
+
+
+def faixas_shards(n: int):
+    passo = SHARD_SPACE / n
+    return [(int(round(i * passo)), int(round((i + 1) * passo))) for i in range(n)]
+
+
+def ingressar_execucao_distribuida(db, period_key: str, n_shards: int, modo: str = MODE_FULL) -> dict:
+    """
+    Cria (ou encontra) a execução do período e seus shards. Idempotente: todos os
+    workers do mesmo período chegam à mesma execução.
+    """
+    db[RUNS_COLLECTION].create_index("period_key", unique=True, sparse=True)
+    db[SHARDS_COLLECTION].create_index([("run_id", ASCENDING), ("status", ASCENDING)])
+    now = datetime.utcnow()
+    try:
+        db[RUNS_COLLECTION].update_one(
+            {"period_key": period_key},
+            {"$setOnInsert": {
+                "status": RUN_RUNNING,
+                "mode": modo,
+                "distributed": True,
+                "shards": n_shards,
+                "host": socket.gethostname(),
+                "started_at": now,
+                "heartbeat_at": now,
+                "finished_at": None,
+                "resumed_at": [],
+                "stats": {},
+            }},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        pass
+    run = db[RUNS_COLLECTION].find_one({"period_key": period_key})
+    if run["status"] == RUN_RUNNING:
+        for i, (lo, hi) in enumerate(faixas_shards(run["shards"])):
+            db[SHARDS_COLLECTION].update_one(
+                {"_id": f"{run['_id']}:{i}"},
+                {"$setOnInsert": {"run_id": run["_id"], "shard": i, "lo": lo, "hi": hi, "status": SHARD_PENDING,
+                                  "owner": None, "lease_expires_at": None, "attempts": 0, "stats": {}}},
+                upsert=True,
+            )
+    return run
+
+
+def reservar_shard(db, run_id, worker_id: str):
+    """Reserva um shard pendente ou cujo lease expirou (worker morto)."""
+    now = datetime.utcnow()
+    return db[SHARDS_COLLECTION].find_one_and_update(
+        {"run_id": run_id, "$or": [
+            {"status": SHARD_PENDING},
+            {"status": SHARD_LEASED, "lease_expires_at": {"$lte": now}},
+        ]},
+        {"$set": {"status": SHARD_LEASED, "owner": worker_id, "heartbeat_at": now,
+                  "lease_expires_at": now + timedelta(seconds=SHARD_LEASE_SECONDS)},
+         "$inc": {"attempts": 1}},
+        sort=[("shard", ASCENDING)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+def renovar_lease(db, shard, worker_id: str) -> bool:
+    """Heartbeat do shard (e da execução); False se o lease foi perdido para outro worker."""
+    now = datetime.utcnow()
+    result = db[SHARDS_COLLECTION].update_one(
+        {"_id": shard["_id"], "owner": worker_id, "status": SHARD_LEASED},
+        {"$set": {"heartbeat_at": now, "lease_expires_at": now + timedelta(seconds=SHARD_LEASE_SECONDS)}},
+    )
+    db[RUNS_COLLECTION].update_one({"_id": shard["run_id"]}, {"$set": {"heartbeat_at": now}})
+    return result.modified_count == 1
+
+
+def concluir_shard(db, shard_id, worker_id: str, stats: dict) -> bool:
+    result = db[SHARDS_COLLECTION].update_one(
+        {"_id": shard_id, "owner": worker_id, "status": SHARD_LEASED},
+        {"$set": {"status": SHARD_DONE, "finished_at": datetime.utcnow(), "stats": stats, "lease_expires_at": None}},
+    )
+    return result.modified_count == 1
+
+
+def liberar_shard(db, shard_id, worker_id: str, error: str = None):
+    """Devolve o shard para a fila (falha local); os checkpoints evitam reprocessamento."""
+    db[SHARDS_COLLECTION].update_one(
+        {"_id": shard_id, "owner": worker_id, "status": SHARD_LEASED},
+        {"$set": {"status": SHARD_PENDING, "owner": None, "lease_expires_at": None, "last_error": error}},
+    )
+
+
+def shards_restantes(db, run_id) -> int:
+    return db[SHARDS_COLLECTION].count_documents({"run_id": run_id, "status": {"$ne": SHARD_DONE}})
+
+
+def agregar_execucao(db, run_id) -> bool:
+    """
+    Consolida as estatísticas dos shards e conclui a execução. Só um worker vence a
+    transição running → completed, então a agregação acontece uma única vez.
+    """
+    if shards_restantes(db, run_id) > 0:
+        return False
+    totais = {}
+    for shard in db[SHARDS_COLLECTION].find({"run_id": run_id}, {"stats": 1}):
+        for k, v in (shard.get("stats") or {}).items():
+            if isinstance(v, (int, float)):
+                totais[k] = totais.get(k, 0) + v
+    result = db[RUNS_COLLECTION].update_one(
+        {"_id": run_id, "status": RUN_RUNNING},
+        {"$set": {"status": RUN_COMPLETED, "finished_at": datetime.utcnow(), "stats": totais}},
+    )
+    return result.modified_count == 1
@@ -0,0 +1,314 @@
+import asyncio
+import logging
+import random
+import socket
+import time
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument, ASCENDING
+from pymongo.errors import DuplicateKeyError
+
+from core.config import (
+    OUTBOX_WORKERS, OUTBOX_LEASE_SECONDS, OUTBOX_POLL_SECONDS, OUTBOX_MAX_ATTEMPTS,
+    OUTBOX_BACKOFF_BASE_SECONDS, OUTBOX_BACKOFF_MAX_SECONDS, OUTBOX_BUCKET_MINUTES,
+    ALERT_SUPPRESSION_MINUTES,
+)
+from core.database import db
+from core.email_utils import send_email
+
+logger = logging.getLogger("air-api")
+
+OUTBOX_COLLECTION = "alert_outbox"
+ALERT_STATE_COLLECTION = "alert_state"
+
+STATUS_PENDING = "pending"
+STATUS_PROCESSING = "processing"
+STATUS_SENT = "sent"
+STATUS_FAILED = "failed"
+STATUS_SUPPRESSED = "suppressed"
+
+_metrics = {
+    "enqueued": 0,
+    "duplicates": 0,
+    "claimed": 0,
+    "sent": 0,
+    "retried": 0,
+    "failed": 0,
+    "suppressed": 0,
+    "started_at": time.time(),
+}
+_workers = []
+_stop_event = None
+
+
+def _require_db():
+    if db is None:
+        raise RuntimeError("MongoDB não configurado")
+    return db
+
+
+def time_bucket(now: datetime = None, minutes: int = OUTBOX_BUCKET_MINUTES) -> int:
+    """Janela de tempo (inteiro) usada na chave de idempotência."""
+    now = now or datetime.utcnow()
+    return int(now.timestamp() // (minutes * 60))
+
+
+def dedupe_key(subscriber_id: str, cell: str, level: int, bucket: int) -> str:
+    return f"{subscriber_id}|{cell}|{level}|{bucket}"
+
+
+def ensure_outbox_indexes():
+    database = _require_db()
+    outbox = database[OUTBOX_COLLECTION]
+    outbox.create_index([("status", ASCENDING), ("available_at", ASCENDING)])
+    outbox.create_index([("status", ASCENDING), ("lease_expires_at", ASCENDING)])
+    outbox.create_index([("subscriber_id", ASCENDING), ("created_at", ASCENDING)])
+
+
+def enqueue_alert(subscriber_id: str, email: str, cell: str, level: int, subject: str, body: str,
+                  bucket: int = None) -> bool:
+    """
+    Enfileira um alerta de forma idempotente.
+    Retorna True se o job foi criado, False se já existia (mesmo assinante/célula/nível/janela).
+    """
+    database = _require_db()
+    now = datetime.utcnow()
+    bucket = time_bucket(now) if bucket is None else bucket
+    key = dedupe_key(subscriber_id, cell, level, bucket)
+    doc = {
+        "subscriber_id": subscriber_id,
+        "email": email,
+        "cell": cell,
+        "level": level,
+        "bucket": bucket,
+        "subject": subject,
+        "body": body,
+        "status": STATUS_PENDING,
+        "attempts": 0,
+        "available_at": now,
+        "created_at": now,
+        "updated_at": now,
+        "lease_owner": None,
+        "lease_expires_at": None,
+        "last_error": None,
+    }
+    try:
+        result = database[OUTBOX_COLLECTION].update_one({"_id": key}, {"$setOnInsert": doc}, upsert=True)
+    except DuplicateKeyError:
+        # Upsert concorrente com a mesma chave: o outro lado venceu
+        result = None
+
+    if result is not None and result.upserted_id is not None:
+        _metrics["enqueued"] += 1
+        return True
+    _metrics["duplicates"] += 1
+    return False
+
+
+def claim_job(worker_id: str):
+    """
+    Reserva (lease) o próximo job disponível, incluindo jobs com lease expirado
+    que ainda têm tentativas (o worker pode ter caído no meio do envio).
+    """
+    database = _require_db()
+    now = datetime.utcnow()
+    job = database[OUTBOX_COLLECTION].find_one_and_update(
+        {"$or": [
+            {"status": STATUS_PENDING, "available_at": {"$lte": now}},
+            {"status": STATUS_PROCESSING, "lease_expires_at": {"$lte": now},
+             "attempts": {"$lt": OUTBOX_MAX_ATTEMPTS}},
+        ]},
+        {
+            "$set": {
+                "status": STATUS_PROCESSING,
+                "lease_owner": worker_id,
+                "lease_expires_at": now + timedelta(seconds=OUTBOX_LEASE_SECONDS),
+                "claimed_at": now,
+                "updated_at": now,
+            },
+            "$inc": {"attempts": 1},
+        },
+        sort=[("available_at", ASCENDING)],
+        return_document=ReturnDocument.AFTER,
+    )
+    if job is not None:
+        _metrics["claimed"] += 1
+    return job
+
+
+def dead_letter_expired_leases(now: datetime = None) -> int:
+    """Descarta jobs com lease expirado que esgotaram as tentativas (claim_job não os pega mais)."""
+    database = _require_db()
+    now = now or datetime.utcnow()
+    result = database[OUTBOX_COLLECTION].update_many(
+        {"status": STATUS_PROCESSING, "lease_expires_at": {"$lte": now},
+         "attempts": {"$gte": OUTBOX_MAX_ATTEMPTS}},
+        {"$set": {"status": STATUS_FAILED, "lease_owner": None, "lease_expires_at": None,
+                  "last_error": "lease expirado após o limite de tentativas", "updated_at": now}},
+    )
+    if result.modified_count:
+        _metrics["failed"] += result.modified_count
+        logger.error("❌ %s alerta(s) descartado(s) por lease expirado após %s tentativas",
+                     result.modified_count, OUTBOX_MAX_ATTEMPTS)
+    return result.modified_count
+
+
+def is_suppressed(job, now: datetime = None) -> bool:
+    """
+    Janela de supressão com histerese: dentro da janela, só um nível
+    mais alto que o último enviado rompe o silêncio.
+    """
+    database = _require_db()
+    now = now or datetime.utcnow()
+    state = database[ALERT_STATE_COLLECTION].find_one({"_id": job["subscriber_id"]})
+    if not state or not state.get("last_sent_at"):
+        return False
+    within_window = now - state["last_sent_at"] < timedelta(minutes=ALERT_SUPPRESSION_MINUTES)
+    return within_window and job["level"] <= state.get("last_level", -1)
+
+
+def backoff_seconds(attempts: int) -> float:
+    delay = min(OUTBOX_BACKOFF_BASE_SECONDS * (2 ** max(attempts - 1, 0)), OUTBOX_BACKOFF_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def _finish(job, worker_id: str, fields: dict) -> bool:
+    """Atualiza o job apenas se o lease ainda pertence a este worker."""
+    database = _require_db()
+    fields = {**fields, "updated_at": datetime.utcnow(), "lease_owner": None, "lease_expires_at": None}
+    result = database[OUTBOX_COLLECTION].update_one(
+        {"_id": job["_id"], "lease_owner": worker_id, "status": STATUS_PROCESSING},
+        {"$set": fields},
+    )
+    return result.modified_count == 1
+
+
+def _lease_perdido(job, worker_id: str) -> None:
+    logger.warning("⚠️ Worker %s perdeu o lease do alerta %s (tentativa %s); resultado descartado",
+                   worker_id, job["_id"], job["attempts"])
+    return None
+
+
+def process_job(job, worker_id: str):
+    """
+    Envia um job reservado e registra o resultado. Retorna o status final, ou None se o
+    lease foi perdido (outro worker reservou o job) e nada foi registrado.
+    """
+    database = _require_db()
+    now = datetime.utcnow()
+
+    if is_suppressed(job, now):
+        if not _finish(job, worker_id, {"status": STATUS_SUPPRESSED}):
+            return _lease_perdido(job, worker_id)
+        _metrics["suppressed"] += 1
+        logger.info("🔕 Alerta suprimido para %s (nível %s)", job["email"], job["level"])
+        return STATUS_SUPPRESSED
+
+    try:
+        send_email(job["subject"], job["body"], job["email"])
+    except Exception as e:
+        if job["attempts"] >= OUTBOX_MAX_ATTEMPTS:
+            if not _finish(job, worker_id, {"status": STATUS_FAILED, "last_error": str(e)}):
+                return _lease_perdido(job, worker_id)
+            _metrics["failed"] += 1
+            logger.error("❌ Alerta para %s descartado após %s tentativas: %s", job["email"], job["attempts"], e)
+            return STATUS_FAILED
+        retry_at = now + timedelta(seconds=backoff_seconds(job["attempts"]))
+        if not _finish(job, worker_id, {"status": STATUS_PENDING, "available_at": retry_at, "last_error": str(e)}):
+            return _lease_perdido(job, worker_id)
+        _metrics["retried"] += 1
+        logger.warning("Falha ao enviar alerta para %s (tentativa %s): %s", job["email"], job["attempts"], e)
+        return STATUS_PENDING
+
+    sent_at = datetime.utcnow()
+    if not _finish(job, worker_id, {"status": STATUS_SENT, "sent_at": sent_at, "last_error": None}):
+        # Outro worker reservou o job: o estado de histerese é dele
+        return _lease_perdido(job, worker_id)
+    database[ALERT_STATE_COLLECTION].update_one(
+        {"_id": job["subscriber_id"]},
+        {"$set": {"last_level": job["level"], "last_sent_at": sent_at, "last_cell": job["cell"]}},
+        upsert=True,
+    )
+    _metrics["sent"] += 1
+    logger.info("✅ Alerta enviado para %s", job["email"])
+    return STATUS_SENT
+
+
+async def run_outbox_worker(worker_id: str, stop_event: asyncio.Event):
+    """Loop de um worker: reserva jobs e envia; dorme quando a fila está vazia."""
+    logger.info("📬 Worker de outbox %s iniciado", worker_id)
+    while not stop_event.is_set():
+        try:
+            job = await asyncio.to_thread(claim_job, worker_id)
+            if job is not None:
+                await asyncio.to_thread(process_job, job, worker_id)
+                continue
+            # Fila vazia: aproveita para mover ao dead-letter os jobs travados sem tentativas
+            await asyncio.to_thread(dead_letter_expired_leases)
+        except Exception as e:
+            logger.exception("Erro no worker de outbox %s: %s", worker_id, e)
+        try:
+            await asyncio.wait_for(stop_event.wait(), timeout=OUTBOX_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+    logger.info("📭 Worker de outbox %s finalizado", worker_id)
+
+
+def start_outbox_workers(n: int = OUTBOX_WORKERS):
+    """Inicia N workers no event loop atual (ex.: no startup do FastAPI)."""
+    global _stop_event
+    if db is None:
+        logger.warning("⚠️ Outbox desativado - MongoDB não configurado")
+        return []
+    try:
+        ensure_outbox_indexes()
+    except Exception as e:
+        logger.warning("⚠️ Não foi possível criar índices do outbox: %s", e)
+    _stop_event = asyncio.Event()
+    host = socket.gethostname()
+    for i in range(n):
+        worker_id = f"{host}-{id(_stop_event):x}-{i}"
+        _workers.append(asyncio.create_task(run_outbox_worker(worker_id, _stop_event)))
+    return _workers
+
+
+async def stop_outbox_workers():
+    if _stop_event is not None:
+        _stop_event.set()
+    if _workers:
+        await asyncio.gather(*_workers, return_exceptions=True)
+        _workers.clear()
+
+
+def outbox_metrics() -> dict:
+    """Contagem por status, lag da fila e throughput deste processo."""
+    database = _require_db()
+    now = datetime.utcnow()
+    outbox = database[OUTBOX_COLLECTION]
+
+    by_status = {row["_id"]: row["count"] for row in outbox.aggregate([
+        {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+    ])}
+
+    oldest_ready = outbox.find_one(
+        {"status": STATUS_PENDING, "available_at": {"$lte": now}},
+        sort=[("available_at", ASCENDING)],
+        projection={"available_at": 1, "created_at": 1},
+    )
+    queue_lag = (now - oldest_ready["created_at"]).total_seconds() if oldest_ready else 0.0
+
+    uptime = max(time.time() - _metrics["started_at"], 1e-9)
+    counters = {k: v for k, v in _metrics.items() if k != "started_at"}
+    return {
+        "queue": {
+            "by_status": by_status,
+            "ready": outbox.count_documents({"status": STATUS_PENDING, "available_at": {"$lte": now}}),
+            "lag_seconds": round(queue_lag, 3),
+        },
+        "process": {
+            **counters,
+            "workers": len(_workers),
+            "uptime_seconds": round(uptime, 1),
+            "sent_per_minute": round(_metrics["sent"] * 60.0 / uptime, 3),
+        },
+    }
@@ -1,57 +1,135 @@
-import os
 import json
+from datetime import datetime
 import numpy as np
 import pandas as pd
-import faiss
-from ollama import Client
+from core.config import GEO_YEAR
+from core.slm import get_slm_client
+from services.geo_index import PartitionedGeoIndex, haversine_km
+from services.geo_raster import COLUMNS, MISSING
+from services.avaliacao import LEVELS
+from services.tempo_colunar import carregar_colunar, colunar_atualizado
 
 # ----------------------------------------
 # CONFIG
 # ----------------------------------------
-client = Client()
-
 DATA_PATH = "./services/data/tempo.csv"  # seu CSV atual
-INDEX_PATH = "./services/storage_faiss/faiss_geo_index.bin"
-LAT_COL = "latitude"
-LON_COL = "longitude"
+LAT_COL = "lat"
+LON_COL = "lon"
+YEAR_COL = "year"
 JSON_MODEL = "qwen2.5:1.5b"
 
 # ----------------------------------------
-# CSV & FAISS
+# CSV & ÍNDICE GEOESPACIAL
 # ----------------------------------------
 def carregar_dados_csv():
-    print(f"[carregar_dados_csv] Lendo arquivo: {DATA_PATH}")
-    df = pd.read_csv(DATA_PATH)
+    # Cópia colunar gerada pelo fuzzy_logic.py (mmap, sem parse) quando corresponde ao CSV atual
+    colunar = colunar_atualizado(DATA_PATH)
+    if colunar:
+        print(f"[carregar_dados_csv] Abrindo dataset colunar: {colunar}")
+        df = carregar_colunar(colunar)
+    else:
+        print(f"[carregar_dados_csv] Lendo arquivo: {DATA_PATH}")
+        df = pd.read_csv(DATA_PATH)
     print(f"[carregar_dados_csv] Total de linhas: {len(df)}")
     return df
 
 def criar_index_geo(df):
-    print("[criar_index_geo] Criando índice FAISS geoespacial...")
-    coords = df[[LAT_COL, LON_COL]].to_numpy().astype("float32")
-    index = faiss.IndexFlatL2(2)
-    index.add(coords)
-    print(f"[criar_index_geo] Total de coordenadas indexadas: {index.ntotal}")
-    os.makedirs(os.path.dirname(INDEX_PATH), exist_ok=True)
-    faiss.write_index(index, INDEX_PATH)
+    # Uma partição por ano de cenário: cada ano repete as mesmas células
+    print("[criar_index_geo] Criando índice geoespacial por ano (k-d tree sobre vetores unitários)...")
+    index = PartitionedGeoIndex(df[LAT_COL].to_numpy(), df[LON_COL].to_numpy(), df[YEAR_COL].to_numpy())
+    print(f"[criar_index_geo] Total de coordenadas indexadas: {len(index)} (anos: {index.keys})")
     return index
 
 def carregar_ou_criar_index(df):
-    if os.path.exists(INDEX_PATH):
-        print(f"[carregar_ou_criar_index] Carregando índice existente: {INDEX_PATH}")
-        index = faiss.read_index(INDEX_PATH)
-    else:
-        index = criar_index_geo(df)
-    return index
+    # Construção em memória leva poucos milissegundos para o tempo.csv
+    return criar_index_geo(df)
+
+def ano_padrao(index):
+    """Ano usado quando a busca não especifica um: GEO_YEAR ou o mais recente até o ano corrente."""
+    if GEO_YEAR:
+        return int(GEO_YEAR)
+    passados = [ano for ano in index.keys if ano <= datetime.utcnow().year]
+    return max(passados) if passados else min(index.keys)
 
-def buscar_pontos_proximos(lat, lon, index, df, k=10):
-    print(f"[buscar_pontos_proximos] Buscando {k} pontos mais próximos de ({lat}, {lon})")
-    query = np.array([[lat, lon]], dtype="float32")
-    D, I = index.search(query, k)
-    resultados = df.iloc[I[0]].copy()
-    resultados["distancia"] = D[0]
+def buscar_pontos_proximos(lat, lon, index, df, k=10, year=None):
+    """
+    k células mais próximas (distintas) no ano `year`, por distância de grande círculo;
+    `distancia` em km. Sem `year`, usa ano_padrao(index).
+    """
+    year = ano_padrao(index) if year is None else int(year)
+    print(f"[buscar_pontos_proximos] Buscando {k} pontos mais próximos de ({lat}, {lon}) em {year}")
+    D, I = index.query(lat, lon, k=k, key=year)
+    resultados = df.iloc[I].copy()
+    resultados["distancia"] = D
     print(f"[buscar_pontos_proximos] {len(resultados)} pontos retornados.")
     return resultados
 
+class Vizinhos:
+    """
+    Resultado de uma busca em lote: matrizes (n, k) de distâncias (km) e de linhas do
+    tempo.csv. Os registros de cada consulta só são montados (a partir das colunas) quando pedidos.
+    """
+
+    def __init__(self, dist, linhas, colunas):
+        self.dist = dist
+        self.linhas = linhas
+        self.colunas = colunas
+
+    def __len__(self):
+        return self.linhas.shape[0]
+
+    def frame(self, i):
+        """Vizinhos da consulta `i` no formato de buscar_pontos_proximos."""
+        sel = self.linhas[i]
+        dados = {nome: valores[sel] for nome, valores in self.colunas.items()}
+        dados["distancia"] = self.dist[i]
+        return pd.DataFrame(dados)
+
+    def registros(self, i) -> list:
+        return self.frame(i).to_dict(orient="records")
+
+def colunas_geo(df) -> dict:
+    """Colunas do tempo.csv como arrays (sem cópia por consulta)."""
+    return {nome: df[nome].to_numpy() for nome in df.columns}
+
+def buscar_vizinhos_em_lote(lats, lons, index, colunas, k=10, year=None):
+    """Uma única busca vetorizada para n coordenadas (mesmo ano): retorna Vizinhos (n, k)."""
+    year = ano_padrao(index) if year is None else int(year)
+    lats = np.atleast_1d(np.asarray(lats, dtype=np.float64))
+    lons = np.atleast_1d(np.asarray(lons, dtype=np.float64))
+    D, I = index.query(lats, lons, k=k, key=year)
+    return Vizinhos(D, I, colunas)
+
+def buscar_pontos_no_raio(lat, lon, raio_km, index, df, year=None):
+    """Todas as células a até `raio_km` de (lat, lon) no ano `year`, da mais próxima à mais distante."""
+    year = ano_padrao(index) if year is None else int(year)
+    D, I = index.query_radius(lat, lon, raio_km, key=year)
+    resultados = df.iloc[I].copy()
+    resultados["distancia"] = D
+    return resultados
+
+_NIVEIS = np.array(LEVELS + [None], dtype=object)  # código -1 (MISSING) → None
+
+def buscar_celulas_raster(lat, lon, raster, year=None, anel=2, k=10):
+    """
+    Alternativa à busca kNN sobre a grade 1°: as k células com dado mais próximas dentro
+    do anel (2·anel+1)² ao redor de (lat, lon), no mesmo formato de buscar_pontos_proximos.
+    """
+    year = ano_padrao(raster) if year is None else int(year)
+    bloco, lats, lons = raster.kring(lat, lon, year, k=anel)
+    lat_ll = np.repeat(lats, lons.size)
+    lon_ll = np.tile(lons, lats.size)
+    codes = bloco.reshape(-1, len(raster.columns))
+    com_dado = codes[:, raster.columns.index(COLUMNS[-1])] != MISSING
+    lat_ll, lon_ll, codes = lat_ll[com_dado], lon_ll[com_dado], codes[com_dado]
+    dist = haversine_km(lat, lon, lat_ll, lon_ll)
+    ordem = np.argsort(dist, kind="stable")[:k]
+    colunas = {"lon": lon_ll[ordem], "lat": lat_ll[ordem], YEAR_COL: np.full(ordem.size, year)}
+    for j, col in enumerate(raster.columns):
+        colunas[col] = _NIVEIS[codes[ordem, j]]
+    colunas["distancia"] = dist[ordem]
+    return pd.DataFrame(colunas)
+
 # ----------------------------------------
 # Utilitários JSON
 # ----------------------------------------
@@ -71,16 +149,25 @@ def _parse_json_or_raise(s: str) -> dict:
     s = _strip_code_fences(s)
     return json.loads(s)
 
+def _resposta_json_valida(resp) -> bool:
+    # Só respostas com JSON válido ficam no cache do SLM (senão o retry seria pago para sempre)
+    try:
+        _parse_json_or_raise(resp["message"]["content"])
+        return True
+    except (KeyError, TypeError, ValueError):
+        return False
+
 # ----------------------------------------
 # Geração via SLM (FORÇANDO JSON)
 # ----------------------------------------
-def gerar_json_via_slm(lat, lon, df_resultado):
+def gerar_json_via_slm(lat, lon, df_resultado, deadline=None):
     """
     Forces the SLM to return valid JSON:
       - format="json"
       - system: respond only with JSON
       - temperature=0
       - validates/retries once if necessary
+    `deadline` (time.monotonic()) bounds both attempts, see SLMClient.chat.
     """
     dados_pontos = df_resultado.to_dict(orient="records")
 
@@ -131,7 +218,7 @@ traps = {
     )
 
     print("[gerar_json_via_slm] Attempt 1 with format=json...")
-    resp = client.chat(
+    resp = get_slm_client().chat(
         model=JSON_MODEL,
         messages=[
             {"role": "system", "content": system_msg},
@@ -139,6 +226,8 @@ traps = {
         ],
         options={"temperature": 0},
         format="json",
+        deadline=deadline,
+        validate=_resposta_json_valida,
     )
     raw = resp["message"]["content"]
 
@@ -148,7 +237,7 @@ traps = {
     except Exception:
         print("[gerar_json_via_slm] Attempt 1 failed. Retrying with stricter instructions (Attempt 2).")
         harder_user_prompt = user_prompt + "\n\nRETURN ONLY VALID JSON. NOTHING ELSE."
-        resp2 = client.chat(
+        resp2 = get_slm_client().chat(
             model=JSON_MODEL,
             messages=[
                 {"role": "system", "content": system_msg},
@@ -156,6 +245,8 @@ traps = {
             ],
             options={"temperature": 0},
             format="json",
+            deadline=deadline,
+            validate=_resposta_json_valida,
         )
         raw2 = resp2["message"]["content"]
         parsed2 = _parse_json_or_raise(raw2)
@@ -1,13 +1,18 @@
 import json
+import logging
 import pandas as pd
-from ollama import Client
+from core.config import REPORT_PROMPT_TOKEN_BUDGET
+from core.knowledge import registry
+from core.slm import get_slm_client, estimate_tokens
+from core.utils import get_aqi_category
+from services.avaliacao import LEVELS as NIVEIS
+
+logger = logging.getLogger("air-orchestrator")
 
 # ----------------------------------------
 # CONFIGURAÇÕES
 # ----------------------------------------
-client = Client()
-
-TEMPO_API_JSON = "./services/data/resultado_-23.5505_-46.6333.json"  # JSON completo do AQI
+TEMPO_API_JSON = "./fixtures/slm/resultado_-23.5505_-46.6333.json"  # JSON completo do AQI (saída gravada do SLM)
 CHEM_EFFECTS_CSV = "./services/data/chemical_effects.csv"            # CSV com compostos e efeitos
 AQI_ABOUT = "./services/data/about_aqi.txt"                          # Texto explicativo sobre AQI
 PROFILE = "gestante"                                        # pode ser "idoso", "criança", etc.
@@ -28,73 +33,261 @@ def carregar_txt(path):
     with open(path, "r", encoding="utf-8") as f:
         return f.read()
 
-def gerar_relatorio_amigavel(aqi_index, aqi_json, chem_effects, about_aqi_text, perfil):
+def carregar_txt_compacto(path):
+    return " ".join(carregar_txt(path).split())
+
+# Carregados uma vez por processo (já na forma usada no prompt) e recarregados se o arquivo mudar
+registry.register("chemical_effects", CHEM_EFFECTS_CSV, carregar_csv)
+registry.register("about_aqi", AQI_ABOUT, carregar_txt_compacto)
+
+def conhecimento():
+    """(tabela de efeitos, texto sobre AQI) do registro compartilhado."""
+    return registry.get("chemical_effects"), registry.get("about_aqi")
+
+# ----------------------------------------
+# PROMPT (compacto, prefixo estático primeiro)
+# ----------------------------------------
+SYSTEM_MSG = (
+    "You are an assistant specialized in environmental health. "
+    "Respond only with plain text in English, no JSON or code."
+)
+
+# Conteúdo estático vem primeiro: o Ollama reaproveita o KV cache do prefixo comum entre chamadas
+INSTRUCOES = """You are an environmental health specialist. Write a friendly, easy-to-read report in English to be sent by email to the user.
+Levels, ascending: Good < Moderate < USG < Unhealthy < Very Unhealthy < Hazardous. Each compound level is a fuzzy (trapezoidal) class over dataset quantiles q10/q35/q65/q85/q97.
+Task:
+1. Analyze the compounds and their levels near the user.
+2. Relate them to the health effects table.
+3. Use the AQI background to support your reasoning.
+4. Describe clearly what this air quality could cause to a person with the user's profile.
+5. No technical jargon: natural, empathetic and clear.
+6. Output plain text only, ready to send via email.
+Example tone: "Hello! The air quality in your area today is moderate, with elevated PM2.5 and CO levels. For pregnant individuals, this may cause mild respiratory discomfort and fatigue, so it's best to avoid prolonged outdoor activities.\""""
+
+# Compostos do tempo.csv → colunas equivalentes da tabela de efeitos
+COMPOSTOS_EFEITOS = {"NOX": "NO2", "NO2": "NO2", "O3": "O3", "SO2": "SO2", "PM2.5": "PM2.5", "PM25": "PM2.5"}
+# O AQI atual é calculado do PM2.5: a coluna dele sempre entra
+EFEITOS_SEMPRE = {"PM2.5"}
+MIN_PONTOS = 3
+
+
+def _get(d, *keys):
+    for k in keys:
+        if k in d:
+            return d[k]
+    return None
+
+
+def _avaliacoes(aqi_json):
+    # Aceita o esquema em inglês e as variantes em português já produzidas pelo SLM
+    if not isinstance(aqi_json, dict):
+        return None
+    avaliacoes = _get(aqi_json, "evaluations", "avaliacoes")
+    return avaliacoes if isinstance(avaliacoes, list) else None
+
+
+def compostos_presentes(aqi_json) -> set:
+    nomes = set()
+    for item in _avaliacoes(aqi_json) or []:
+        nomes.update(k.replace("_label", "") for k in (_get(item, "compounds", "compostos") or {}))
+    nomes.discard("final")
+    return nomes
+
+
+_efeitos_cache = {}
+
+
+def efeitos_compactos(chem_effects, compostos) -> str:
+    """Tabela de efeitos em linhas `a|b|c`, só com as colunas dos compostos presentes."""
+    if not chem_effects:
+        return ""
+    alvos = frozenset(EFEITOS_SEMPRE | {COMPOSTOS_EFEITOS[c.upper()] for c in compostos if c.upper() in COMPOSTOS_EFEITOS})
+    # A tabela do registro é o mesmo objeto até ser recarregada: a forma compacta é calculada uma vez
+    chave = (id(chem_effects), alvos)
+    memo = _efeitos_cache.get(chave)
+    if memo is not None and memo[0] is chem_effects:
+        return memo[1]
+    texto = _efeitos_compactos(chem_effects, alvos)
+    if len(_efeitos_cache) > 64:
+        _efeitos_cache.clear()
+    _efeitos_cache[chave] = (chem_effects, texto)
+    return texto
+
+
+def _efeitos_compactos(chem_effects, alvos) -> str:
+    colunas = list(chem_effects[0].keys())
+    manter = []
+    for col in colunas:
+        # Remove espaços invisíveis do cabeçalho (ex.: "PM2.5\u200b (24h)")
+        nome = col.replace("\u200b", "")
+        poluente = next((p for p in ("PM2.5", "O3", "NO2", "SO2") if nome.startswith(p)), None)
+        if poluente is None or poluente in alvos:
+            manter.append((col, " ".join(nome.split())))
+    linhas = ["|".join(nome for _, nome in manter)]
+    for row in chem_effects:
+        linhas.append("|".join(str(row.get(col, "")).replace("\u200b", "") for col, _ in manter))
+    return "\n".join(linhas)
+
+
+def avaliacoes_compactas(aqi_json, limite=None) -> str:
     """
-    Uses the SLM to generate a friendly English report text
-    describing the health risks based on AQI, compounds, and human profile.
+    Uma linha por ponto próximo: `lat,lon,dist_km[,anos]:overall;COMPOSTO=nível;...`.
+    Anos consecutivos do mesmo ponto com os mesmos níveis viram uma única linha.
     """
-    traps_text = """
-traps = {
-    "Good":          _mk_trap(minv, minv, q10, q10 + d),
-    "Moderate":      _mk_trap(q10 - d, q10, q35, q35 + d),
-    "USG":           _mk_trap(q35 - d, q35, q65, q65 + d),
-    "Unhealthy":     _mk_trap(q65 - d, q65, q85, q85 + d),
-    "Very Unhealthy":_mk_trap(q85 - d, q85, q97, q97 + d),
-    "Hazardous":     _mk_trap(q97 - d, q97, maxv, maxv)
-}
-"""
+    avaliacoes = _avaliacoes(aqi_json)
+    if avaliacoes is None:
+        return json.dumps(aqi_json, ensure_ascii=False, separators=(",", ":"))
+    linhas = []
+    resumo = _get(aqi_json, "summary", "resumo_geral")
+    if resumo:
+        linhas.append(f"summary: {resumo}")
+    grupos = []
+    for item in avaliacoes[:limite]:
+        niveis = []
+        for nome, valor in (_get(item, "compounds", "compostos") or {}).items():
+            nivel = _get(valor, "level", "nivel") if isinstance(valor, dict) else valor
+            niveis.append(f"{nome.replace('_label', '')}={nivel}")
+        ponto = f"{_get(item, 'lat')},{_get(item, 'lon')},{float(_get(item, 'distance', 'distancia') or 0):.1f}"
+        corpo = f"{_get(item, 'overall_index', 'indice_geral')};{';'.join(niveis)}"
+        if grupos and grupos[-1][0] == ponto and grupos[-1][2] == corpo:
+            grupos[-1][1].append(item.get("year"))
+        else:
+            grupos.append((ponto, [item.get("year")], corpo))
+    for ponto, anos, corpo in grupos:
+        anos = "/".join(str(a) for a in anos if a is not None)
+        linhas.append(f"{ponto}{',' + anos if anos else ''}:{corpo}")
+    return "\n".join(linhas)
 
-    prompt = f"""
-You are an environmental health specialist.
 
-Based on the information provided, write a **friendly and easy-to-read report in English**
-that can be **sent by email** to the user.
-
-AIR QUALITY INDEX (AQI) VALUE FOR THE EXACT LOCATION: {aqi_index}
-### Air quality data (AQI - full JSON):
-{json.dumps(aqi_json, ensure_ascii=False, indent=2)}
+def _montar(efeitos, about, avaliacoes, aqi_index, perfil) -> str:
+    return (
+        f"{INSTRUCOES}\n\n### About AQI\n{about}\n\n### Health effects (AQI category table)\n{efeitos}\n\n"
+        f"### Nearby points (lat,lon,distance_km[,year]:overall;compound=level)\n{avaliacoes}\n\n"
+        f"### Current AQI at the user's location\n{aqi_index}\n\n### User profile\n{perfil}\n"
+    )
 
-### Chemical effects data (CSV):
-{json.dumps(chem_effects, ensure_ascii=False, indent=2)}
 
-### About AQI:
-{about_aqi_text}
+def montar_prompt_relatorio(aqi_index, aqi_json, chem_effects, about_aqi_text, perfil,
+                            budget=REPORT_PROMPT_TOKEN_BUDGET):
+    """
+    Monta as mensagens do relatório respeitando o orçamento de tokens (estimado).
+    Para caber, descarta os pontos mais distantes (até MIN_PONTOS) e só então encurta o
+    texto sobre AQI — que faz parte do prefixo estático reaproveitado entre chamadas.
+    Retorna (messages, info).
+    """
+    efeitos = efeitos_compactos(chem_effects, compostos_presentes(aqi_json))
+    about = " ".join((about_aqi_text or "").split())
+    n_pontos = len(_avaliacoes(aqi_json) or [])
+    limite = n_pontos or None
 
-### User profile:
-{perfil}
+    def total(texto):
+        return estimate_tokens(SYSTEM_MSG) + estimate_tokens(texto)
 
-Use the TRAPS system to interpret each chemical compound level:
-{traps_text}
+    prompt = _montar(efeitos, about, avaliacoes_compactas(aqi_json, limite), aqi_index, perfil)
+    while total(prompt) > budget and limite and limite > MIN_PONTOS:
+        limite -= 1
+        prompt = _montar(efeitos, about, avaliacoes_compactas(aqi_json, limite), aqi_index, perfil)
+    excesso = total(prompt) - budget
+    if excesso > 0 and about:
+        # ~4 caracteres por token
+        about = about[:max(len(about) - excesso * 4, 0)].rsplit(" ", 1)[0] + "…"
+        prompt = _montar(efeitos, about, avaliacoes_compactas(aqi_json, limite), aqi_index, perfil)
 
-Your task:
-1. Analyze the AQI compounds and levels.
-2. Relate the compounds and concentrations to the effects listed in the CSV.
-3. Use the explanatory text about AQI to support your reasoning.
-4. Clearly describe what this air quality could cause to a person with this profile.
-5. Avoid technical jargon — the text should sound natural, empathetic, and clear.
-6. The output must be **plain text only**, ready to send via email.
+    info = {"prompt_tokens_est": total(prompt), "budget": budget, "points": limite or 0, "points_total": n_pontos}
+    if info["prompt_tokens_est"] > budget:
+        logger.warning("Prompt do relatório acima do orçamento: %s", info)
+    messages = [{"role": "system", "content": SYSTEM_MSG}, {"role": "user", "content": prompt}]
+    return messages, info
 
-Example tone:
-"Hello! The air quality in your area today is moderate, with elevated PM2.5 and CO levels. For pregnant individuals, this may cause mild respiratory discomfort and fatigue, so it’s best to avoid prolonged outdoor activities."
-"""
 
-    print("[gerar_relatorio_amigavel] Generating text via SLM...")
-    response = client.chat(
+def gerar_relatorio_amigavel(aqi_index, aqi_json, chem_effects, about_aqi_text, perfil, deadline=None):
+    """
+    Uses the SLM to generate a friendly English report text
+    describing the health risks based on AQI, compounds, and human profile.
+    `deadline` (time.monotonic()) caps the HTTP timeout to the time left.
+    """
+    messages, info = montar_prompt_relatorio(aqi_index, aqi_json, chem_effects, about_aqi_text, perfil)
+    logger.debug("Gerando relatório via SLM: %s", info)
+    response = get_slm_client().chat(
         model=SLM_MODEL,
-        messages=[
-            {
-                "role": "system",
-                "content": (
-                    "You are an assistant specialized in environmental health. "
-                    "Respond only with plain text in English, no JSON or code."
-                )
-            },
-            {"role": "user", "content": prompt}
-        ],
-        options={"temperature": 0.7}
+        messages=messages,
+        options={"temperature": 0.7},
+        # Geração com amostragem: não faz sentido servir do cache
+        cache=False,
+        deadline=deadline,
     )
     return response["message"]["content"]
 
+# ----------------------------------------
+# RELATÓRIO POR TEMPLATE (fallback determinístico, sem SLM)
+# ----------------------------------------
+NIVEL_TEXTO = {
+    "Good": "Air quality is satisfactory and poses little or no risk.",
+    "Moderate": "Air quality is acceptable, but unusually sensitive people may notice mild effects.",
+    "Unhealthy for Sensitive Groups": "People with heart or lung conditions, older adults, children and pregnant people may experience health effects.",
+    "Unhealthy": "Everyone may begin to experience health effects; sensitive groups may feel more serious effects.",
+    "Very Unhealthy": "This is a health alert: everyone may experience more serious health effects.",
+    "Hazardous": "This is a health emergency: the entire population is likely to be affected.",
+}
+CONSELHO_PERFIL = {
+    "gestante": "As a pregnant person, limit time outdoors, avoid strenuous activity and keep windows closed during peak pollution hours.",
+    "idoso": "Older adults should stay indoors when possible, keep any prescribed medication at hand and watch for shortness of breath or chest discomfort.",
+    "criança": "Children should avoid outdoor play and sports today; keep them indoors in well-ventilated, filtered spaces if possible.",
+    "asmatico": "If you have asthma, keep your reliever inhaler with you, avoid outdoor exertion and follow your action plan at the first symptoms.",
+    "asmático": "If you have asthma, keep your reliever inhaler with you, avoid outdoor exertion and follow your action plan at the first symptoms.",
+}
+CONSELHO_PADRAO = "Reduce prolonged or intense outdoor activity and consider wearing a well-fitted mask (N95/PFF2) if you need to be outside."
+
+
+def _linha_efeitos(chem_effects, aqi_index):
+    """Linha da tabela de efeitos cuja faixa de AQI contém o valor atual."""
+    for row in chem_effects or []:
+        for valor in row.values():
+            partes = str(valor).split("-")
+            if len(partes) == 2 and all(p.strip().isdigit() for p in partes):
+                if int(partes[0]) <= aqi_index <= int(partes[1]):
+                    return row
+                break
+    return None
+
+
+def poluente_dominante(aqi_json):
+    """Composto com o nível mais alto no ponto mais próximo (None se não houver avaliação)."""
+    avaliacoes = _avaliacoes(aqi_json) or []
+    if not avaliacoes:
+        return None
+    melhor, melhor_nivel = None, -1
+    for nome, valor in (_get(avaliacoes[0], "compounds", "compostos") or {}).items():
+        nivel = _get(valor, "level", "nivel") if isinstance(valor, dict) else valor
+        if nivel in NIVEIS and NIVEIS.index(nivel) > melhor_nivel and not nome.startswith("final"):
+            melhor, melhor_nivel = (nome.replace("_label", ""), nivel), NIVEIS.index(nivel)
+    return melhor
+
+
+def gerar_relatorio_template(aqi_index, aqi_json, chem_effects, perfil):
+    """Relatório em texto simples montado por template: categoria, poluente dominante, efeitos e perfil."""
+    categoria = get_aqi_category(aqi_index)
+    linhas = [
+        "Hello!",
+        "",
+        f"The air quality in your area is currently {categoria} (AQI {aqi_index}, driven by fine particles, PM2.5).",
+        NIVEL_TEXTO.get(categoria, ""),
+    ]
+    dominante = poluente_dominante(aqi_json)
+    if dominante:
+        linhas.append(f"Nearby emission records point to {dominante[0]} as the most critical compound ({dominante[1]} level).")
+    efeitos = _linha_efeitos(chem_effects, aqi_index)
+    if efeitos:
+        faixa_pm25 = next((v for k, v in efeitos.items() if k.replace("\u200b", "").startswith("PM2.5")), None)
+        referencia = next((v for v in efeitos.values() if "[" in str(v)), "")
+        if faixa_pm25:
+            linhas.append(f"This band corresponds to PM2.5 concentrations of {faixa_pm25} µg/m³ over 24 hours.")
+        if "[" in str(referencia):
+            linhas.append(f"Reference: {str(referencia)[str(referencia).index('['):]}")
+    linhas += ["", CONSELHO_PERFIL.get((perfil or "").lower(), CONSELHO_PADRAO), "", "Take care and stay safe!"]
+    return "\n".join(linhas)
+
+
 # ----------------------------------------
 # MAIN
 # ----------------------------------------
@@ -0,0 +1,122 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from datetime import datetime
+
+from pymongo import ASCENDING
+
+from core.config import REPORT_CACHE_TTL_HOURS
+from core.utils import get_aqi_level
+
+logger = logging.getLogger("air-orchestrator")
+
+REPORTS_COLLECTION = "report_cache"
+
+# Incrementar ao alterar os prompts de rag_geo/relatorio: invalida os relatórios já gerados
+PROMPT_VERSION = "4"
+
+# Origem do relatório entregue
+CAMINHO_SLM = "slm"
+CAMINHO_TEMPLATE = "template"
+CAMINHO_CACHE = "cache"
+
+
+def snapshot_dados(*paths, extra=None) -> str:
+    """Impressão digital dos arquivos de entrada do relatório (caminho, tamanho e mtime)."""
+    partes = [extra] if extra is not None else []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            partes.append([path, st.st_size, st.st_mtime_ns])
+        except OSError:
+            partes.append([path, None, None])
+    return hashlib.sha1(json.dumps(partes).encode("utf-8")).hexdigest()
+
+
+def chave_relatorio(cell: str, snapshot: str, aqi: int, profile: str, versao: str = PROMPT_VERSION) -> str:
+    # O texto cita o AQI exato ("Current AQI" no prompt e no template): a faixa não basta como chave
+    raw = json.dumps([cell, snapshot, get_aqi_level(aqi), round(aqi), profile, versao], ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def ensure_indexes(db):
+    db[REPORTS_COLLECTION].create_index(
+        [("created_at", ASCENDING)], expireAfterSeconds=REPORT_CACHE_TTL_HOURS * 3600
+    )
+
+
+def buscar(db, chave: str):
+    return db[REPORTS_COLLECTION].find_one({"_id": chave}, {"text": 1})
+
+
+def salvar(db, chave: str, texto: str, meta: dict):
+    db[REPORTS_COLLECTION].update_one(
+        {"_id": chave},
+        {"$set": {"text": texto, **meta, "prompt_version": PROMPT_VERSION, "created_at": datetime.utcnow()}},
+        upsert=True,
+    )
+
+
+class CacheRelatorios:
+    """
+    Memoização dos relatórios de uma execução: pedidos idênticos em voo são coalescidos
+    em uma única geração e o resultado é persistido no MongoDB para as próximas execuções.
+    """
+
+    def __init__(self, db, snapshot: str):
+        self.db = db
+        self.snapshot = snapshot
+        self._futuros = {}
+        self.stats = {"gerados": 0, "hits_mongo": 0, "coalescidos": 0, "falhas": 0}
+
+    async def obter(self, cell: str, aqi: int, profile: str, gerar):
+        """
+        Retorna (texto, caminho) do relatório da célula para esse AQI e perfil. `gerar` é uma corrotina chamada só no cache miss que
+        retorna (texto, caminho); só relatórios do SLM são persistidos (o template não).
+        """
+        chave = chave_relatorio(cell, self.snapshot, aqi, profile)
+        futuro = self._futuros.get(chave)
+        if futuro is not None:
+            self.stats["coalescidos"] += 1
+            return await asyncio.shield(futuro)
+
+        futuro = asyncio.get_running_loop().create_future()
+        # Evita "exception was never retrieved" quando ninguém mais aguarda a chave
+        futuro.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._futuros[chave] = futuro
+        try:
+            resultado = await self._carregar_ou_gerar(chave, cell, aqi, profile, gerar)
+        except BaseException as e:
+            # Falha não fica memoizada: o próximo pedido tenta gerar novamente
+            self._futuros.pop(chave, None)
+            self.stats["falhas"] += 1
+            if isinstance(e, asyncio.CancelledError):
+                futuro.cancel()
+            else:
+                futuro.set_exception(e)
+            raise
+        futuro.set_result(resultado)
+        return resultado
+
+    async def _carregar_ou_gerar(self, chave, cell, aqi, profile, gerar):
+        try:
+            doc = await asyncio.to_thread(buscar, self.db, chave)
+        except Exception as e:
+            logger.warning(f"Falha ao consultar cache de relatórios: {e}")
+            doc = None
+        if doc is not None:
+            self.stats["hits_mongo"] += 1
+            return doc["text"], CAMINHO_CACHE
+
+        texto, caminho = await gerar()
+        self.stats["gerados"] += 1
+        if caminho == CAMINHO_TEMPLATE:
+            return texto, caminho
+        try:
+            meta = {"cell": cell, "aqi": aqi, "aqi_band": get_aqi_level(aqi), "profile": profile, "snapshot": self.snapshot}
+            await asyncio.to_thread(salvar, self.db, chave, texto, meta)
+        except Exception as e:
+            logger.warning(f"Falha ao salvar relatório no cache: {e}")
+        return texto, caminho
@@ -0,0 +1,104 @@
+import asyncio
+import json
+import logging
+import time
+
+from fastapi import HTTPException
+
+from core.config import (
+    REPORT_STREAM_CONCURRENCY, REPORT_STREAM_MAX_QUEUE, REPORT_STREAM_QUEUE_TIMEOUT_SECONDS,
+    REPORT_STREAM_DEADLINE_SECONDS,
+)
+from core.meteomatics import fetch_meteomatics_points
+from core.slm import ConcurrencyLimiter, get_slm_client
+from core.utils import calculate_aqi_from_pm25, get_aqi_category
+from services.avaliacao import avaliar_pontos
+from services.geo_store import dados_geo
+from services.rag_geo import ano_padrao, buscar_pontos_proximos
+from services.relatorio import SLM_MODEL, conhecimento, montar_prompt_relatorio
+
+logger = logging.getLogger("air-api")
+
+# Protege o servidor do modelo: gerações simultâneas limitadas, fila curta, excedente rejeitado
+limiter = ConcurrencyLimiter(REPORT_STREAM_CONCURRENCY, REPORT_STREAM_MAX_QUEUE, REPORT_STREAM_QUEUE_TIMEOUT_SECONDS)
+
+
+async def current_aqi(lat: float, lon: float):
+    data = await fetch_meteomatics_points(["pm2p5:ugm3"], [(lat, lon)], hours=1)
+    pm25 = data["data"][0]["coordinates"][0]["dates"][0]["value"]
+    aqi = calculate_aqi_from_pm25(pm25)
+    return aqi, get_aqi_category(aqi)
+
+
+async def prepare_report(lat: float, lon: float, profile: str, year: int = None):
+    """AQI atual + pontos próximos (do ano `year`) avaliados + prompt compacto. Retorna (messages, meta)."""
+    # Compartilhado com o orquestrador; carregado uma vez por processo (e por versão do tempo.csv)
+    geo = await asyncio.to_thread(dados_geo)
+    if year is None:
+        year = ano_padrao(geo.index)
+    elif year not in geo.index.keys:
+        raise HTTPException(status_code=400, detail=f"Ano indisponível: {year} (disponíveis: {geo.index.keys})")
+
+    try:
+        aqi, category = await current_aqi(lat, lon)
+    except Exception as e:
+        logger.warning("Falha ao obter AQI para o relatório (%s, %s): %s", lat, lon, e)
+        raise HTTPException(status_code=502, detail=f"Erro ao buscar qualidade do ar: {e}")
+
+    df_resultado = await asyncio.to_thread(buscar_pontos_proximos, lat, lon, geo.index, geo.df, 10, year)
+    avaliacao = avaliar_pontos(lat, lon, df_resultado)
+    chem_effects, about = await asyncio.to_thread(conhecimento)
+    messages, info = montar_prompt_relatorio(aqi, avaliacao, chem_effects, about, profile)
+    meta = {
+        "lat": lat,
+        "lon": lon,
+        "profile": profile,
+        "year": year,
+        # Rótulos da própria célula 1° do ponto consultado (consulta direta no raster)
+        "local": geo.raster.levels(geo.raster.lookup(lat, lon, year)),
+        "data_version": geo.versao[:12],
+        "aqi": aqi,
+        "category": category,
+        "summary": avaliacao["summary"],
+        "prompt": info,
+    }
+    return messages, meta
+
+
+def sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def report_events(request, messages, meta, release):
+    """Eventos SSE: `meta`, vários `token` e por fim `done` (ou `error`). Para se o cliente desconectar."""
+    tokens = 0
+    try:
+        yield sse("meta", meta)
+        prazo = time.monotonic() + REPORT_STREAM_DEADLINE_SECONDS
+        chunks = get_slm_client().stream_chat(SLM_MODEL, messages, options={"temperature": 0.7}, deadline=prazo)
+        async for chunk in chunks:
+            if await request.is_disconnected():
+                logger.info("Cliente desconectou durante o relatório (%s tokens enviados)", tokens)
+                await chunks.aclose()
+                return
+            tokens += 1
+            yield sse("token", {"text": chunk})
+        yield sse("done", {"chunks": tokens})
+    except Exception as e:
+        logger.exception("Erro ao gerar relatório em streaming: %s", e)
+        yield sse("error", {"detail": str(e)})
+    finally:
+        release()
+
+
+def release_once():
+    """Liberação idempotente da vaga do limitador (generator e background task podem chamar)."""
+    released = False
+
+    def release():
+        nonlocal released
+        if not released:
+            released = True
+            limiter.release()
+
+    return release
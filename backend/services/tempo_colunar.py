@@ -0,0 +1,115 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from services.avaliacao import LEVELS, _level_codes
+
+# ----------------------------------------
+# FORMATO COLUNAR DO TEMPO.CSV
+# ----------------------------------------
+# Diretório `<nome>.cols/` ao lado do CSV: um .npy por coluna (coordenadas float32, ano
+# int16, rótulos como códigos int8 de LEVELS, -1 = ausente) e um manifest com o sha1 do
+# CSV de origem. Leitores abrem os .npy com mmap; os rótulos viram Categorical sobre os
+# próprios códigos. Se o manifest não bate com o CSV atual, o CSV continua sendo a fonte.
+FORMAT = "tempo-cols/1"
+MANIFEST = "manifest.json"
+DTYPES = {"lon": np.float32, "lat": np.float32, "year": np.int16}
+
+
+def caminho_colunar(csv_path) -> str:
+    return os.path.splitext(str(csv_path))[0] + ".cols"
+
+
+def sha1_arquivo(path) -> str:
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def salvar_colunar(df, destino, csv_sha1: str = None):
+    """Grava `df` no formato colunar em `destino` (montado num temporário e trocado de uma vez)."""
+    destino = str(destino)
+    pai = os.path.dirname(os.path.abspath(destino))
+    os.makedirs(pai, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=pai, prefix=".cols-")
+    os.chmod(tmp, 0o755)  # mkdtemp cria com 0700
+    try:
+        colunas = []
+        for nome in df.columns:
+            if nome in DTYPES:
+                valores = df[nome].to_numpy(dtype=DTYPES[nome])
+                tipo = "numeric"
+            else:
+                valores = _level_codes(df[nome].astype(object).to_numpy())
+                tipo = "label"
+            np.save(os.path.join(tmp, f"{nome}.npy"), valores)
+            colunas.append({"name": nome, "kind": tipo, "dtype": str(valores.dtype)})
+        manifest = {
+            "format": FORMAT,
+            "rows": len(df),
+            "columns": colunas,
+            "levels": LEVELS,
+            "csv_sha1": csv_sha1,
+            "created_at": datetime.utcnow().isoformat(),
+        }
+        with open(os.path.join(tmp, MANIFEST), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=1)
+        # Diretório não pode ser sobrescrito por os.replace: o antigo sai do caminho primeiro
+        antigo = None
+        if os.path.exists(destino):
+            antigo = tempfile.mkdtemp(dir=pai, prefix=".cols-old-")
+            os.replace(destino, os.path.join(antigo, "cols"))
+        os.replace(tmp, destino)
+        if antigo:
+            shutil.rmtree(antigo, ignore_errors=True)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return manifest
+
+
+def ler_manifest(diretorio):
+    try:
+        with open(os.path.join(str(diretorio), MANIFEST), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return manifest if manifest.get("format") == FORMAT else None
+
+
+def carregar_colunar(diretorio, mmap: bool = True) -> pd.DataFrame:
+    """DataFrame sobre os arrays mapeados (sem cópia das colunas numéricas nem dos códigos)."""
+    manifest = ler_manifest(diretorio)
+    if manifest is None:
+        raise FileNotFoundError(f"Dataset colunar ausente ou inválido: {diretorio}")
+    dados = {}
+    for coluna in manifest["columns"]:
+        valores = np.load(os.path.join(str(diretorio), f"{coluna['name']}.npy"), mmap_mode="r" if mmap else None)
+        if coluna["kind"] == "label":
+            valores = pd.Categorical.from_codes(valores, categories=manifest["levels"])
+        dados[coluna["name"]] = valores
+    return pd.DataFrame(dados, copy=False)
+
+
+def colunar_atualizado(csv_path, csv_sha1: str = None):
+    """Diretório colunar do CSV se existir e tiver sido gerado a partir do conteúdo atual dele."""
+    diretorio = caminho_colunar(csv_path)
+    manifest = ler_manifest(diretorio)
+    if manifest is None:
+        return None
+    if manifest.get("csv_sha1") != (csv_sha1 or sha1_arquivo(csv_path)):
+        return None
+    return diretorio
+
+
+if __name__ == "__main__":
+    # Converte um CSV existente: python -m services.tempo_colunar services/data/tempo.csv
+    for csv in sys.argv[1:] or ["./services/data/tempo.csv"]:
+        m = salvar_colunar(pd.read_csv(csv), caminho_colunar(csv), csv_sha1=sha1_arquivo(csv))
+        print(f"[OK] {caminho_colunar(csv)}: {m['rows']} linhas, {len(m['columns'])} colunas")
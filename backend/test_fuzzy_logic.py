@@ -0,0 +1,146 @@
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import fuzzy_logic as fl
+
+# Parser SRES (bloco vs regex, fallback, deduplicação, cache) e núcleo vetorizado da classificação
+DATA_ROOT = Path(fl.DEFAULT_DATA_ROOT)
+
+HEADER = """ GRIDDED EMISSIONS, 1 X 1 degree\r
+ Year: 2000\r
+ Gas: NOx\r
+ Units: MtN\r
+ - - - - - - - - - -\r
+"""
+
+
+def test_bloco_igual_regex():
+    for fp in fl.discover_files(DATA_ROOT)[:4]:
+        pd.testing.assert_frame_equal(fl.parse_sres_file(fp), fl.parse_sres_file(fp, bulk=False))
+
+
+def test_linhas_estranhas_usam_fallback(tmp_path):
+    fp = tmp_path / "grid.txt"
+    fp.write_text(HEADER + "-170, -20, 1.5e-3\r\n 10, 5, .25\r\n end of data\r\n 11, 5, 2\r\n")
+    df = fl.parse_sres_file(fp)
+    assert df[["lon", "lat", "value"]].to_numpy().tolist() == [[-170, -20, 1.5e-3], [10, 5, 0.25], [11, 5, 2]]
+    assert (df["year"] == 2000).all() and (df["gas"] == "NOx").all() and (df["unit_scale"] == 1e9).all()
+
+
+def test_descoberta_sem_duplicatas(tmp_path):
+    (tmp_path / "a.txt").write_text(HEADER + "1, 2, 3\n")
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "b.TXT").write_text(HEADER + "4, 5, 6\n")
+    os.symlink(tmp_path / "a.txt", tmp_path / "sub" / "link.txt")
+    files = fl.discover_files(tmp_path)
+    assert len(files) == 2 and len({f.resolve() for f in files}) == 2
+    assert len(fl.load_folder(tmp_path, workers=1)) == 2
+
+
+def _contar_parses(monkeypatch):
+    lidos = []
+    original = fl._parse_sres_arrays
+    monkeypatch.setattr(fl, "_parse_sres_arrays", lambda fp, bulk=True: lidos.append(Path(fp).name) or original(fp, bulk))
+    return lidos
+
+
+def test_cache_reparseia_so_alterados(tmp_path, monkeypatch):
+    dados, cache = tmp_path / "dados", tmp_path / "cache"
+    dados.mkdir()
+    (dados / "a.txt").write_text(HEADER + "1, 2, 3\n")
+    (dados / "b.txt").write_text(HEADER.replace("2000", "2010") + "4, 5, 6\n")
+    lidos = _contar_parses(monkeypatch)
+    frio = fl.load_folder(dados, workers=1, cache=cache)
+    assert sorted(lidos) == ["a.txt", "b.txt"]
+    lidos.clear()
+    pd.testing.assert_frame_equal(fl.load_folder(dados, workers=1, cache=cache), frio)
+    assert lidos == []
+    # Só o mtime mudou: o sha1 confirma o conteúdo e o arquivo não é reparseado
+    os.utime(dados / "a.txt", ns=(1, 1))
+    fl.load_folder(dados, workers=1, cache=cache)
+    assert lidos == []
+    (dados / "b.txt").write_text(HEADER.replace("2000", "2010") + "4, 5, 7\n")
+    quente = fl.load_folder(dados, workers=1, cache=cache)
+    assert lidos == ["b.txt"] and quente["value"].tolist() == [3, 7]
+
+
+def test_filtro_de_ano_pelo_cabecalho(tmp_path, monkeypatch):
+    for ano in (2000, 2010, 2020):
+        (tmp_path / f"{ano}.txt").write_text(HEADER.replace("2000", str(ano)) + "1, 2, 3\n")
+    lidos = _contar_parses(monkeypatch)
+    df = fl.load_folder(tmp_path, workers=1, min_year=2005, max_year=2030)
+    assert sorted(df["year"]) == [2010, 2020] and sorted(lidos) == ["2010.txt", "2020.txt"]
+    lidos.clear()
+    assert fl.load_folder(tmp_path, workers=1, year=2020)["year"].tolist() == [2020] and lidos == ["2020.txt"]
+
+
+def test_pool_igual_serial():
+    pd.testing.assert_frame_equal(fl.load_folder(DATA_ROOT, workers=2), fl.load_folder(DATA_ROOT, workers=1))
+
+
+def test_trapmf_igual_skfuzzy():
+    fuzz = pytest.importorskip("skfuzzy")
+    x = np.r_[np.linspace(-1, 6, 701), [0, 1, 2, 3, 4, 5, np.nan, np.inf, -np.inf]]
+    for abcd in ([0, 1, 3, 4], [0, 0, 3, 4], [0, 1, 4, 4], [1, 1, 1, 1], [0, 2, 2, 5], [0.1, 0.1 + 1e-12, 3, 3 + 1e-9]):
+        assert fl.trapmf(x, abcd).tobytes() == fuzz.trapmf(x, abcd).tobytes()
+    # Vários trapézios de uma vez: coluna j == trapmf com a linha j
+    traps = [[0, 1, 3, 4], [2, 3, 3, 5]]
+    mus = fl.trapmf(x, traps)
+    assert mus.shape == (len(x), 2) and all(mus[:, j].tobytes() == fl.trapmf(x, t).tobytes() for j, t in enumerate(traps))
+    with pytest.raises(ValueError):
+        fl.trapmf(x, [0, 2, 1, 3])
+
+
+def test_empate_vai_para_o_mais_severo():
+    mus = np.array([[0.0, 0.5, 0.5, 0.0], [1.0, 0.0, 0.0, 0.0], [0.2, 0.3, 0.0, 0.3 - 1e-13]])
+    assert fl.pick_class(mus).tolist() == [2, 0, 3]
+
+
+def test_classify_alinha_celulas_e_pior_classe():
+    df = pd.DataFrame({
+        "lon": [1.0, 0.0, 0.0, 1.0, 0.0], "lat": [0.0, 0.0, 0.0, 0.0, 0.0], "year": [2000, 2000, 2000, 2000, 2010],
+        "gas": ["CO", "CO", "NOx", "NOx", "NOx"], "dens_kgkm2": [5.0, 0.0, 5.0, 0.0, 2.5],
+    })
+    out = fl.classify(df)
+    assert list(out.columns) == ["lon", "lat", "year", "CO_label", "NOx_label", "final_label"]
+    assert out[["lon", "year"]].to_numpy().tolist() == [[0, 2000], [1, 2000], [0, 2010]]
+    assert pd.isna(out["CO_label"][2]) and out[["CO_label", "NOx_label"]].iloc[:2].notna().all().all()
+    for _, row in out.iterrows():
+        presentes = [row[c] for c in ("CO_label", "NOx_label") if isinstance(row[c], str)]
+        assert row["final_label"] == max(presentes, key=fl.SEVERITY.get)
+
+
+def test_streaming_aproxima_o_exato(tmp_path):
+    exato, stream = tmp_path / "exato.csv", tmp_path / "stream.csv"
+    fl.run(root=DATA_ROOT, out=exato, columnar=False, cache_dir=tmp_path / "cache")
+    sketches = fl.run_streaming(root=DATA_ROOT, out=stream, cache_dir=tmp_path / "cache")
+    a, b = pd.read_csv(exato), pd.read_csv(stream)
+    assert list(a.columns) == list(b.columns)
+    pd.testing.assert_frame_equal(a[["lon", "lat", "year"]], b[["lon", "lat", "year"]])
+    assert (a["final_label"] == b["final_label"]).mean() > 0.99
+    assert not (tmp_path / "stream.csv.part").exists()
+    # Quantis exatos de cada gás dentro da faixa reportada pelo sketch
+    df = fl.load_folder(DATA_ROOT, workers=1, cache=tmp_path / "cache")
+    for g, sk in sketches.items():
+        sel = df[df["gas"] == g]
+        area = fl.cell_area_km2(sel["lat"].to_numpy(), sel["lon"].to_numpy())
+        dens = sel["value"].to_numpy() * sel["unit_scale"].to_numpy() / np.where(area <= 0, 1e-9, area)
+        lo, hi = sk.quantile_bounds(fl.QUANTILES)
+        exatos = np.quantile(dens, fl.QUANTILES)
+        assert ((lo <= exatos) & (exatos <= hi)).all()
+
+
+def test_regenerado_igual_ao_commitado(tmp_path):
+    # tempo.csv regenerado do dataset é byte a byte o commitado (colunas na ordem de GASES)
+    from services.tempo_colunar import colunar_atualizado
+
+    commitado = Path(fl.SCRIPT_DIR) / "services" / "data" / "tempo.csv"
+    novo = tmp_path / "tempo.csv"
+    fl.run(root=DATA_ROOT, out=novo, columnar=False, cache_dir=tmp_path / "cache")
+    assert novo.read_bytes() == commitado.read_bytes()
+    # ... e o tempo.cols commitado continua carimbado com o hash desse conteúdo
+    assert colunar_atualizado(commitado) is not None
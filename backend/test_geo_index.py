@@ -0,0 +1,132 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from services import geo_store
+from services.avaliacao import LEVELS
+from services.geo_index import GeoIndex, PartitionedGeoIndex, haversine_km
+from services.geo_raster import MISSING, LabelRaster
+from services.rag_geo import (
+    buscar_celulas_raster, buscar_pontos_proximos, buscar_vizinhos_em_lote, colunas_geo, criar_index_geo,
+)
+
+# Busca de grande círculo: exatidão contra força bruta (haversine) e partições por ano do tempo.csv
+TEMPO_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "services", "data", "tempo.csv")
+K = 10
+
+
+def pontos_esfera(n, seed=0):
+    rng = np.random.default_rng(seed)
+    lat = np.degrees(np.arcsin(rng.uniform(-1, 1, n)))
+    lon = rng.uniform(-180, 180, n)
+    return lat, lon
+
+
+def test_knn_exato():
+    lat, lon = pontos_esfera(20000)
+    index = GeoIndex(lat, lon)
+    # Inclui polos e antimeridiano, onde a distância em graus erra
+    consultas = [(-23.55, -46.63), (89.9, 10.0), (-89.5, -170.0), (0.0, 179.99), (12.0, -179.99)]
+    for qlat, qlon in consultas:
+        dist, idx = index.query(qlat, qlon, k=K)
+        ref = haversine_km(qlat, qlon, lat, lon)
+        esperado = np.sort(ref)[:K]
+        assert np.allclose(dist, esperado, atol=1e-6)
+        assert np.allclose(ref[idx], dist, atol=1e-6)
+
+
+def test_raio():
+    lat, lon = pontos_esfera(20000, seed=1)
+    index = GeoIndex(lat, lon)
+    dist, idx = index.query_radius(-23.55, -46.63, 500.0)
+    ref = haversine_km(-23.55, -46.63, lat, lon)
+    assert set(idx.tolist()) == set(np.flatnonzero(ref <= 500.0).tolist())
+    assert np.all(np.diff(dist) >= 0)
+
+
+def test_particoes():
+    lat, lon = pontos_esfera(5000, seed=2)
+    anos = np.repeat([2000, 2010], [3000, 2000])
+    index = PartitionedGeoIndex(lat, lon, anos)
+    assert index.keys == [2000, 2010] and len(index) == 5000
+    _, idx = index.query(10.0, 20.0, k=K, key=2010)
+    assert np.all(anos[idx] == 2010)
+
+
+def test_celulas_distintas_por_ano():
+    df = pd.read_csv(TEMPO_CSV)
+    index = criar_index_geo(df)
+    for ano in index.keys:
+        resultado = buscar_pontos_proximos(-23.5505, -46.6333, index, df, k=K, year=ano)
+        assert len(resultado) == K
+        assert (resultado["year"] == ano).all()
+        assert len(resultado[["lat", "lon"]].drop_duplicates()) == K
+
+
+def test_lote_igual_a_consultas_individuais():
+    df = pd.read_csv(TEMPO_CSV)
+    index = criar_index_geo(df)
+    lat, lon = pontos_esfera(200, seed=3)
+    vizinhos = buscar_vizinhos_em_lote(lat, lon, index, colunas_geo(df), k=K, year=2010)
+    assert vizinhos.linhas.shape == (200, K) and vizinhos.dist.shape == (200, K)
+    for i in (0, 57, 199):
+        individual = buscar_pontos_proximos(lat[i], lon[i], index, df, k=K, year=2010).reset_index(drop=True)
+        pd.testing.assert_frame_equal(vizinhos.frame(i), individual)
+
+
+def test_artefatos_versionados(tmp_path, monkeypatch):
+    monkeypatch.setattr(geo_store, "GEO_STORE_DIR", str(tmp_path / "store"))
+    csv = tmp_path / "tempo.csv"
+    df = pd.read_csv(TEMPO_CSV)
+    df.to_csv(csv, index=False)
+    geo = geo_store.carregar_geo(str(csv))
+    assert isinstance(geo.raster.codes, np.memmap) and len(geo.index) == len(df)
+    primeira = geo_store.diretorio_versao(geo.versao)
+    # Dados regenerados: nova versão, a antiga é descartada e nada é reaproveitado
+    df.loc[0, "final_label"] = "Good"
+    df.to_csv(csv, index=False)
+    nova = geo_store.carregar_geo(str(csv))
+    assert nova.versao != geo.versao
+    assert os.listdir(tmp_path / "store") == [os.path.basename(geo_store.diretorio_versao(nova.versao))]
+    assert not os.path.exists(primeira)
+    assert nova.raster.levels(nova.raster.lookup(df.loc[0, "lat"] + 0.5, df.loc[0, "lon"] + 0.5,
+                                                 df.loc[0, "year"]))["final_label"] == "Good"
+
+
+def test_raster_paridade_com_csv(tmp_path, monkeypatch):
+    monkeypatch.setattr(geo_store, "GEO_STORE_DIR", str(tmp_path))
+    df = pd.read_csv(TEMPO_CSV)
+    raster = geo_store.carregar_geo(TEMPO_CSV).raster
+    assert raster.codes.shape == (len(raster.years), 180, 360, len(raster.columns))
+    for ano in raster.years:
+        linhas = df[df["year"] == ano]
+        # Um único acesso vetorizado para todas as células do ano (centro da célula)
+        codes = raster.lookup(linhas["lat"].to_numpy() + 0.5, linhas["lon"].to_numpy() + 0.5, ano)
+        for j, col in enumerate(raster.columns):
+            assert (np.array(LEVELS)[codes[:, j]] == linhas[col].to_numpy()).all()
+
+
+def test_raster_anel():
+    df = pd.read_csv(TEMPO_CSV)
+    raster = LabelRaster.from_frame(df)
+    # Antimeridiano: colunas dão a volta; polo: linhas inexistentes ficam sem dado
+    _, _, lons = raster.kring(0.0, 179.5, 2020, k=1)
+    assert lons.tolist() == [178.0, 179.0, -180.0]
+    bloco, lats, _ = raster.kring(89.5, 0.0, 2020, k=1)
+    assert lats.tolist() == [88.0, 89.0, 90.0] and (bloco[2] == MISSING).all()
+    # Na grade 1°, o anel 5×5 contém os 10 vizinhos do kNN
+    index = criar_index_geo(df)
+    anel = buscar_celulas_raster(-23.5505, -46.6333, raster, year=2020, k=K)
+    knn = buscar_pontos_proximos(-23.5505, -46.6333, index, df, k=K, year=2020)
+    assert anel[["lat", "lon", "final_label"]].values.tolist() == knn[["lat", "lon", "final_label"]].values.tolist()
+
+
+if __name__ == "__main__":
+    test_knn_exato()
+    test_raio()
+    test_particoes()
+    test_celulas_distintas_por_ano()
+    test_lote_igual_a_consultas_individuais()
+    test_raster_anel()
+    print("✅ Índice geoespacial OK")
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from services.kll import KLLSketch
+
+# Sketch KLL: exato enquanto cabe, erro de posto dentro do limite reportado e merge equivalente ao fluxo único
+Q = np.array([0.10, 0.35, 0.65, 0.85, 0.97])
+
+
+def _erro_posto(x, estimados):
+    ordenado = np.sort(x)
+    return np.abs(np.searchsorted(ordenado, estimados, side="right") / len(x) - Q).max()
+
+
+def test_exato_sem_compactacao():
+    x = np.random.default_rng(0).normal(size=500)
+    sk = KLLSketch(k=1000).update(x)
+    assert sk.compaction_error == 0 and sk.retained == 500
+    ordenado = np.sort(x)
+    assert sk.quantile(Q).tolist() == ordenado[np.ceil(Q * 500).astype(int) - 1].tolist()
+    assert sk.quantile(0) == x.min() and sk.quantile(1) == x.max()
+
+
+def test_erro_dentro_do_limite():
+    x = np.random.default_rng(1).lognormal(0, 2, 400_000)
+    sk = KLLSketch(k=500)
+    for lote in np.array_split(x, 37):
+        sk.update(lote)
+    assert sk.retained < 2_000 and sk.n == len(x)
+    assert _erro_posto(x, sk.quantile(Q)) <= sk.rank_error() < 0.05
+    lo, hi = sk.quantile_bounds(Q)
+    exatos = np.quantile(x, Q)
+    assert ((lo <= exatos) & (exatos <= hi)).all()
+
+
+def test_merge():
+    x = np.random.default_rng(2).normal(size=300_000)
+    partes = [KLLSketch(k=500, seed=i).update(p) for i, p in enumerate(np.array_split(x, 3))]
+    sk = partes[0].merge(partes[1]).merge(partes[2])
+    assert sk.n == len(x) and sk.min == x.min() and sk.max == x.max()
+    assert _erro_posto(x, sk.quantile(Q)) <= sk.rank_error()
+
+
+def test_vazio():
+    with pytest.raises(ValueError):
+        KLLSketch().quantile(0.5)
+
+
+if __name__ == "__main__":
+    test_exato_sem_compactacao()
+    test_erro_dentro_do_limite()
+    test_merge()
+    test_vazio()
+    print("✅ Sketch KLL OK")
@@ -0,0 +1,168 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+import services.outbox as outbox
+from core.config import (
+    OUTBOX_MAX_ATTEMPTS, OUTBOX_LEASE_SECONDS, OUTBOX_BACKOFF_BASE_SECONDS,
+    OUTBOX_BACKOFF_MAX_SECONDS, ALERT_SUPPRESSION_MINUTES,
+)
+
+# Outbox de alertas sobre um Mongo em memória (mongomock): lease, reclaim, histerese, backoff e dead-letter
+
+
+@pytest.fixture
+def db(monkeypatch):
+    database = mongomock.MongoClient().db
+    monkeypatch.setattr(outbox, "db", database)
+    return database
+
+
+def enfileirar(subscriber="s1", level=3, bucket=1):
+    return outbox.enqueue_alert(subscriber, f"{subscriber}@ex.com", "cell-1", level, "Alerta", "Corpo", bucket=bucket)
+
+
+def expirar_lease(db, **campos):
+    db[outbox.OUTBOX_COLLECTION].update_many(
+        {"status": outbox.STATUS_PROCESSING},
+        {"$set": {"lease_expires_at": datetime.utcnow() - timedelta(seconds=1), **campos}},
+    )
+
+
+def test_enqueue_idempotente(db):
+    assert enfileirar() is True
+    assert enfileirar() is False
+    assert enfileirar(bucket=2) is True
+    assert db[outbox.OUTBOX_COLLECTION].count_documents({}) == 2
+
+
+def test_claim_reserva_com_lease(db):
+    enfileirar()
+    job = outbox.claim_job("w1")
+    assert job["status"] == outbox.STATUS_PROCESSING
+    assert job["lease_owner"] == "w1"
+    assert job["attempts"] == 1
+    restante = (job["lease_expires_at"] - datetime.utcnow()).total_seconds()
+    assert OUTBOX_LEASE_SECONDS - 5 < restante <= OUTBOX_LEASE_SECONDS
+    # Lease válido: ninguém mais pega o job
+    assert outbox.claim_job("w2") is None
+
+
+def test_claim_respeita_available_at(db):
+    enfileirar()
+    db[outbox.OUTBOX_COLLECTION].update_many({}, {"$set": {"available_at": datetime.utcnow() + timedelta(minutes=5)}})
+    assert outbox.claim_job("w1") is None
+
+
+def test_reclaim_de_lease_expirado(db):
+    enfileirar()
+    outbox.claim_job("w1")
+    expirar_lease(db)
+    job = outbox.claim_job("w2")
+    assert job["lease_owner"] == "w2"
+    assert job["attempts"] == 2
+    # O worker antigo perdeu o lease: seu resultado não sobrescreve o job
+    assert outbox._finish(job, "w1", {"status": outbox.STATUS_SENT}) is False
+    assert db[outbox.OUTBOX_COLLECTION].find_one({"_id": job["_id"]})["status"] == outbox.STATUS_PROCESSING
+
+
+def test_lease_expirado_sem_tentativas_nao_volta(db):
+    enfileirar()
+    outbox.claim_job("w1")
+    expirar_lease(db, attempts=OUTBOX_MAX_ATTEMPTS)
+    assert outbox.claim_job("w2") is None
+
+    assert outbox.dead_letter_expired_leases() == 1
+    doc = db[outbox.OUTBOX_COLLECTION].find_one({})
+    assert doc["status"] == outbox.STATUS_FAILED
+    assert doc["lease_owner"] is None
+    assert outbox.dead_letter_expired_leases() == 0
+
+
+def test_supressao_com_histerese(db):
+    agora = datetime.utcnow()
+    db[outbox.ALERT_STATE_COLLECTION].insert_one({"_id": "s1", "last_level": 3, "last_sent_at": agora})
+    assert outbox.is_suppressed({"subscriber_id": "s1", "level": 2}, agora) is True
+    assert outbox.is_suppressed({"subscriber_id": "s1", "level": 3}, agora) is True
+    # Só um nível acima do último enviado rompe o silêncio
+    assert outbox.is_suppressed({"subscriber_id": "s1", "level": 4}, agora) is False
+    # Fora da janela, qualquer nível passa
+    depois = agora + timedelta(minutes=ALERT_SUPPRESSION_MINUTES, seconds=1)
+    assert outbox.is_suppressed({"subscriber_id": "s1", "level": 2}, depois) is False
+    # Sem histórico, nunca suprime
+    assert outbox.is_suppressed({"subscriber_id": "s2", "level": 1}, agora) is False
+
+
+def test_backoff_exponencial_com_teto(monkeypatch):
+    monkeypatch.setattr(outbox.random, "uniform", lambda a, b: 1.0)
+    assert outbox.backoff_seconds(0) == OUTBOX_BACKOFF_BASE_SECONDS
+    assert outbox.backoff_seconds(1) == OUTBOX_BACKOFF_BASE_SECONDS
+    assert outbox.backoff_seconds(3) == min(OUTBOX_BACKOFF_BASE_SECONDS * 4, OUTBOX_BACKOFF_MAX_SECONDS)
+    assert outbox.backoff_seconds(100) == OUTBOX_BACKOFF_MAX_SECONDS
+    # Jitter de ±20%
+    monkeypatch.undo()
+    for attempts in range(1, 10):
+        base = min(OUTBOX_BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), OUTBOX_BACKOFF_MAX_SECONDS)
+        assert 0.8 * base <= outbox.backoff_seconds(attempts) <= 1.2 * base
+
+
+def falha_envio(*args):
+    raise ConnectionError("smtp fora do ar")
+
+
+def test_falha_reagenda_e_depois_descarta(db, monkeypatch):
+    monkeypatch.setattr(outbox, "send_email", falha_envio)
+    enfileirar()
+    for tentativa in range(1, OUTBOX_MAX_ATTEMPTS + 1):
+        db[outbox.OUTBOX_COLLECTION].update_many({}, {"$set": {"available_at": datetime.utcnow()}})
+        job = outbox.claim_job("w1")
+        assert job["attempts"] == tentativa
+        status = outbox.process_job(job, "w1")
+        doc = db[outbox.OUTBOX_COLLECTION].find_one({})
+        assert doc["last_error"] == "smtp fora do ar"
+        if tentativa < OUTBOX_MAX_ATTEMPTS:
+            assert status == outbox.STATUS_PENDING
+            assert doc["available_at"] > datetime.utcnow()
+        else:
+            assert status == outbox.STATUS_FAILED
+            assert doc["status"] == outbox.STATUS_FAILED
+    assert outbox.claim_job("w1") is None
+
+
+def test_envio_registra_estado_e_suprime_repeticao(db, monkeypatch):
+    enviados = []
+    monkeypatch.setattr(outbox, "send_email", lambda subject, body, to: enviados.append(to))
+    enfileirar(level=3, bucket=1)
+    assert outbox.process_job(outbox.claim_job("w1"), "w1") == outbox.STATUS_SENT
+    assert db[outbox.ALERT_STATE_COLLECTION].find_one({"_id": "s1"})["last_level"] == 3
+
+    # Mesmo nível na próxima janela: suprimido, sem novo e-mail
+    enfileirar(level=3, bucket=2)
+    assert outbox.process_job(outbox.claim_job("w1"), "w1") == outbox.STATUS_SUPPRESSED
+    assert enviados == ["s1@ex.com"]
+
+
+def test_lease_perdido_nao_registra_nada(db, monkeypatch):
+    monkeypatch.setattr(outbox, "send_email", lambda subject, body, to: None)
+    enfileirar(level=4)
+    lento = outbox.claim_job("w1")
+    expirar_lease(db)
+    outbox.claim_job("w2")  # w1 travou além do lease; w2 reservou o job
+
+    antes = dict(outbox._metrics)
+    assert outbox.process_job(lento, "w1") is None
+    assert db[outbox.ALERT_STATE_COLLECTION].find_one({"_id": "s1"}) is None
+    assert outbox._metrics == antes
+    doc = db[outbox.OUTBOX_COLLECTION].find_one({})
+    assert doc["status"] == outbox.STATUS_PROCESSING and doc["lease_owner"] == "w2"
+
+    # O mesmo vale para falha de envio: w1 não reagenda o job de w2
+    monkeypatch.setattr(outbox, "send_email", falha_envio)
+    assert outbox.process_job(lento, "w1") is None
+    assert db[outbox.OUTBOX_COLLECTION].find_one({})["last_error"] is None
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
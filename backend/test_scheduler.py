@@ -0,0 +1,109 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from core.scheduler import AsyncScheduler, CronExpression
+
+# CronExpression.next_after: campos, passos, intervalos, regra OU dia-do-mês/dia-da-semana e viradas
+
+
+def proximo(expr, dt):
+    return CronExpression(expr).next_after(dt)
+
+
+def test_estritamente_depois():
+    # Exatamente no horário: a próxima ocorrência é a do dia seguinte
+    assert proximo("30 6 * * *", datetime(2024, 5, 10, 6, 30)) == datetime(2024, 5, 11, 6, 30)
+    assert proximo("30 6 * * *", datetime(2024, 5, 10, 6, 29, 59)) == datetime(2024, 5, 10, 6, 30)
+    assert proximo("* * * * *", datetime(2024, 5, 10, 6, 30, 15)) == datetime(2024, 5, 10, 6, 31)
+
+
+def test_passos_listas_e_intervalos():
+    assert proximo("*/15 * * * *", datetime(2024, 5, 10, 6, 31)) == datetime(2024, 5, 10, 6, 45)
+    assert proximo("0-30/10 * * * *", datetime(2024, 5, 10, 6, 31)) == datetime(2024, 5, 10, 7, 0)
+    assert proximo("5/20 * * * *", datetime(2024, 5, 10, 6, 26)) == datetime(2024, 5, 10, 6, 45)
+    assert proximo("0 8,18 * * *", datetime(2024, 5, 10, 9, 0)) == datetime(2024, 5, 10, 18, 0)
+    # Segunda a sexta: sábado 11/05 pula para segunda 13/05
+    assert proximo("0 7 * * 1-5", datetime(2024, 5, 10, 8, 0)) == datetime(2024, 5, 13, 7, 0)
+
+
+def test_domingo_0_ou_7():
+    domingo = datetime(2024, 5, 12, 9, 0)
+    assert proximo("0 9 * * 0", datetime(2024, 5, 10)) == domingo
+    assert proximo("0 9 * * 7", datetime(2024, 5, 10)) == domingo
+    assert CronExpression("0 9 * * 7").weekdays == {0}
+
+
+def test_dia_do_mes_ou_dia_da_semana():
+    # Ambos restritos: basta um casar (dia 15 OU segunda-feira)
+    cron = CronExpression("0 0 15 * 1")
+    assert cron.next_after(datetime(2024, 5, 10)) == datetime(2024, 5, 13)  # segunda
+    assert cron.next_after(datetime(2024, 5, 14)) == datetime(2024, 5, 15)  # dia 15, quarta
+    # Só o dia do mês restrito: dia da semana não importa
+    assert proximo("0 0 15 * *", datetime(2024, 5, 10)) == datetime(2024, 5, 15)
+
+
+def test_viradas_de_mes_e_ano():
+    assert proximo("0 0 1 * *", datetime(2024, 1, 31, 12, 0)) == datetime(2024, 2, 1)
+    assert proximo("59 23 31 12 *", datetime(2024, 12, 31, 23, 59)) == datetime(2025, 12, 31, 23, 59)
+    assert proximo("0 0 1 1 *", datetime(2024, 6, 1)) == datetime(2025, 1, 1)
+    # 29/02: próximo ano bissexto
+    assert proximo("0 12 29 2 *", datetime(2024, 3, 1)) == datetime(2028, 2, 29, 12, 0)
+
+
+INVALIDAS = [
+    "* * * *",          # 4 campos
+    "* * * * * *",      # 6 campos
+    "60 * * * *",       # minuto fora do intervalo
+    "* 24 * * *",
+    "* * 0 * *",
+    "* * * 13 *",
+    "* * * * 8",
+    "10-5 * * * *",     # intervalo invertido
+    "*/0 * * * *",      # passo zero
+    "a * * * *",
+]
+
+
+@pytest.mark.parametrize("expr", INVALIDAS)
+def test_expressoes_invalidas(expr):
+    with pytest.raises(ValueError):
+        CronExpression(expr)
+
+
+def test_sem_ocorrencias():
+    with pytest.raises(ValueError):
+        proximo("0 0 30 2 *", datetime(2024, 1, 1))
+
+
+def test_disparos_sobrepostos_pulam():
+    # Dois disparos no mesmo processo: o segundo é pulado, não enfileirado atrás do primeiro
+    execucoes = []
+
+    async def tarefa():
+        execucoes.append(datetime.now())
+        await asyncio.sleep(0.05)
+
+    async def disparar():
+        scheduler = AsyncScheduler()
+        job = scheduler.add_job("sobreposto", "* * * * *", tarefa)
+        agora = datetime.now()
+        return await asyncio.gather(scheduler.run_job(job, agora), scheduler.run_job(job, agora, trigger="manual"))
+
+    resultados = asyncio.run(disparar())
+    assert sorted(r["status"] for r in resultados) == ["skipped_overlap", "success"]
+    assert len(execucoes) == 1
+
+
+if __name__ == "__main__":
+    test_estritamente_depois()
+    test_passos_listas_e_intervalos()
+    test_domingo_0_ou_7()
+    test_dia_do_mes_ou_dia_da_semana()
+    test_viradas_de_mes_e_ano()
+    for expr in INVALIDAS:
+        test_expressoes_invalidas(expr)
+    test_sem_ocorrencias()
+    test_disparos_sobrepostos_pulam()
+    print("✅ Cron OK")
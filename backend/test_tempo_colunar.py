@@ -0,0 +1,54 @@
+import mmap
+import os
+
+import numpy as np
+import pandas as pd
+
+from services.tempo_colunar import (
+    caminho_colunar, carregar_colunar, colunar_atualizado, salvar_colunar, sha1_arquivo,
+)
+
+# Formato colunar do tempo.csv: ida e volta sem perdas, mmap sem cópia e descarte quando o CSV muda
+TEMPO_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "services", "data", "tempo.csv")
+
+
+def _mapeado(arr) -> bool:
+    while arr is not None:
+        if isinstance(arr, (np.memmap, mmap.mmap)):
+            return True
+        arr = getattr(arr, "base", None)
+    return False
+
+
+def test_ida_e_volta(tmp_path):
+    df = pd.read_csv(TEMPO_CSV)
+    destino = tmp_path / "tempo.cols"
+    salvar_colunar(df, destino)
+    lido = carregar_colunar(destino)
+    assert list(lido.columns) == list(df.columns)
+    for col in df.columns:
+        assert (np.asarray(lido[col].astype(object)) == df[col].to_numpy()).all()
+    # Colunas numéricas e códigos dos rótulos continuam apontando para os arquivos mapeados
+    assert _mapeado(np.asarray(lido["lat"]))
+    assert _mapeado(lido["final_label"].array.codes) and lido["final_label"].array.codes.dtype == np.int8
+
+
+def test_desatualizado_volta_para_csv(tmp_path):
+    csv = tmp_path / "tempo.csv"
+    df = pd.read_csv(TEMPO_CSV)
+    df.to_csv(csv, index=False)
+    salvar_colunar(df, caminho_colunar(csv), csv_sha1=sha1_arquivo(csv))
+    assert colunar_atualizado(csv) == caminho_colunar(csv)
+    df.loc[0, "final_label"] = "Good"
+    df.to_csv(csv, index=False)
+    assert colunar_atualizado(csv) is None
+
+
+if __name__ == "__main__":
+    import tempfile
+    from pathlib import Path
+    with tempfile.TemporaryDirectory() as d:
+        test_ida_e_volta(Path(d))
+    with tempfile.TemporaryDirectory() as d:
+        test_desatualizado_volta_para_csv(Path(d))
+    print("✅ Dataset colunar OK")